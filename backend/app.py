@@ -1,41 +1,234 @@
 # backend/app.py (Updated for Random Forest ML Model)
 
-from flask import Flask, request
+from flask import Flask, request, g, send_file
 from flask import jsonify
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 import datetime
-import random
-import joblib # Import joblib to load the model and encoders
+import gzip
+import hashlib
+import json
 import os # To check if model files exist
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from forecast_cache import ForecastCache, make_forecast_key
+import simulation
+from forest_artifact import FlatForest, compile_pipeline, load_forest_artifact
+from metadata_store import expand_metadata_index, load_metadata_index
+from model_versions import resolve_model_dir
+from price_history import load_price_history, to_period
+from horizon_forecast import forecast_horizons, series_window
+from snapshot_store import load_snapshot_index, snapshot_key
+from response_format import (TEXT_BLOCKS, MSGPACK_MIMETYPE, COMPRESSIBLE_MIMETYPES, MIN_COMPRESS_BYTES,
+                             choose_encoding, compress, encode_compact, encode_series, expand_texts, precompress)
+from prediction_batcher import MicroBatcher, QueueFullError
+from metrics import MetricsRegistry, format_server_timing, start_profile, stop_profile
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for frontend to communicate with backend
 
-# --- ML Model Loading ---
-ml_pipeline = None # Now loading the entire pipeline
-unit_map = None
+# --- Instrumentation (exposed at /api/metrics) ---
+metrics = MetricsRegistry()
+metrics.describe('agriprice_stage_seconds', 'Time spent in each prediction/serving stage.')
+metrics.describe('agriprice_predictions_total', 'Predictions served, by source (ml, cache, snapshot or fallback).')
+metrics.describe('agriprice_fallbacks_total', 'Responses served by the fallback simulation, by reason.')
+metrics.describe('agriprice_http_requests_total', 'HTTP requests, by endpoint and status code.')
+metrics.describe('agriprice_http_request_seconds', 'End-to-end request latency, by endpoint.')
+PROFILE_HEADER = 'X-Profile' # Send "X-Profile: 1" to get a Server-Timing stage breakdown back
 
+# --- ML Model Loading ---
+# Everything a prediction needs from the trained assets, swapped as one object so a request
+# always sees a single consistent model version (see load_ml_assets and watch_model_versions).
+# version identifies the loaded pipeline and is part of every forecast cache key.
+ModelBundle = namedtuple('ModelBundle', ['pipeline', 'unit_map', 'features', 'price_history', 'horizon_model', 'version', 'model_dir'])
+model_bundle = ModelBundle(pipeline=None, unit_map={}, features=None, price_history=None, horizon_model=None, version="none", model_dir=None)
+
+# Asset names inside the served model directory: models/, or models/versions/<name>/ when
+# incremental training has written a newer version (see model_versions.py)
 MODEL_DIR = 'models'
-MODEL_PATH = os.path.join(MODEL_DIR, 'crop_price_rf_pipeline.pkl')
-UNIT_MAP_PATH = os.path.join(MODEL_DIR, 'unit_map.pkl')
+MODEL_FILE = 'crop_price_rf_pipeline.pkl'
+FLAT_MODEL_DIR_NAME = 'crop_price_rf_flat' # Memory-mapped export written by train_model.py
+METADATA_INDEX_FILE = 'metadata_index.json' # Dropdown hierarchies written by train_model.py
+PRICE_HISTORY_DIR_NAME = 'price_history' # Observed monthly prices written by train_model.py
+HORIZON_MODEL_DIR_NAME = 'horizon_forest' # Multi-output 12-month forecaster written by train_model.py
+HISTORY_MONTHS = 24 # Length of the historical_prices series
+# Observed history ending longer ago than this is stale: the series (and lag feature) are simulated instead
+HISTORY_MAX_AGE_MONTHS = int(os.environ.get('HISTORY_MAX_AGE_MONTHS', 12))
+# Months of the HISTORY_MONTHS window that must have real prices before the series counts as observed;
+# sparser series would be mostly interpolation, so they are simulated instead
+HISTORY_MIN_OBSERVED_MONTHS = int(os.environ.get('HISTORY_MIN_OBSERVED_MONTHS', 12))
+METADATA_MAX_AGE = int(os.environ.get('METADATA_MAX_AGE', 3600)) # Cache-Control max-age for /api/metadata
+TEXTS_MAX_AGE = int(os.environ.get('TEXTS_MAX_AGE', 86400)) # Cache-Control max-age for /api/texts
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '1') == '1' # brotli/gzip by Accept-Encoding
+# Larger request bodies are refused with 413, by Flask and by the native ASGI /api/predict
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 1 << 20))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# 'pickle' loads the joblib pipeline; 'flat' maps the exported tree arrays read-only,
+# so every worker shares one copy of the forest through the page cache.
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'pickle')
+# 'sklearn' runs Pipeline.predict on a DataFrame; 'flat' compiles the pipeline into packed
+# NumPy arrays and evaluates all trees at once (much cheaper for single-row requests).
+# MODEL_FORMAT=flat always uses the flat engine.
+INFERENCE_ENGINE = os.environ.get('INFERENCE_ENGINE', 'sklearn')
+
+# --- Forecast Cache Configuration ---
+FORECAST_CACHE_SIZE = int(os.environ.get('FORECAST_CACHE_SIZE', 8192)) # 0 disables the cache
+FORECAST_CACHE_TTL = int(os.environ.get('FORECAST_CACHE_TTL', 3600)) # Seconds
+FORECAST_CACHE_WARMUP = os.environ.get('FORECAST_CACHE_WARMUP', '0') == '1' # Precompute the full grid at startup
+
+forecast_cache = ForecastCache(max_size=FORECAST_CACHE_SIZE, ttl_seconds=FORECAST_CACHE_TTL)
+
+# --- Serving Mode Configuration ---
+# 'sync' predicts inline on the request thread. 'async' (used by asgi.py) hands predictions to a
+# bounded worker pool that micro-batches concurrent requests into one predict call and answers
+# 503 when its queue is full.
+SERVING_MODE = os.environ.get('SERVING_MODE', 'sync')
+PREDICT_QUEUE_SIZE = int(os.environ.get('PREDICT_QUEUE_SIZE', 256))
+PREDICT_MAX_BATCH = int(os.environ.get('PREDICT_MAX_BATCH', 64))
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 5))
+PREDICT_WORKERS = int(os.environ.get('PREDICT_WORKERS', 2))
+PREDICT_TIMEOUT = float(os.environ.get('PREDICT_TIMEOUT', 10)) # Seconds a request may wait for its result
+
+# Seconds between checks for a new model version (incremental training) or retrained base model; 0 disables
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+# '0' leaves the watcher and batcher threads to start_background_threads(), for servers that import
+# the app once and then fork workers, which do not inherit threads (see gunicorn.conf.py)
+START_BACKGROUND_THREADS = os.environ.get('START_BACKGROUND_THREADS', '1') == '1'
+
+# Directory of precomputed /api/predict responses written by export_snapshots.py; empty disables.
+# Hits are sent as the stored gzip'd file, misses (and stale snapshots) use live inference.
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '')
+
+def load_price_history_store(store_dir):
+    try:
+        store = load_price_history(store_dir)
+        print(f"Price history loaded: {store.manifest['n_state_rows']} state-months, {store.manifest['n_market_rows']} market-months.")
+        return store
+    except FileNotFoundError:
+        return None # Series and lag features stay simulated
+    except Exception as e:
+        print(f"Error loading price history, using simulated history: {e}")
+        return None
+
+
+def load_horizon_model(artifact_dir):
+    try:
+        return load_forest_artifact(artifact_dir)
+    except FileNotFoundError:
+        return None # The 12-month chart stays simulated
+    except Exception as e:
+        print(f"Error loading horizon model, using simulated forecasts: {e}")
+        return None
+
+
+def load_feature_schema(index):
+    """
+    Returns the column order and fill values the pipeline was trained with (from metadata_index.json),
+    plus the crop -> category map and the month labels used for the categorical columns.
+    """
+    if "fill_values" not in index:
+        raise ValueError("Metadata index has no fill values; retrain with 'python train_model.py'.")
+    crop_types = index["levels"]["crop_type"]
+    categories = index["levels"]["crop_category"]["names"]
+    months = {}
+    for label in index["months"]:
+        try:
+            months[int(float(label))] = label # Training casts Month to str, e.g. '5' (or '5.0' if the column had gaps)
+        except ValueError:
+            pass
+    return {
+        "order": index["TRAINING_FEATURES_ORDER"],
+        "means": index["fill_values"]["means"],
+        "modes": index["fill_values"]["modes"],
+        "crop_categories": {name: categories[parent] for name, parent in zip(crop_types["names"], crop_types["parent"])},
+        "months": months
+    }
+
+
+def load_model_bundle(model_dir):
+    """
+    Loads the pipeline, metadata index (unit map and feature schema) and price history of one
+    asset directory. Raises if the pipeline or metadata index cannot be loaded.
+    """
+    start = time.perf_counter()
+    if MODEL_FORMAT == 'flat':
+        pipeline = load_forest_artifact(os.path.join(model_dir, FLAT_MODEL_DIR_NAME))
+        stat = os.stat(os.path.join(model_dir, FLAT_MODEL_DIR_NAME, 'manifest.json'))
+    else:
+        import joblib # Unpickling the pipeline also imports scikit-learn
+        pipeline = joblib.load(os.path.join(model_dir, MODEL_FILE))
+        stat = os.stat(os.path.join(model_dir, MODEL_FILE))
+        if INFERENCE_ENGINE == 'flat':
+            pipeline = compile_pipeline(pipeline)
+    index = load_metadata_index(os.path.join(model_dir, METADATA_INDEX_FILE))
+    unit_map = index["unit_map"]
+    features = load_feature_schema(index)
+    price_history = load_price_history_store(os.path.join(model_dir, PRICE_HISTORY_DIR_NAME))
+    horizon_model = load_horizon_model(os.path.join(model_dir, HORIZON_MODEL_DIR_NAME)) if price_history is not None else None
+    version = f"{MODEL_FORMAT}-{os.path.basename(model_dir)}-{int(stat.st_mtime)}-{stat.st_size}"
+    print(f"ML pipeline ({MODEL_FORMAT}) and metadata index loaded from '{model_dir}/' in {time.perf_counter() - start:.3f}s!")
+    return ModelBundle(pipeline, unit_map, features, price_history, horizon_model, version, model_dir)
+
 
 def load_ml_assets():
-    global ml_pipeline, unit_map
+    """
+    Loads the currently selected asset directory and swaps it in. Returns False (keeping the
+    previous bundle, i.e. the fallback simulation at startup) if loading fails.
+    """
+    global model_bundle
+    model_dir = resolve_model_dir(MODEL_DIR)
     try:
-        ml_pipeline = joblib.load(MODEL_PATH)
-        unit_map = joblib.load(UNIT_MAP_PATH)
-        print("ML pipeline and unit map loaded successfully!")
+        bundle = load_model_bundle(model_dir)
     except FileNotFoundError:
-        print(f"ERROR: ML model pipeline or unit map files not found in '{MODEL_DIR}/'.")
+        print(f"ERROR: ML model pipeline or metadata index files not found in '{model_dir}/'.")
         print("Please ensure you have run 'python train_model.py' in the 'backend' directory.")
-        ml_pipeline = None # Set to None to trigger fallback
-        unit_map = {} # Initialize empty map for safe access
+        return False
     except Exception as e:
         print(f"Error loading ML assets: {e}")
-        ml_pipeline = None
-        unit_map = {}
+        return False
+    # A single reference swap: requests already running keep the bundle they started with
+    model_bundle = bundle
+    forecast_cache.clear() # Entries from a previous model are no longer valid
+    return True
+
+
+def model_signature():
+    """
+    Identifies the model that should be served: (asset directory, mtime, size) of its model file.
+    """
+    model_dir = resolve_model_dir(MODEL_DIR)
+    model_path = os.path.join(model_dir, FLAT_MODEL_DIR_NAME, 'manifest.json') if MODEL_FORMAT == 'flat' else os.path.join(model_dir, MODEL_FILE)
+    try:
+        stat = os.stat(model_path)
+    except FileNotFoundError:
+        return None
+    return model_dir, stat.st_mtime_ns, stat.st_size
+
+
+def watch_model_versions():
+    """
+    Background poller: when the version pointer or the base model changes, loads the new assets
+    off the request path and hot-swaps them (plus the dropdown metadata) without a restart.
+    A re-exported snapshot index is picked up the same way.
+    """
+    signature = model_signature()
+    snapshots = snapshot_signature()
+    while True:
+        time.sleep(MODEL_RELOAD_INTERVAL)
+        current_snapshots = snapshot_signature()
+        if current_snapshots != snapshots:
+            load_snapshots()
+            snapshots = current_snapshots
+        current = model_signature()
+        if current is None or current == signature:
+            continue
+        print(f"New model assets detected in '{current[0]}/', reloading...")
+        if load_ml_assets():
+            load_metadata(current[0])
+        signature = current # A failed (e.g. half-written) model is retried once its file changes again
 
 # Load assets when the app starts
 with app.app_context():
@@ -64,183 +257,448 @@ MOCK_DATA = {
     "seasons": ["Kharif (Monsoon)", "Rabi (Winter)", "Zaid (Summer)", "Spring", "Autumn", "Winter"],
 }
 
+# --- Dropdown Metadata (served pre-serialized by /api/metadata) ---
+metadata_response = None # Dict form, also used to build the forecast warm-up grid
+metadata_bodies = None # UTF-8 JSON bytes by content encoding, serialized and compressed once
+metadata_etag = None
 
-# --- ML Prediction Function (Uses the Loaded Random Forest Pipeline) ---
-def get_ml_prediction(crop_type, season, country, state):
-    if ml_pipeline is None:
-        print("ML pipeline not loaded. Falling back to simple simulation.")
-        return simulate_price_data_fallback(crop_type) # Fallback to original simulation
+def load_metadata(model_dir=None):
+    """
+    Loads the indexed metadata written by train_model.py (falling back to MOCK_DATA) and
+    serializes and compresses the /api/metadata body once, with a content-hash ETag.
+    """
+    global metadata_response, metadata_bodies, metadata_etag
+    metadata_index_path = os.path.join(model_dir or resolve_model_dir(MODEL_DIR), METADATA_INDEX_FILE)
+    try:
+        metadata_response = expand_metadata_index(load_metadata_index(metadata_index_path))
+        print(f"Dropdown metadata loaded from '{metadata_index_path}'.")
+    except FileNotFoundError:
+        metadata_response = {key: MOCK_DATA[key] for key in ("crop_categories", "crop_types_by_category", "countries", "states_by_country", "seasons")}
+    except Exception as e:
+        print(f"Error loading metadata index, using MOCK_DATA: {e}")
+        metadata_response = {key: MOCK_DATA[key] for key in ("crop_categories", "crop_types_by_category", "countries", "states_by_country", "seasons")}
+    metadata_body = json.dumps(metadata_response, separators=(',', ':')).encode('utf-8')
+    metadata_etag = hashlib.sha256(metadata_body).hexdigest()[:32]
+    metadata_bodies = precompress(metadata_body)
 
+load_metadata()
+
+# --- Response Text Blocks (served pre-serialized by /api/texts, referenced by ID in compact responses) ---
+texts_body = json.dumps(TEXT_BLOCKS, separators=(',', ':')).encode('utf-8')
+texts_etag = hashlib.sha256(texts_body).hexdigest()[:32]
+texts_bodies = precompress(texts_body)
+
+
+# --- Precomputed Snapshots (SNAPSHOT_DIR, written by export_snapshots.py) ---
+snapshot_index = None
+
+def load_snapshots():
+    global snapshot_index
+    if not SNAPSHOT_DIR:
+        return
     try:
-        # --- Prepare Input Features for Prediction ---
-        # Get current date details
-        current_date = datetime.date.today()
-        current_year = current_date.year
-        current_month = current_date.month
-
-        # Simulate other dynamic features for the current prediction
-        # In a real system, these would come from live data sources or more complex forecasting
-        # We try to make them somewhat realistic or at least plausible for a demo
-        simulated_rainfall = 70 + 60 * np.sin(np.pi * current_month / 6) + np.random.normal(0, 15)
-        simulated_rainfall = max(0, simulated_rainfall)
-
-        simulated_area_under_cultivation = 1000 + np.random.normal(0, 100) # Simple fixed + noise
-        simulated_area_under_cultivation = max(100, simulated_area_under_cultivation)
-
-        # For previous_year_price, a simple heuristic (e.g., base it off a recent historical average)
-        # In a real model, this would be an actual historical price from your database
-        simulated_previous_year_price = 5000 if "quintal" in unit_map.get(crop_type, "") else 80
-        simulated_previous_year_price *= (1 + np.random.uniform(-0.1, 0.1)) # Add some variability
-
-        # Create a DataFrame with the exact column names the pipeline was trained on
-        # The order and names of columns MUST match the training data
-        input_df = pd.DataFrame([[
-            current_year, current_month, crop_type, season, country, state,
-            simulated_rainfall, simulated_area_under_cultivation, simulated_previous_year_price
-        ]], columns=[
-            'year', 'month', 'crop_type', 'season', 'country', 'state',
-            'rainfall', 'area_under_cultivation', 'previous_year_price'
-        ])
+        index = load_snapshot_index(SNAPSHOT_DIR)
+        print(f"Snapshot index loaded from '{SNAPSHOT_DIR}/': {len(index['entries'])} entries for model '{index['model_version']}'.")
+    except FileNotFoundError:
+        print(f"No snapshot index in '{SNAPSHOT_DIR}/'; run 'python export_snapshots.py'. Serving live predictions.")
+        index = None
+    except Exception as e:
+        print(f"Error loading snapshot index, serving live predictions: {e}")
+        index = None
+    snapshot_index = index
+
+
+def snapshot_signature():
+    if not SNAPSHOT_DIR:
+        return None
+    try:
+        return os.stat(os.path.join(SNAPSHOT_DIR, 'index.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def current_snapshot_index():
+    """
+    Returns the loaded snapshot index if it matches the served model and the current month,
+    else None (forecasts from another model or month must not be served).
+    """
+    index = snapshot_index
+    if index is None or index["model_version"] != model_bundle.version:
+        return None
+    today = datetime.date.today()
+    return index if (index["year"], index["month"]) == (today.year, today.month) else None
+
+
+def snapshot_entry(item, variant):
+    """
+    Returns the stored file of one prediction in one variant ('full' or 'compact'), or None.
+    """
+    index = current_snapshot_index()
+    return index["entries"].get(snapshot_key(item), {}).get(variant) if index is not None else None
+
+
+def snapshot_path(entry):
+    # Absolute, since send_file resolves relative paths against the app package, not the working directory
+    return os.path.abspath(os.path.join(SNAPSHOT_DIR, entry["file"]))
+
+load_snapshots()
+
+
+# --- ML Prediction Function (Uses the Loaded Random Forest Pipeline) ---
+# The order and names of columns MUST match the training data: they come from the bundle's
+# feature schema (train_model.TRAINING_FEATURES_ORDER). Columns a request can't fill (district,
+# market, temperature, ...) get the training fill values.
+PREDICTION_FIELDS = ('crop_type', 'season', 'country', 'state')
+MISSING_PARAMETERS_ERROR = "Missing or invalid prediction parameters (crop type, season, country and state must be non-empty strings)."
+MAX_BATCH_SIZE = 5000 # Upper bound on items accepted by /api/predict/batch
+
+
+def lookup_price_history(price_history, crop_type, country, state, current_year, current_month):
+    """
+    Returns the observed state-level history for one item, or None when the store has no data for it
+    within HISTORY_MAX_AGE_MONTHS of the current month, or fewer than HISTORY_MIN_OBSERVED_MONTHS real
+    months in the window:
+    {"prices": the HISTORY_MONTHS monthly prices ending at the latest observed month (gaps interpolated),
+     "end": (year, month) of that month, "observed_months": how many of the prices are real,
+     "previous_year_price": the price a year before the current month, or the latest observed price
+     when that month is missing}.
+    """
+    if price_history is None:
+        return None
+    path = (country, state)
+    end = price_history.latest_period('state', crop_type, path, (current_year, current_month))
+    if end is None or to_period(current_year, current_month) - to_period(*end) > HISTORY_MAX_AGE_MONTHS:
+        return None
+    prices = price_history.monthly_prices('state', crop_type, path, end, HISTORY_MONTHS)
+    observed = np.flatnonzero(~np.isnan(prices))
+    if len(observed) < HISTORY_MIN_OBSERVED_MONTHS:
+        return None
+    prices = np.interp(np.arange(HISTORY_MONTHS), observed, prices[observed]) # Edges hold the nearest observation
+    last_year = price_history.price_at('state', crop_type, path, (current_year - 1, current_month))
+    return {
+        "prices": prices,
+        "end": end,
+        "observed_months": len(observed),
+        "previous_year_price": last_year[0] if last_year is not None else float(prices[-1])
+    }
+
 
-        # Predict the price using the loaded pipeline
-        predicted_price_value = ml_pipeline.predict(input_df)[0]
-        predicted_price_value = max(1.0, predicted_price_value) # Ensure positive price
-
-        # --- Simulate Historical and Future Data (for graph visualization) ---
-        # This part is still simulated, but now it's centered around the ML prediction
-        unit = unit_map.get(crop_type, "/unit")
-        num_historical_months = 24
-        num_future_months = 12
-
-        # Simulate historical prices, ending near the predicted price
-        # Make the 'current_price' reflect the most recent data point
-        current_price = predicted_price_value * (1 + random.uniform(-0.05, 0.05)) # Close to prediction
-        historical_prices = [current_price]
-        for _ in range(num_historical_months - 1):
-            # Simple reverse random walk
-            historical_prices.append(max(10, historical_prices[-1] * (1 + random.uniform(-0.02, 0.02))))
-        historical_prices.reverse() # Oldest to newest
-
-        # Simulate future prices with a slight trend/seasonality from the prediction
-        future_prices = []
-        for i in range(num_future_months):
-            # A bit more sophisticated seasonality around the predicted price
-            seasonal_factor = 1 + 0.05 * np.sin(np.pi * (current_month + i) / 6) # Sine wave for seasonality
-            trend_factor = 1 + 0.002 * i # Slight upward trend over future months
-            future_price_sim = predicted_price_value * seasonal_factor * trend_factor + np.random.normal(0, predicted_price_value * 0.01)
-            future_prices.append(max(10, future_price_sim))
-
-        # Mock confidence scores (higher for near future, lower for far future)
-        confidence_scores = [max(50, 95 - i*3 - random.uniform(0,5)) for i in range(num_future_months)]
-        confidence_scores = [min(100, score) for score in confidence_scores]
-
-        # Mock factors and recommendations based on simple heuristics or predefined text
-        # In a real system, these would come from model interpretability or expert rules
-        factors = {
-            "weather": {
-                "condition": f"Normal monsoon expected, with {simulated_rainfall:.0f}mm rainfall forecast. Localized showers likely.",
-                "impact": "Generally favorable conditions for crop growth. Watch for potential excess rainfall.",
-                "impact_color": "text-green-600" if simulated_rainfall > 50 else "text-yellow-600"
-            },
-            "supply": {
-                "condition": f"Area under cultivation is {simulated_area_under_cultivation:.0f} hectares. Good harvest expected.",
-                "impact": "Adequate supply anticipated, which may keep prices stable.",
-                "impact_color": "text-yellow-600"
-            },
-            "demand": {
-                "condition": "Domestic demand is steady, with moderate export interest.",
-                "impact": "Consistent demand provides a floor for prices. No significant spikes expected.",
-                "impact_color": "text-green-600"
-            }
+def forecast_price_horizons(bundle, items, histories):
+    """
+    Forecasts the next HORIZONS months for every item with an observed history, in one call to the
+    multi-output horizon model. Returns one {"future_prices", "confidence_scores", "start"} dict per
+    item, or None where the chart forecast has to be simulated.
+    """
+    forecasts = [None] * len(items)
+    if bundle.horizon_model is None:
+        return forecasts
+    indices, windows, end_periods = [], [], []
+    for i, ((crop_type, _, country, state), history) in enumerate(zip(items, histories)):
+        window = series_window(bundle.price_history, crop_type, (country, state), history["end"]) if history is not None else None
+        if window is not None:
+            indices.append(i)
+            windows.append(window)
+            end_periods.append(to_period(*history["end"]))
+    if not indices:
+        return forecasts
+    future_prices, confidence_scores = forecast_horizons(bundle.horizon_model, windows, end_periods)
+    for j, i in enumerate(indices):
+        start_year, start_month = divmod(end_periods[j] + 1, 12)
+        forecasts[i] = {
+            "future_prices": future_prices[j],
+            "confidence_scores": confidence_scores[j],
+            "start": f"{start_year:04d}-{start_month + 1:02d}" # Month of the first forecast price
         }
+    return forecasts
+
+
+def build_feature_frame(bundle, items, rngs, current_year, current_month, histories=None):
+    """
+    Builds a single feature frame for a list of (crop_type, season, country, state) tuples.
+    Each item draws its simulated features from its own generator in rngs; the previous year price
+    comes from the matching entry of histories when one was observed.
+    Returns the frame plus the simulated rainfall and area arrays used for the factor text.
+    """
+    crop_types, seasons, countries, states = (list(column) for column in zip(*items))
+    n = len(items)
+    schema = bundle.features
+
+    # For previous_year_price, a simple heuristic (e.g., base it off a recent historical average)
+    # In a real model, this would be an actual historical price from your database
+    simulated = np.array([
+        simulation.simulate_input_features(rng, current_month, 5000 if "quintal" in bundle.unit_map.get(crop_type, "").lower() else 80)
+        for rng, crop_type in zip(rngs, crop_types)
+    ]).reshape(n, 3)
+    rainfall, area_under_cultivation, previous_year_price = simulated.T
+    if histories is not None:
+        previous_year_price = np.array([
+            history["previous_year_price"] if history is not None else simulated_price
+            for history, simulated_price in zip(histories, previous_year_price)
+        ])
 
-        recommendations = {
-            "sell_time": "The model suggests a moderate upward trend in the next 2-3 months. Consider selling during peak seasonal demand.",
-            "trend_analysis": "Predicted trend shows slight seasonality with overall stability. Long-term (6-12 months) prices are expected to remain within a narrow range.",
-            "alerts_enabled": True
+    known = {
+        'Year': np.full(n, current_year),
+        'Month': [schema["months"].get(current_month, str(current_month))] * n,
+        'Crop Type': crop_types,
+        'Crop Category': [schema["crop_categories"].get(crop_type, schema["modes"]['Crop Category']) for crop_type in crop_types],
+        'Season': seasons,
+        'Country': countries,
+        'State': states,
+        'Rainfall (mm)': rainfall,
+        'Area Under Cultivation (Hectares)': area_under_cultivation,
+        'Previous Year Price (INR/Quintal)': previous_year_price
+    }
+    columns = {}
+    for column in schema["order"]:
+        if column in known:
+            columns[column] = known[column]
+        elif column in schema["means"]:
+            columns[column] = np.full(n, schema["means"][column])
+        else:
+            columns[column] = [schema["modes"][column]] * n
+    # The flat engine reads the column arrays directly; only sklearn needs a DataFrame
+    if isinstance(bundle.pipeline, FlatForest):
+        return columns, rainfall, area_under_cultivation
+    import pandas as pd
+    input_df = pd.DataFrame(columns, columns=schema["order"])
+    return input_df, rainfall, area_under_cultivation
+
+
+def build_prediction_result(rng, unit, predicted_price_value, current_month, simulated_rainfall, simulated_area_under_cultivation, history=None, forecast=None):
+    """
+    Builds the response payload (series, factors, recommendations) around one ML point prediction.
+    With an observed history (see lookup_price_history) the historical series and current price are real;
+    with a horizon forecast (see forecast_price_horizons) so are the future prices and confidence.
+    """
+    predicted_price_value = max(1.0, float(predicted_price_value)) # Ensure positive price
+
+    # --- Simulate Historical and Future Data (for graph visualization) ---
+    # This part is still simulated, but now it's centered around the ML prediction
+    with metrics.stage('simulate_series'):
+        current_price, historical_prices, future_prices, confidence_scores = simulation.simulate_series_around_prediction(
+            rng, predicted_price_value, current_month
+        )
+        if history is not None:
+            historical_prices = history["prices"]
+            current_price = historical_prices[-1]
+        if forecast is not None:
+            future_prices = forecast["future_prices"]
+            confidence_scores = forecast["confidence_scores"]
+        series = {
+            "historical_prices": historical_prices.tolist(),
+            "history_source": "observed" if history is not None else "simulated",
+            "future_prices": future_prices.tolist(),
+            "confidence_scores": confidence_scores.tolist(),
+            "forecast_source": "model" if forecast is not None else "simulated"
         }
+        if history is not None:
+            series["history_end"] = f"{history['end'][0]:04d}-{history['end'][1]:02d}" # Month of the last historical price
+            series["history_observed_months"] = history["observed_months"] # The other months are interpolated
+        if forecast is not None:
+            series["forecast_start"] = forecast["start"]
 
-        return {
-            "current_price": current_price,
-            "predicted_price": predicted_price_value,
-            "unit": unit,
-            "historical_prices": historical_prices,
-            "future_prices": future_prices,
-            "confidence_scores": confidence_scores,
-            "factors": factors,
-            "recommendations": recommendations
+    with metrics.stage('build_factors'):
+        return build_prediction_payload(predicted_price_value, current_price, unit, series, simulated_rainfall, simulated_area_under_cultivation)
+
+
+def build_prediction_payload(predicted_price_value, current_price, unit, series, simulated_rainfall, simulated_area_under_cultivation):
+    # Mock factors and recommendations based on simple heuristics or predefined text
+    # In a real system, these would come from model interpretability or expert rules
+    # Texts are IDs into response_format.TEXT_BLOCKS, rendered by finish_prediction (or by the client in compact mode)
+    factors = {
+        "weather": {
+            "condition": "model.weather.condition",
+            "impact": "model.weather.impact",
+            "impact_color": "text-green-600" if simulated_rainfall > 50 else "text-yellow-600"
+        },
+        "supply": {
+            "condition": "model.supply.condition",
+            "impact": "model.supply.impact",
+            "impact_color": "text-yellow-600"
+        },
+        "demand": {
+            "condition": "model.demand.condition",
+            "impact": "model.demand.impact",
+            "impact_color": "text-green-600"
         }
+    }
 
-    except Exception as e:
-        print(f"Error during ML prediction: {e}")
-        return simulate_price_data_fallback(crop_type) # Fallback on any prediction error
+    recommendations = {
+        "sell_time": "model.sell_time",
+        "trend_analysis": "model.trend_analysis",
+        "alerts_enabled": True
+    }
+
+    return {
+        "current_price": float(current_price),
+        "predicted_price": predicted_price_value,
+        "unit": unit,
+        **series,
+        "factors": factors,
+        "recommendations": recommendations,
+        "text_params": {"rainfall": f"{simulated_rainfall:.0f}", "area": f"{simulated_area_under_cultivation:.0f}"}
+    }
+
+
+def get_ml_predictions(items):
+    """
+    Predicts prices for a list of (crop_type, season, country, state) tuples.
+    Cached forecasts are served directly; all cache misses go through the pipeline in a
+    single predict call. Results keep the input order.
+    """
+    bundle = model_bundle # One consistent model for the whole batch, even if a new version is swapped in meanwhile
+    if bundle.pipeline is None:
+        print("ML pipeline not loaded. Falling back to simple simulation.")
+        metrics.inc('agriprice_fallbacks_total', len(items), reason='no_model')
+        metrics.inc('agriprice_predictions_total', len(items), source='fallback')
+        return [simulate_price_data_fallback(item[0], bundle.unit_map) for item in items] # Fallback to original simulation
+
+    # Get current date details
+    current_date = datetime.date.today()
+    current_year = current_date.year
+    current_month = current_date.month
+
+    with metrics.stage('cache_lookup'):
+        keys = [make_forecast_key(*item, current_year, current_month, bundle.version) for item in items]
+        results = [forecast_cache.get(key) for key in keys]
+        miss_indices = [i for i, result in enumerate(results) if result is None]
+    if len(miss_indices) < len(items):
+        metrics.inc('agriprice_predictions_total', len(items) - len(miss_indices), source='cache')
+
+    if miss_indices:
+        try:
+            # --- Prepare Input Features for Prediction ---
+            miss_items = [items[i] for i in miss_indices]
+            # One generator per request key, so the same request always simulates the same numbers
+            rngs = [simulation.make_rng(*keys[i][:6]) for i in miss_indices]
+            with metrics.stage('history_lookup'):
+                histories = [lookup_price_history(bundle.price_history, crop_type, country, state, current_year, current_month) for crop_type, _, country, state in miss_items]
+            with metrics.stage('horizon_forecast'):
+                forecasts = forecast_price_horizons(bundle, miss_items, histories)
+            with metrics.stage('build_frame'):
+                input_df, rainfall, area_under_cultivation = build_feature_frame(bundle, miss_items, rngs, current_year, current_month, histories)
+
+            # Predict all missing prices at once using the loaded pipeline
+            with metrics.stage('predict'):
+                predicted_values = bundle.pipeline.predict(input_df)
+
+            for j, i in enumerate(miss_indices):
+                results[i] = build_prediction_result(rngs[j], bundle.unit_map.get(items[i][0], "/unit"), predicted_values[j], current_month, rainfall[j], area_under_cultivation[j], histories[j], forecasts[j])
+                forecast_cache.put(keys[i], results[i])
+            metrics.inc('agriprice_predictions_total', len(miss_indices), source='ml')
+
+        except Exception as e:
+            print(f"Error during ML prediction: {e}")
+            failed = [i for i in miss_indices if results[i] is None]
+            if len(failed) > 1:
+                # Retry one by one, so an item that breaks the batch doesn't take the co-batched requests down with it
+                for i in failed:
+                    results[i] = get_ml_predictions([items[i]])[0]
+                return [dict(result) for result in results]
+            # Fallback on any prediction error (fallback results are never cached)
+            metrics.inc('agriprice_fallbacks_total', len(failed), reason='error')
+            metrics.inc('agriprice_predictions_total', len(failed), source='fallback')
+            for i in failed:
+                results[i] = simulate_price_data_fallback(items[i][0], bundle.unit_map)
+
+    # Shallow copies so callers can add request fields without touching cached entries
+    return [dict(result) for result in results]
+
+
+def prediction_grid():
+    """
+    Returns every (crop_type, season, country, state) combination offered by /api/metadata.
+    """
+    crop_types = [crop for crops in metadata_response["crop_types_by_category"].values() for crop in crops]
+    return [
+        (crop_type, season, country, state)
+        for crop_type in crop_types
+        for country, states in metadata_response["states_by_country"].items()
+        for state in states
+        for season in metadata_response["seasons"]
+    ]
+
+
+def warm_forecast_cache():
+    """
+    Precomputes forecasts for the whole /api/metadata grid in one batched pipeline pass.
+    """
+    items = prediction_grid()
+    get_ml_predictions(items)
+    print(f"Forecast cache warmed with {len(items)} entries.")
+
+
+def get_ml_prediction(crop_type, season, country, state):
+    return get_ml_predictions([(crop_type, season, country, state)])[0]
+
+
+def parse_prediction_item(data):
+    """
+    Returns the normalized (crop_type, season, country, state) tuple from a request body,
+    or None if any of them is missing or not a non-empty string.
+    The same tuple is used for the cache key, the snapshot key and the prediction itself.
+    """
+    if not isinstance(data, dict):
+        return None
+    values = tuple(data.get(field) for field in PREDICTION_FIELDS)
+    # Validate that crucial parameters for the ML model are present, and strings: a list or number
+    # would only fail later, inside a batch shared with other requests
+    if not all(isinstance(value, str) for value in values):
+        return None
+    item = tuple(value.strip() for value in values)
+    return item if all(item) else None
+
+
+def finish_prediction(item, prediction_results, compact=False):
+    # Add back the input information for frontend display
+    prediction_results.update(zip(PREDICTION_FIELDS, item))
+    # Compact responses keep text IDs (rendered by the client from /api/texts) and send fixed-point series
+    return encode_series(prediction_results) if compact else expand_texts(prediction_results)
+
+
+# Bounded micro-batching pool for SERVING_MODE=async
+prediction_batcher = MicroBatcher(
+    get_ml_predictions, max_queue=PREDICT_QUEUE_SIZE, max_batch=PREDICT_MAX_BATCH,
+    window_ms=PREDICT_BATCH_WINDOW_MS, workers=PREDICT_WORKERS
+) if SERVING_MODE == 'async' else None
 
 # --- Fallback Simulation Function (Original one, slightly renamed) ---
-def simulate_price_data_fallback(crop_type, num_historical_months=24, num_future_months=12):
+def simulate_price_data_fallback(crop_type, unit_map=None, num_historical_months=24, num_future_months=12):
     """
     Simulates historical and future price data for a given crop type.
     This is the fallback simulation if the ML model is not available or errors out.
     """
-    seed = sum(ord(c) for c in crop_type)
-    random.seed(seed)
-    np.random.seed(seed)
-
-    base_price = 0
+    rng = simulation.make_rng("fallback", crop_type) # Reproducible per crop, without touching global random state
     unit = unit_map.get(crop_type, "/unit") if unit_map else "/unit" # Use loaded map if available
 
-    if unit == "/kg":
-        base_price = random.uniform(20, 150)
-        fluctuation_factor = 0.08
-    elif unit == "/dozen":
-        base_price = random.uniform(30, 100)
-        fluctuation_factor = 0.07
-    elif unit == "/quintal":
-        base_price = random.uniform(1500, 8000)
-        fluctuation_factor = 0.05
-    else:
-        base_price = random.uniform(10, 100)
-        fluctuation_factor = 0.10
-
-    historical_prices = []
-    current_price_sim = base_price * (1 + random.uniform(-0.15, 0.15))
-    for _ in range(num_historical_months):
-        current_price_sim *= (1 + random.uniform(-fluctuation_factor, fluctuation_factor))
-        historical_prices.append(max(10, current_price_sim))
-    historical_prices.reverse()
-
-    future_prices = []
-    current_future_price_sim = historical_prices[-1] if historical_prices else base_price
-    for i in range(num_future_months):
-        seasonal_adjust = 1 + np.sin(i / 3.0 * np.pi) * 0.05
-        trend_factor = 1 + random.uniform(-0.005, 0.01)
-        current_future_price_sim *= (trend_factor * seasonal_adjust * (1 + random.uniform(-fluctuation_factor / 2, fluctuation_factor / 2)))
-        future_prices.append(max(10, current_future_price_sim))
-
-    predicted_avg_price = np.mean(future_prices[:3]) if future_prices else base_price
-    confidence_scores = [max(50, 95 - i*3 - random.uniform(0,5)) for i in range(num_future_months)]
-    confidence_scores = [min(100, score) for score in confidence_scores]
+    predicted_avg_price, historical_prices, future_prices, confidence_scores = simulation.simulate_fallback_series(
+        rng, unit, num_historical_months, num_future_months
+    )
 
     factors = {
-        "weather": {"condition": "Expected normal monsoon; potential for localized heavy rains in few regions.", "impact": "Overall positive outlook, but watch for regional disruptions.", "impact_color": "text-green-600"},
-        "supply": {"condition": "Recent harvest was good, leading to moderate supply levels.", "impact": "Prices are currently stable due to sufficient supply.", "impact_color": "text-yellow-600"},
-        "demand": {"condition": "Domestic demand is steady, with moderate export interest.", "impact": "Consistent demand provides a floor for prices.", "impact_color": "text-green-600"}
+        "weather": {"condition": "fallback.weather.condition", "impact": "fallback.weather.impact", "impact_color": "text-green-600"},
+        "supply": {"condition": "fallback.supply.condition", "impact": "fallback.supply.impact", "impact_color": "text-yellow-600"},
+        "demand": {"condition": "fallback.demand.condition", "impact": "fallback.demand.impact", "impact_color": "text-green-600"}
     }
 
     recommendations = {
-        "sell_time": "The model suggests that the best time to sell could be in the next 2-3 months, as prices show a slight upward trend before seasonal increases in supply.",
-        "trend_analysis": "The predicted trend indicates a gradual increase in price for the next quarter, followed by a plateau. Long-term outlook (6-12 months) suggests stability.",
+        "sell_time": "fallback.sell_time",
+        "trend_analysis": "fallback.trend_analysis",
         "alerts_enabled": True
     }
 
     return {
-        "current_price": historical_prices[-1] if historical_prices else predicted_avg_price,
-        "predicted_price": predicted_avg_price,
+        "current_price": float(historical_prices[-1]) if len(historical_prices) else float(predicted_avg_price),
+        "predicted_price": float(predicted_avg_price),
         "unit": unit,
-        "historical_prices": historical_prices,
-        "future_prices": future_prices,
-        "confidence_scores": confidence_scores,
+        "historical_prices": historical_prices.tolist(),
+        "history_source": "simulated",
+        "future_prices": future_prices.tolist(),
+        "confidence_scores": confidence_scores.tolist(),
+        "forecast_source": "simulated",
         "factors": factors,
-        "recommendations": recommendations
+        "recommendations": recommendations,
+        "text_params": {}
     }
 
 
@@ -250,44 +708,238 @@ def simulate_price_data_fallback(crop_type, num_historical_months=24, num_future
 def get_metadata():
     """
     Endpoint to provide initial data for dropdowns.
-    Uses the expanded MOCK_DATA to reflect the broader synthetic dataset.
-    """
-    metadata_response = {
-        "crop_categories": MOCK_DATA["crop_categories"],
-        "crop_types_by_category": MOCK_DATA["crop_types_by_category"],
-        "countries": MOCK_DATA["countries"],
-        "states_by_country": MOCK_DATA["states_by_country"],
-        "seasons": MOCK_DATA["seasons"]
-    }
-    return jsonify(metadata_response)
+    Serves the body serialized and compressed at startup from the trained metadata index (or MOCK_DATA),
+    with an ETag so browsers revalidate with a 304 instead of re-downloading.
+    """
+    return static_response(metadata_bodies, metadata_etag, METADATA_MAX_AGE)
+
+def static_response(bodies, etag, max_age):
+    """
+    Sends a body compressed at load time (see response_format.precompress) in the encoding the
+    client accepts, so compress_response has nothing left to do for it. Answers 304 on a matching
+    If-None-Match.
+    """
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', '')) if RESPONSE_COMPRESSION else None
+    if encoding not in bodies:
+        encoding = None # Too small to be worth compressing
+    response = app.response_class(bodies[encoding], mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=encoding is not None) # Same content, different bytes, as in compress_response
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+def send_snapshot(entry, compact=False):
+    """
+    Responds with a precomputed prediction: the stored gzip bytes as-is when the client
+    accepts gzip, otherwise decompressed.
+    """
+    with metrics.stage('snapshot'):
+        if request.accept_encodings['gzip']:
+            response = send_file(snapshot_path(entry), mimetype='application/json', conditional=False, etag=False)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            with open(snapshot_path(entry), 'rb') as f:
+                response = app.response_class(gzip.decompress(f.read()), mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        if compact:
+            response.vary.add('Accept') # As for live compact responses, which may be MessagePack
+        response.set_etag(entry["etag"])
+    metrics.inc('agriprice_predictions_total', source='snapshot')
+    return response
+
+def prediction_response(payload, compact):
+    """
+    Serializes a finished prediction (or batch): compact payloads as compact JSON, or as
+    MessagePack when the client prefers it in its Accept header.
+    """
+    if not compact:
+        return jsonify(payload)
+    body, mimetype = encode_compact(payload, request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]))
+    response = app.response_class(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/texts', methods=['GET'])
+def get_texts():
+    """
+    Endpoint serving the factor and recommendation text templates that compact prediction
+    responses refer to by ID. Static per deployment, so clients fetch it once and revalidate.
+    """
+    return static_response(texts_bodies, texts_etag, TEXTS_MAX_AGE)
 
 @app.route('/api/predict', methods=['POST'])
 def predict_crop_price():
     """
     Endpoint to receive crop prediction request and return results.
     This now uses the loaded Random Forest ML pipeline for the core prediction.
+    With ?compact=1 the texts are sent as IDs (see /api/texts) and the series as fixed-point integers.
     """
-    data = request.get_json()
-
-    crop_type = data.get('crop_type')
-    season = data.get('season')
-    country = data.get('country')
-    state = data.get('state')
-
-    # Validate that crucial parameters for the ML model are present
-    if not all([crop_type, season, country, state]):
-        return jsonify({"error": "Missing one or more required prediction parameters (crop type, season, country, state)."}), 400
-
-    # Call the ML prediction function
-    prediction_results = get_ml_prediction(crop_type, season, country, state)
-
-    # Add back the input information for frontend display
-    prediction_results["crop_type"] = crop_type
-    prediction_results["season"] = season
-    prediction_results["country"] = country
-    prediction_results["state"] = state
+    compact = request.args.get('compact') == '1'
+    with metrics.stage('parse_json'):
+        item = parse_prediction_item(request.get_json())
+    if item is None:
+        return jsonify({"error": MISSING_PARAMETERS_ERROR}), 400
+
+    # Snapshots hold the full and the compact JSON form; MessagePack is encoded live
+    wants_msgpack = compact and request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+    entry = snapshot_entry(item, 'compact' if compact else 'full') if not wants_msgpack else None
+    if entry is not None:
+        try:
+            return send_snapshot(entry, compact)
+        except FileNotFoundError:
+            pass # Snapshot set is being re-exported; predict live
+
+    if prediction_batcher is None:
+        # Call the ML prediction function
+        prediction_results = get_ml_prediction(*item)
+    else:
+        # Queue for the worker pool, which batches it with concurrent requests
+        try:
+            prediction_results = prediction_batcher.submit(item).result(timeout=PREDICT_TIMEOUT)
+        except QueueFullError:
+            return jsonify({"error": "Server is busy, please retry shortly."}), 503, {"Retry-After": "1"}
+        except FutureTimeoutError:
+            return jsonify({"error": "Prediction timed out, please retry."}), 504
+
+    with metrics.stage('serialize'):
+        return prediction_response(finish_prediction(item, prediction_results, compact), compact)
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_crop_price_batch():
+    """
+    Endpoint to price many (crop type, season, country, state) combinations in one request.
+    Accepts {"requests": [...]} (or a bare list) and returns {"results": [...]} in input order.
+    Invalid items get an "error" entry instead of failing the whole batch.
+    Accepts ?compact=1 like /api/predict.
+    """
+    compact = request.args.get('compact') == '1'
+    with metrics.stage('parse_json'):
+        data = request.get_json(silent=True)
+    items = data.get('requests') if isinstance(data, dict) else data
+
+    if not isinstance(items, list):
+        return jsonify({"error": "Expected a JSON list of prediction requests (or an object with a 'requests' list)."}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large: {len(items)} items (maximum is {MAX_BATCH_SIZE})."}), 413
+
+    results = [None] * len(items)
+    valid_indices = []
+    valid_items = []
+    for i, item in enumerate(items):
+        values = parse_prediction_item(item)
+        if values is None:
+            results[i] = {"index": i, "error": MISSING_PARAMETERS_ERROR}
+            continue
+        valid_indices.append(i)
+        valid_items.append(values)
+
+    if valid_items:
+        # One feature frame and one pipeline call for all valid items
+        for i, values, prediction_results in zip(valid_indices, valid_items, get_ml_predictions(valid_items)):
+            results[i] = finish_prediction(values, prediction_results, compact)
+            results[i]["index"] = i
+
+    with metrics.stage('serialize'):
+        return prediction_response({"results": results}, compact)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Endpoint exposing forecast cache hit/miss counters.
+    """
+    stats = forecast_cache.stats()
+    stats["model_version"] = model_bundle.version
+    return jsonify(stats)
 
-    return jsonify(prediction_results)
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Endpoint exposing stage latency histograms, prediction source counters and
+    cache/queue statistics in the Prometheus text format.
+    """
+    gauges = []
+    for key, value in forecast_cache.stats().items():
+        if key in ('hits', 'misses', 'evictions', 'size', 'hit_rate'):
+            gauges.append((f'agriprice_forecast_cache_{key}', f'Forecast cache {key.replace("_", " ")}.', value, {}))
+    if prediction_batcher is not None:
+        for key, value in prediction_batcher.stats().items():
+            gauges.append((f'agriprice_prediction_queue_{key}', f'Prediction queue {key.replace("_", " ")}.', value, {}))
+    gauges.append(('agriprice_model_loaded', 'Whether an ML model is loaded (0 means every prediction falls back).', int(model_bundle.pipeline is not None), {}))
+    index = current_snapshot_index()
+    gauges.append(('agriprice_snapshot_entries', 'Precomputed predictions being served (0 when none are loaded or they are stale).', len(index["entries"]) if index is not None else 0, {}))
+    return app.response_class(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+@app.before_request
+def start_request_instrumentation():
+    g.request_start = time.perf_counter()
+    g.profile = None
+    if request.headers.get(PROFILE_HEADER) == '1':
+        g.profile, g.profile_token = start_profile()
+
+
+@app.after_request
+def finish_request_instrumentation(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('agriprice_http_requests_total', endpoint=endpoint, status=response.status_code)
+    metrics.observe('agriprice_http_request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    if g.profile is not None:
+        g.profile['total'] = time.perf_counter() - g.request_start
+        response.headers['Server-Timing'] = format_server_timing(g.profile)
+        response.headers['Timing-Allow-Origin'] = '*'
+        response.headers['Access-Control-Expose-Headers'] = 'Server-Timing'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compresses JSON, MessagePack and text bodies with brotli or gzip, as the client accepts.
+    Registered after finish_request_instrumentation, so it runs first and is included in the timing.
+    """
+    if not RESPONSE_COMPRESSION or response.direct_passthrough or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    body = response.get_data()
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return response
+    with metrics.stage('compress'):
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True) # Same content, different bytes; If-None-Match still matches
+    return response
+
+
+@app.teardown_request
+def stop_request_profile(exc):
+    if g.get('profile') is not None:
+        stop_profile(g.profile_token)
+        g.profile = None
+
+
+# Optionally precompute the whole prediction grid once the model is loaded
+if FORECAST_CACHE_WARMUP and model_bundle.pipeline is not None:
+    warm_forecast_cache()
+
+def start_background_threads():
+    """
+    Starts the prediction batcher's workers and the model version watcher in this process.
+    """
+    if prediction_batcher is not None:
+        prediction_batcher.start()
+    # Pick up versions written by 'train_model.py --mode incremental' (or a retrained base model) without a restart
+    if MODEL_RELOAD_INTERVAL > 0:
+        threading.Thread(target=watch_model_versions, name='model-version-watcher', daemon=True).start()
+
+if START_BACKGROUND_THREADS:
+    start_background_threads()
 
 # --- Run the Flask Application ---
 if __name__ == '__main__':
@@ -0,0 +1,195 @@
+# backend/asgi.py
+# ASGI entry point for the async serving mode:
+#
+#   cd backend
+#   uvicorn asgi:asgi_app --port 5000
+#
+# POST /api/predict is handled natively on the event loop: the request is parsed, queued on the
+# bounded micro-batching pool from app.py and awaited without holding a thread, so thousands of
+# open connections cost no more than the predictions actually running. A full queue answers 503.
+# Every other route (including /api/metadata and CORS preflights) goes through the Flask app.
+# Compact responses (?compact=1) and brotli/gzip compression are negotiated as in app.py.
+# With SNAPSHOT_DIR set, precomputed predictions are sent straight from their gzip'd files.
+# The native route is instrumented like app.py's request hooks (request metrics, X-Profile) and
+# refuses bodies over MAX_REQUEST_BYTES with 413, as Flask does.
+
+import asyncio
+import gzip
+import json
+import os
+import time
+
+os.environ.setdefault('SERVING_MODE', 'async') # Must be set before app.py creates the batcher
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+import app as backend
+from metrics import format_server_timing, start_profile, stop_profile
+from response_format import (COMPRESSIBLE_MIMETYPES, MIN_COMPRESS_BYTES, MSGPACK_MIMETYPE, accepted_encodings, choose_encoding,
+                             compress, encode_compact, encoding_quality)
+
+flask_asgi = WsgiToAsgi(backend.app)
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+PREDICT_ENDPOINT = '/api/predict'
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+async def _read_body(receive, limit):
+    """
+    Reads the request body, raising RequestTooLarge as soon as it exceeds limit bytes.
+    """
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > limit:
+            raise RequestTooLarge()
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    headers += CORS_HEADERS + list(extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _best_compact_mimetype(headers):
+    accept = parse_accept_header(headers.get(b'accept', b'').decode('latin-1'), MIMEAccept)
+    return accept.best_match(['application/json', MSGPACK_MIMETYPE])
+
+
+async def _send_snapshot(scope, send, entry, compact=False):
+    vary = b'Accept, Accept-Encoding' if compact else b'Accept-Encoding'
+    headers = [(b'content-type', b'application/json'), (b'vary', vary), (b'etag', f'"{entry["etag"]}"'.encode())]
+    with backend.metrics.stage('snapshot'):
+        with open(backend.snapshot_path(entry), 'rb') as f:
+            body = f.read()
+        # Stored gzip bytes go out as-is only if gzip is acceptable (not e.g. 'gzip;q=0')
+        if encoding_quality(accepted_encodings(dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')), 'gzip') > 0:
+            headers.append((b'content-encoding', b'gzip'))
+        else:
+            body = gzip.decompress(body)
+    headers += [(b'content-length', str(len(body)).encode())] + CORS_HEADERS
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    backend.metrics.inc('agriprice_predictions_total', source='snapshot')
+
+
+async def _send_prediction(scope, send, payload, compact):
+    # Same negotiation as app.prediction_response and app.compress_response
+    headers = dict(scope['headers'])
+    if compact:
+        body, mimetype = encode_compact(payload, _best_compact_mimetype(headers))
+        extra_headers = [(b'vary', b'Accept, Accept-Encoding')]
+    else:
+        body, mimetype = json.dumps(payload).encode('utf-8'), 'application/json'
+        extra_headers = [(b'vary', b'Accept-Encoding')]
+    encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1')) if backend.RESPONSE_COMPRESSION else None
+    if encoding is not None and len(body) >= MIN_COMPRESS_BYTES and mimetype in COMPRESSIBLE_MIMETYPES:
+        with backend.metrics.stage('compress'):
+            body = compress(body, encoding)
+        extra_headers.append((b'content-encoding', encoding.encode()))
+    headers = [(b'content-type', mimetype.encode()), (b'content-length', str(len(body)).encode())]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers + CORS_HEADERS + extra_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def predict(scope, receive, send):
+    """
+    Native /api/predict with the instrumentation app.py adds in before/after_request: the request
+    counter and latency histogram, and a Server-Timing breakdown for 'X-Profile: 1'.
+    """
+    start = time.perf_counter()
+    profile = None
+    if dict(scope['headers']).get(backend.PROFILE_HEADER.lower().encode()) == b'1':
+        profile, profile_token = start_profile()
+    statuses = []
+
+    async def instrumented_send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+            if profile is not None:
+                profile['total'] = time.perf_counter() - start
+                message = {**message, 'headers': list(message['headers']) + [
+                    (b'server-timing', format_server_timing(profile).encode()),
+                    (b'timing-allow-origin', b'*'),
+                    (b'access-control-expose-headers', b'Server-Timing')
+                ]}
+        await send(message)
+
+    try:
+        await _predict(scope, receive, instrumented_send)
+    finally:
+        if profile is not None:
+            stop_profile(profile_token)
+        backend.metrics.inc('agriprice_http_requests_total', endpoint=PREDICT_ENDPOINT, status=statuses[0] if statuses else 500)
+        backend.metrics.observe('agriprice_http_request_seconds', time.perf_counter() - start, endpoint=PREDICT_ENDPOINT)
+
+
+async def _predict(scope, receive, send):
+    content_length = dict(scope['headers']).get(b'content-length', b'')
+    try:
+        if content_length.isdigit() and int(content_length) > backend.MAX_REQUEST_BYTES:
+            raise RequestTooLarge()
+        data = json.loads(await _read_body(receive, backend.MAX_REQUEST_BYTES) or b'null')
+    except RequestTooLarge:
+        await _send_json(send, 413, {"error": f"Request body exceeds {backend.MAX_REQUEST_BYTES} bytes."})
+        return
+    except ValueError:
+        await _send_json(send, 400, {"error": "Request body must be valid JSON."})
+        return
+
+    item = backend.parse_prediction_item(data)
+    if item is None:
+        await _send_json(send, 400, {"error": backend.MISSING_PARAMETERS_ERROR})
+        return
+
+    compact = b'compact=1' in scope['query_string'].split(b'&')
+    # Snapshots hold the full and the compact JSON form; MessagePack is encoded live
+    wants_msgpack = compact and _best_compact_mimetype(dict(scope['headers'])) == MSGPACK_MIMETYPE
+    entry = backend.snapshot_entry(item, 'compact' if compact else 'full') if not wants_msgpack else None
+    if entry is not None:
+        try:
+            await _send_snapshot(scope, send, entry, compact)
+            return
+        except FileNotFoundError:
+            pass # Snapshot set is being re-exported; predict live
+
+    try:
+        future = backend.prediction_batcher.submit(item)
+    except backend.QueueFullError:
+        await _send_json(send, 503, {"error": "Server is busy, please retry shortly."}, [(b'retry-after', b'1')])
+        return
+
+    try:
+        prediction_results = await asyncio.wait_for(asyncio.wrap_future(future), timeout=backend.PREDICT_TIMEOUT)
+    except asyncio.TimeoutError:
+        await _send_json(send, 504, {"error": "Prediction timed out, please retry."})
+        return
+
+    await _send_prediction(scope, send, backend.finish_prediction(item, prediction_results, compact), compact)
+
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == PREDICT_ENDPOINT and scope['method'] == 'POST' \
+            and backend.prediction_batcher is not None:
+        await predict(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    else:
+        await flask_asgi(scope, receive, send)
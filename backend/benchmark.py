@@ -0,0 +1,375 @@
+# backend/benchmark.py
+# Reproducible benchmark for training (train_model.py) and serving (app.py).
+#
+#   cd backend
+#   python benchmark.py --sizes 10000 100000 --concurrency 1 4 16 --output bench.json
+#
+# Training: synthetic price tables with the same schema as pricesofagriculture.xlsx are written to
+# a temporary CSV and trained with train_model.py, reporting per-stage wall time (load, history,
+# impute, fit, dump for --training-mode full) and peak RSS.
+# Serving: a model is trained on a fixed-size seeded synthetic table (--serving-rows), then
+# /api/predict and /api/metadata are driven through Flask's test client at each concurrency level,
+# reporting p50/p95/p99 latency, throughput and peak RSS. --models-dir serves existing assets instead.
+# Startup: app.py's import time and RSS in a fresh interpreter, whether it imported any
+# training-only module (pandas, scikit-learn, SciPy, joblib), and the unshared memory of a
+# worker forked after the import, as with gunicorn.conf.py.
+# Every case runs in a fresh process, so peak RSS belongs to that case alone and no state (model,
+# forecast cache, metrics) leaks between cases. Inputs are seeded, so runs on different commits
+# are directly comparable.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_CONCURRENCY = [1, 4, 16]
+DEFAULT_REQUESTS = 500
+DEFAULT_SERVING_ROWS = 20_000 # Synthetic rows behind the model the serving cases query
+DEFAULT_SEED = 42
+
+# Shape of the synthetic hierarchy (kept close to a real multi-state price table)
+CROPS_BY_CATEGORY = {
+    'Cereals': ['Rice', 'Wheat', 'Maize', 'Bajra', 'Jowar'],
+    'Pulses': ['Tur', 'Moong', 'Urad', 'Chana'],
+    'Vegetables': ['Tomato', 'Onion', 'Potato', 'Brinjal', 'Cabbage'],
+    'Fruits': ['Mango', 'Banana', 'Apple', 'Grapes'],
+    'Oilseeds': ['Groundnut', 'Mustard', 'Soybean']
+}
+SEASONS = ['Kharif (Monsoon)', 'Rabi (Winter)', 'Zaid (Summer)']
+COUNTRIES = {'India': 12, 'Nepal': 2, 'Bangladesh': 2} # country -> number of states
+DISTRICTS_PER_STATE = 6
+MARKETS_PER_DISTRICT = 3
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latency_summary(latencies, wall_seconds):
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 1)
+    }
+
+
+# --- Synthetic data ---
+def generate_price_table(n_rows, seed=DEFAULT_SEED):
+    """
+    Returns a DataFrame with the training schema of train_model.py (EXPECTED_COLUMNS), including
+    ~1% missing values in a few columns so the imputation stage does real work.
+    """
+    from train_model import EXPECTED_COLUMNS, TARGET_COLUMN
+
+    rng = np.random.default_rng(seed)
+    crops = [(category, crop) for category, names in CROPS_BY_CATEGORY.items() for crop in names]
+    markets = [
+        (country, f"{country} State {s}", f"{country} State {s} District {d}", f"{country} State {s} District {d} Market {m}")
+        for country, n_states in COUNTRIES.items()
+        for s in range(1, n_states + 1)
+        for d in range(1, DISTRICTS_PER_STATE + 1)
+        for m in range(1, MARKETS_PER_DISTRICT + 1)
+    ]
+    crop_idx = rng.integers(0, len(crops), n_rows)
+    market_idx = rng.integers(0, len(markets), n_rows)
+    month = rng.integers(1, 13, n_rows)
+    year = rng.integers(2010, 2025, n_rows)
+
+    base_price = 1500 + 250 * (crop_idx % 11) + 40 * (market_idx % 7)
+    seasonal = 1 + 0.08 * np.sin(2 * np.pi * month / 12)
+    previous_price = base_price * seasonal * (1 + 0.04 * (year - 2010)) * rng.normal(1, 0.05, n_rows)
+    rainfall = np.clip(rng.normal(90, 40, n_rows), 0, None)
+    price = previous_price * 1.05 - 0.8 * (rainfall - 90) + rng.normal(0, 60, n_rows)
+
+    crop_rows = [crops[i] for i in crop_idx]
+    market_rows = [markets[i] for i in market_idx]
+    df = pd.DataFrame({
+        'Crop Type': [crop for _, crop in crop_rows],
+        'Crop Category': [category for category, _ in crop_rows],
+        'Season': rng.choice(SEASONS, n_rows),
+        'Country': [m[0] for m in market_rows],
+        'State': [m[1] for m in market_rows],
+        'District': [m[2] for m in market_rows],
+        'Market': [m[3] for m in market_rows],
+        'Month': month,
+        'Year': year,
+        'Rainfall (mm)': rainfall.round(1),
+        'Temperature (Celsius)': rng.normal(26, 5, n_rows).round(1),
+        'Area Under Cultivation (Hectares)': rng.normal(1200, 300, n_rows).round(0),
+        'Production (Tonnes)': rng.normal(5000, 900, n_rows).round(0),
+        'Yield (Kg/Hectare)': rng.normal(2100, 350, n_rows).round(0),
+        'Previous Year Price (INR/Quintal)': previous_price.round(2),
+        TARGET_COLUMN: price.round(2)
+    })
+    for col in ('Rainfall (mm)', 'Temperature (Celsius)', 'Season', TARGET_COLUMN):
+        df.loc[rng.random(n_rows) < 0.01, col] = np.nan
+    return df[EXPECTED_COLUMNS]
+
+
+# --- Cases (each runs in its own process) ---
+def run_training_case(n_rows, mode, seed):
+    import train_model
+
+    with tempfile.TemporaryDirectory(prefix='agriprice-bench-') as workdir, redirect_stdout(sys.stderr):
+        data_path = os.path.join(workdir, 'prices.csv')
+        generate_price_table(n_rows, seed).to_csv(data_path, index=False)
+        models_dir = os.path.join(workdir, 'models')
+        start = time.perf_counter()
+        if mode == 'streaming':
+            report = train_model.train_streaming(data_path, models_dir)
+        else:
+            report = train_model.train_full(data_path, models_dir)
+        total_seconds = time.perf_counter() - start
+        artifact_mb = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(models_dir) for name in names
+        ) / 2**20
+
+    return {
+        "rows": n_rows,
+        "mode": mode,
+        "stages": {entry["stage"]: {"seconds": round(entry["seconds"], 4), "peak_traced_mb": round(entry["peak_mb"], 1)} for entry in report["stages"]},
+        "total_seconds": round(total_seconds, 4),
+        "artifacts_mb": round(artifact_mb, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1)
+    }
+
+
+def train_serving_model(workdir, n_rows, seed):
+    """
+    Trains the model the serving cases query (train_model.py full mode) into workdir/models/.
+    """
+    import train_model
+
+    with redirect_stdout(sys.stderr):
+        data_path = os.path.join(workdir, 'prices.csv')
+        generate_price_table(n_rows, seed).to_csv(data_path, index=False)
+        train_model.train_full(data_path, os.path.join(workdir, 'models'))
+
+
+def _prediction_payloads(metadata, n, seed):
+    """
+    Deterministic /api/predict bodies drawn from the served metadata grid.
+    """
+    crops = [crop for crops in metadata["crop_types_by_category"].values() for crop in crops]
+    locations = [(country, state) for country in metadata["countries"] for state in metadata["states_by_country"].get(country, [])]
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(n):
+        country, state = locations[rng.integers(len(locations))]
+        payloads.append({
+            "crop_type": crops[rng.integers(len(crops))],
+            "season": metadata["seasons"][rng.integers(len(metadata["seasons"]))],
+            "country": country,
+            "state": state
+        })
+    return payloads
+
+
+def _drive(app, method, path, payloads, concurrency):
+    """
+    Sends one request per payload with `concurrency` client threads; returns (latencies, wall, errors).
+    """
+    def send(payload):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=payload)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, payloads))
+    wall_seconds = time.perf_counter() - start
+    return [latency for latency, _ in outcomes], wall_seconds, sum(status != 200 for _, status in outcomes)
+
+
+def run_serving_case(serve_dir, env, concurrency_levels, n_requests, seed):
+    os.chdir(serve_dir) # app.py resolves models/ relative to the working directory
+    os.environ.update(env)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import_start = time.perf_counter()
+    with redirect_stdout(sys.stderr): # Keep the app's load messages out of the JSON report
+        import app as backend
+    import_seconds = time.perf_counter() - import_start
+
+    app = backend.app
+    app.testing = True
+    payloads = _prediction_payloads(backend.metadata_response, n_requests, seed)
+    results = []
+    with redirect_stdout(sys.stderr):
+        _drive(app, 'POST', '/api/predict', payloads[:min(20, n_requests)], 1) # Warm-up, not reported
+    for concurrency in concurrency_levels:
+        backend.forecast_cache.clear() # Same cold/warm mix at every level
+        for endpoint, method, bodies in (
+            ('/api/predict', 'POST', payloads),
+            ('/api/metadata', 'GET', [None] * n_requests)
+        ):
+            latencies, wall_seconds, errors = _drive(app, method, endpoint, bodies, concurrency)
+            results.append({"endpoint": endpoint, "concurrency": concurrency, "errors": errors, **_latency_summary(latencies, wall_seconds)})
+
+    sources = {}
+    for labels, value in backend.metrics.counter_values('agriprice_predictions_total').items():
+        sources[dict(labels)["source"]] = value
+    return {
+        "model_loaded": backend.model_bundle.pipeline is not None,
+        "import_seconds": round(import_seconds, 4),
+        "prediction_sources": sources, # ml / cache / fallback share, to tell what was actually measured
+        "cache": backend.forecast_cache.stats(),
+        "results": results,
+        "peak_rss_mb": round(_peak_rss_mb(), 1)
+    }
+
+
+TRAINING_ONLY_MODULES = ['pandas', 'sklearn', 'scipy', 'joblib']
+
+# Run with 'python -c' in a fresh interpreter, so only app.py's own imports are measured. After the
+# import it forks one child, like a preloading server (gunicorn.conf.py) forks a worker; the child
+# serves some predictions and reports the memory it no longer shares with the parent.
+STARTUP_PROBE = '''
+import gc, json, os, resource, sys, time
+start = time.perf_counter()
+import app
+report = {
+    "import_seconds": round(time.perf_counter() - start, 4),
+    "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "model_loaded": app.model_bundle.pipeline is not None,
+    "training_modules_imported": [name for name in %r if name in sys.modules]
+}
+gc.collect()
+gc.freeze()
+read_end, write_end = os.pipe()
+if os.fork() == 0:
+    start = time.perf_counter()
+    app.start_background_threads()
+    client = app.app.test_client()
+    for crop_type, season, country, state in app.prediction_grid()[:%d]:
+        client.post('/api/predict', json={"crop_type": crop_type, "season": season, "country": country, "state": state})
+    private_kb = 0
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            private_kb = sum(int(line.split()[1]) for line in f if line.startswith(('Private_Clean', 'Private_Dirty')))
+    except OSError:
+        pass
+    os.write(write_end, json.dumps({
+        "requests_seconds": round(time.perf_counter() - start, 4),
+        "private_mb": round(private_kb / 1024, 1),
+        "training_modules_imported": [name for name in %r if name in sys.modules]
+    }).encode())
+    os._exit(0)
+os.close(write_end)
+report["forked_worker"] = json.loads(os.read(read_end, 4096) or b'{}')
+os.wait()
+print(json.dumps(report))
+'''
+
+
+def run_startup_case(serve_dir, env, n_requests):
+    """
+    Reports app.py's import time and RSS, which training-only modules it imports, and the
+    private (unshared) memory of a worker forked after the import.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE % (TRAINING_ONLY_MODULES, n_requests, TRAINING_ONLY_MODULES)],
+        cwd=serve_dir, env={**os.environ, **env, 'MODEL_RELOAD_INTERVAL': '0', 'START_BACKGROUND_THREADS': '0',
+                            'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))},
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _run_isolated(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AgriPricePro training and serving.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Synthetic dataset sizes (rows) to train on.")
+    parser.add_argument('--training-mode', choices=['full', 'streaming'], default='full', help="train_model.py mode to benchmark.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY, help="Client threads for the serving benchmark.")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="Requests per endpoint and concurrency level.")
+    parser.add_argument('--serving-rows', type=int, default=DEFAULT_SERVING_ROWS, help="Synthetic rows the served model is trained on.")
+    parser.add_argument('--models-dir', help="Serve these trained assets (a directory named 'models') instead of a synthetic model.")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Extra app.py configuration for the serving benchmark, e.g. --env INFERENCE_ENGINE=flat.")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--skip-training', action='store_true')
+    parser.add_argument('--skip-serving', action='store_true')
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args)
+        }
+    }
+
+    if not args.skip_training:
+        report["training"] = []
+        for n_rows in args.sizes:
+            print(f"Benchmarking training ({args.training_mode}) on {n_rows} rows...", file=sys.stderr)
+            report["training"].append(_run_isolated(run_training_case, n_rows, args.training_mode, args.seed))
+
+    if not args.skip_serving:
+        env = dict(entry.split('=', 1) for entry in args.env)
+        with tempfile.TemporaryDirectory(prefix='agriprice-bench-serve-') as workdir:
+            # app.py always reads 'models/' from its working directory, so serve from its parent
+            if args.models_dir:
+                models_dir = os.path.abspath(args.models_dir)
+                if os.path.basename(models_dir) != 'models':
+                    raise SystemExit("--models-dir must point at a directory named 'models' (app.py's MODEL_DIR).")
+                serve_dir = os.path.dirname(models_dir)
+                report["served_model"] = {"models_dir": models_dir}
+            else:
+                print(f"Training the served model on {args.serving_rows} synthetic rows...", file=sys.stderr)
+                _run_isolated(train_serving_model, workdir, args.serving_rows, args.seed)
+                serve_dir = workdir
+                report["served_model"] = {"synthetic_rows": args.serving_rows, "seed": args.seed}
+            print(f"Benchmarking serving at concurrency {args.concurrency}...", file=sys.stderr)
+            report["startup"] = run_startup_case(serve_dir, env, min(args.requests, 200))
+            report["serving"] = _run_isolated(run_serving_case, serve_dir, env, args.concurrency, args.requests, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Benchmark report written to '{args.output}'.", file=sys.stderr)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# backend/export_snapshots.py
+# Precomputes /api/predict for the whole (crop, season, country, state) grid offered by
+# /api/metadata and writes the responses, in full and compact form, as gzip'd snapshot files
+# (see snapshot_store.py):
+#
+#   cd backend
+#   python export_snapshots.py                      # writes models/snapshots/
+#   SNAPSHOT_DIR=models/snapshots python app.py     # serves them, live inference only for misses
+#
+# Uses the same model and configuration (MODEL_FORMAT, INFERENCE_ENGINE) as app.py. Forecasts
+# depend on the current month, so re-run it monthly and after every retraining; app.py ignores
+# a snapshot set whose model version or month no longer matches.
+
+import argparse
+import datetime
+import os
+import time
+
+# Snapshots are computed once; no forecast cache, warm-up or model polling in this process
+os.environ['FORECAST_CACHE_SIZE'] = '0'
+os.environ['FORECAST_CACHE_WARMUP'] = '0'
+os.environ['MODEL_RELOAD_INTERVAL'] = '0'
+
+import app as backend
+from snapshot_store import write_snapshots
+
+DEFAULT_CHUNK_SIZE = 5000 # Grid items per batched predict call
+
+
+def is_fallback(result):
+    # Items whose prediction failed carry the simulation's text keys
+    return result["factors"]["weather"]["condition"].startswith('fallback.')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export precomputed /api/predict snapshots for the metadata grid.")
+    parser.add_argument('--out', default=os.path.join(backend.MODEL_DIR, 'snapshots'), help="Snapshot directory to write.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Grid items per batched predict call.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bundle = backend.model_bundle
+    if bundle.pipeline is None:
+        print("ERROR: No ML model loaded; snapshots of the fallback simulation are not exported.")
+        exit()
+
+    today = datetime.date.today()
+    items = backend.prediction_grid()
+    print(f"Evaluating {len(items)} grid entries with model '{bundle.version}'...")
+    start = time.perf_counter()
+    responses = []
+    skipped = 0
+    for offset in range(0, len(items), args.chunk_size):
+        chunk = items[offset:offset + args.chunk_size]
+        for item, result in zip(chunk, backend.get_ml_predictions(chunk)):
+            if is_fallback(result):
+                # This item fell back to the simulation; leave it to live inference
+                skipped += 1
+                continue
+            # Both forms /api/predict answers with: full, and compact (?compact=1, which the frontend uses)
+            responses.append((item, {"full": backend.finish_prediction(item, dict(result)), "compact": backend.finish_prediction(item, result, True)}))
+
+    index = write_snapshots(args.out, responses, bundle.version, today.year, today.month)
+    files = {variant["file"]: variant["size"] for entry in index["entries"].values() for variant in entry.values()}
+    n_files = len(files)
+    total_mb = sum(files.values()) / 2**20
+    print(f"Wrote {len(index['entries'])} snapshots ({n_files} files, {total_mb:.1f} MB gzip'd) to '{args.out}/' "
+          f"in {time.perf_counter() - start:.1f}s; {skipped} entries skipped after prediction errors.")
+    return index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# backend/forecast_cache.py
+# Bounded, time-limited cache for /api/predict responses.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+    Keys are normalized prediction requests; values are prediction result dicts.
+    """
+
+    def __init__(self, max_size=8192, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key] # Expired entries count as misses
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False) # Drop the least recently used entry
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def make_forecast_key(crop_type, season, country, state, year, month, model_version):
+    """
+    Builds the cache key of a prediction request. The fields must already be normalized (see
+    app.parse_prediction_item), since the prediction itself uses the same values.
+    The current year/month and the model version are part of the key, so entries roll over
+    when the month changes or a new model is loaded.
+    """
+    return (crop_type, season, country, state, year, month, model_version)
@@ -0,0 +1,253 @@
+# backend/forest_artifact.py
+# Compact, memory-mappable export of the trained preprocessing + Random Forest pipeline.
+#
+# A pickled RandomForestRegressor is copied into private heap memory by every worker that
+# loads it (sklearn's Tree.__setstate__ memcpy's the node arrays). This module flattens the
+# fitted pipeline into plain .npy files that np.load can map read-only, so N gunicorn workers
+# share one copy of the tree arrays through the OS page cache.
+#
+# The same flattened form doubles as an inference engine (FlatForest): scaler parameters,
+# a category -> encoded column map and one concatenated node table, evaluated for all trees
+# at once with vectorized traversal and no DataFrame or per-tree dispatch.
+#
+# Artifact layout (one directory):
+#   manifest.json        preprocessing parameters, column layout, tree count, max depth
+#   children_left.npy    int32, global node index of left child (leaves point to themselves)
+#   children_right.npy   int32, global node index of right child (leaves point to themselves)
+#   feature.npy          int32, encoded feature index tested at each node (0 for leaves)
+#   threshold.npy        float64, split threshold (go left when x <= threshold)
+#   value.npy            float64, (n_nodes, n_outputs) node predictions
+#   tree_roots.npy       int32, global index of each tree's root node
+
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+ARTIFACT_FORMAT_VERSION = 2 # 2: leaves are self-loops, max_depth in manifest
+ARRAY_NAMES = ['children_left', 'children_right', 'feature', 'threshold', 'value', 'tree_roots']
+
+
+def flatten_pipeline(pipeline, model_version=None):
+    """
+    Compiles a fitted ColumnTransformer(StandardScaler, OneHotEncoder) + RandomForestRegressor
+    pipeline into (manifest, arrays).
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    regressor = pipeline.named_steps['regressor']
+
+    # --- Preprocessing parameters, in ColumnTransformer output order ---
+    numeric_columns, means, scales = [], [], []
+    categorical_columns, categories = [], []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        kind = type(transformer).__name__
+        if kind == 'StandardScaler':
+            if categorical_columns:
+                raise ValueError("Numeric transformers must come before categorical ones in the flat artifact.")
+            numeric_columns.extend(columns)
+            n = len(columns)
+            means.extend((transformer.mean_ if transformer.mean_ is not None else np.zeros(n)).tolist())
+            scales.extend((transformer.scale_ if transformer.scale_ is not None else np.ones(n)).tolist())
+        elif kind == 'OneHotEncoder':
+            if transformer.drop is not None or transformer.handle_unknown != 'ignore':
+                raise ValueError("Only OneHotEncoder(handle_unknown='ignore', drop=None) can be flattened.")
+            categorical_columns.extend(columns)
+            categories.extend([cats.tolist() for cats in transformer.categories_])
+        else:
+            raise ValueError(f"Unsupported transformer '{name}' ({kind}) in pipeline.")
+
+    # --- Trees, concatenated into one node table ---
+    # Leaves point to themselves, so every row can take exactly max_depth steps without masking
+    children_left, children_right, feature, threshold, value, tree_roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in regressor.estimators_:
+        tree = estimator.tree_
+        own_index = np.arange(offset, offset + tree.node_count, dtype=np.int64)
+        is_leaf = tree.children_left == -1
+        children_left.append(np.where(is_leaf, own_index, tree.children_left + offset))
+        children_right.append(np.where(is_leaf, own_index, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold.astype(np.float64))
+        value.append(tree.value[:, :, 0].astype(np.float64))
+        tree_roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    arrays = {
+        'children_left': np.concatenate(children_left).astype(np.int32),
+        'children_right': np.concatenate(children_right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value),
+        'tree_roots': np.asarray(tree_roots, dtype=np.int32)
+    }
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "model_version": model_version,
+        "numeric_columns": list(numeric_columns),
+        "scaler_mean": means,
+        "scaler_scale": scales,
+        "categorical_columns": list(categorical_columns),
+        "categories": categories,
+        "n_features": int(regressor.n_features_in_),
+        "n_outputs": int(regressor.n_outputs_),
+        "n_trees": len(tree_roots),
+        "n_nodes": int(offset),
+        "max_depth": max_depth
+    }
+    return manifest, arrays
+
+
+def export_forest_artifact(pipeline, out_dir, model_version=None):
+    """
+    Writes the fitted pipeline to out_dir as uncompressed .npy arrays plus a JSON manifest.
+    """
+    manifest, arrays = flatten_pipeline(pipeline, model_version)
+
+    # Write into a temporary directory, then swap it in, so readers never see a partial artifact
+    tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+class FlatForest:
+    """
+    A flattened pipeline, either compiled in memory or loaded from an artifact directory.
+    predict() accepts a DataFrame or any mapping of column name -> sequence with the same raw
+    columns the sklearn pipeline was trained on; predict_records() takes a list of dicts.
+    Results match Pipeline.predict to float tolerance.
+    """
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.model_version = manifest.get("model_version")
+        self.numeric_columns = manifest["numeric_columns"]
+        self.scaler_mean = np.asarray(manifest["scaler_mean"], dtype=np.float64)
+        self.scaler_scale = np.asarray(manifest["scaler_scale"], dtype=np.float64)
+        self.categorical_columns = manifest["categorical_columns"]
+        self.n_features = manifest["n_features"]
+        self.n_outputs = manifest["n_outputs"]
+        self.max_depth = manifest["max_depth"]
+        # Category value -> encoded column index, one dict per categorical column
+        self.category_index = []
+        # Encoded column of a missing (NaN/None) category per categorical column, or None: the encoder
+        # learns one when training data had gaps, and NaN can't be looked up in a dict (NaN != NaN)
+        self.missing_index = []
+        column = len(self.numeric_columns)
+        for cats in manifest["categories"]:
+            self.category_index.append({cat: column + i for i, cat in enumerate(cats) if not _is_missing(cat)})
+            self.missing_index.append(next((column + i for i, cat in enumerate(cats) if _is_missing(cat)), None))
+            column += len(cats)
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    def transform(self, frame):
+        """
+        Applies the scaler and one-hot encoding, returning a dense float32 matrix
+        (trees compare float32 features, exactly like sklearn).
+        """
+        n = len(frame[self.numeric_columns[0]] if self.numeric_columns else frame[self.categorical_columns[0]])
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        if self.numeric_columns:
+            numeric = np.column_stack([np.asarray(frame[col], dtype=np.float64) for col in self.numeric_columns])
+            X[:, :len(self.numeric_columns)] = (numeric - self.scaler_mean) / self.scaler_scale
+        rows = np.arange(n)
+        for col, index, missing in zip(self.categorical_columns, self.category_index, self.missing_index):
+            if missing is None:
+                encoded = np.fromiter((index.get(value, -1) for value in frame[col]), dtype=np.int64, count=n)
+            else:
+                encoded = np.fromiter((missing if _is_missing(value) else index.get(value, -1) for value in frame[col]), dtype=np.int64, count=n)
+            known = encoded >= 0 # Unknown categories stay all-zero (handle_unknown='ignore')
+            X[rows[known], encoded[known]] = 1.0
+        return X.astype(np.float32)
+
+    def apply(self, X):
+        """
+        Returns the leaf node reached in every tree, shape (n_rows, n_trees).
+        All (row, tree) pairs advance together, one level per step; pairs that have reached
+        a leaf (a self-loop) are dropped from the working set.
+        """
+        n_rows, n_features = X.shape
+        n_trees = len(self.tree_roots)
+        flat_X = X.ravel()
+        node = np.tile(self.tree_roots.astype(np.intp), n_rows)
+        active = np.arange(n_rows * n_trees)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, n_trees)
+        current = node.copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_offset + self.feature[current]] <= self.threshold[current]
+            following = np.where(go_left, self.children_left[current], self.children_right[current])
+            moving = following != current
+            node[active] = following
+            if not moving.all():
+                active, following, row_offset = active[moving], following[moving], row_offset[moving]
+                if active.size == 0:
+                    break
+            current = following
+        return node.reshape(n_rows, n_trees)
+
+    def predict_per_tree(self, frame):
+        """
+        Returns every tree's prediction, shape (n_rows, n_trees, n_outputs).
+        """
+        return self.value[self.apply(self.transform(frame))]
+
+    def predict(self, frame):
+        total = self.predict_per_tree(frame).mean(axis=1)
+        return total[:, 0] if self.n_outputs == 1 else total
+
+    def predict_records(self, records):
+        """
+        Predicts for a list of dicts (raw feature name -> value) without building a DataFrame.
+        """
+        columns = {col: [record[col] for record in records] for col in self.numeric_columns + self.categorical_columns}
+        return self.predict(columns)
+
+
+def compile_pipeline(pipeline, model_version=None):
+    """
+    Compiles a fitted sklearn pipeline into an in-memory FlatForest.
+    """
+    manifest, arrays = flatten_pipeline(pipeline, model_version)
+    return FlatForest(manifest, arrays)
+
+
+def load_forest_artifact(artifact_dir, mmap=True):
+    """
+    Loads an artifact directory. With mmap=True the node arrays are mapped read-only
+    instead of being read into private memory.
+    """
+    with open(os.path.join(artifact_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported forest artifact format: {manifest.get('format_version')}")
+    mmap_mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(artifact_dir, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+    return FlatForest(manifest, arrays)
+
+
+# Convert an existing pickled pipeline without retraining:
+#   python forest_artifact.py models/crop_price_rf_pipeline.pkl models/crop_price_rf_flat
+if __name__ == '__main__':
+    import joblib
+    if len(sys.argv) != 3:
+        print("Usage: python forest_artifact.py <pipeline.pkl> <artifact_dir>")
+        sys.exit(1)
+    manifest = export_forest_artifact(joblib.load(sys.argv[1]), sys.argv[2])
+    print(f"Exported {manifest['n_trees']} trees ({manifest['n_nodes']} nodes) to '{sys.argv[2]}'.")
@@ -0,0 +1,34 @@
+# backend/gunicorn.conf.py
+# Multi-process serving with the model loaded once, before the workers are forked:
+#
+#   cd backend
+#   MODEL_FORMAT=flat gunicorn -c gunicorn.conf.py app:app
+#   MODEL_FORMAT=flat gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:asgi_app
+#
+# The master imports app.py (loading the model, price history and metadata) and the workers
+# inherit it copy-on-write, so adding a worker costs a fork instead of a full import and model
+# load. With MODEL_FORMAT=flat the serving path imports only NumPy and Flask, never pandas,
+# scikit-learn or joblib (see requirements-serving.txt), and the tree arrays are memory-mapped,
+# so all workers share one copy through the page cache.
+
+import gc
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+# Threads do not survive fork(): app.py must not start them in the master
+os.environ['START_BACKGROUND_THREADS'] = '0'
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach, so collections in the workers
+    # don't touch (and un-share) the inherited pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_threads()
@@ -0,0 +1,145 @@
+# backend/horizon_forecast.py
+# Direct multi-horizon forecasting of the 12-month chart from the observed state-level price history.
+#
+# One multi-output Random Forest predicts the log price ratio log(price[t+h] / price[t]) for every
+# horizon h = 1..12 at once from features of the last 13 months of one series (recent log returns,
+# volatility, level and season). It is trained on every window of the price history store
+# (see price_history.py) and exported as a flat forest artifact, so app.py gets all 12 horizons of
+# every tree for a whole batch of keys from one FlatForest.predict_per_tree call. The forecast is
+# the mean over trees; the spread of the per-tree forecasts gives the confidence.
+# pandas and scikit-learn are imported inside train_horizon_model, so forecasting stays NumPy-only.
+
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from forest_artifact import export_forest_artifact
+from price_history import PERIOD_STRIDE, from_period
+
+HORIZONS = 12
+WINDOW_MONTHS = 13 # The origin month plus 12 months of lags
+MAX_GAP_MONTHS = 2 # Missing months filled forward; longer gaps break a window
+LAGS = [1, 2, 3, 6, 12]
+HORIZON_FEATURES = [f'return_{lag}m' for lag in LAGS] + ['volatility_6m', 'log_price', 'month_sin', 'month_cos']
+MIN_TRAINING_WINDOWS = 50
+MAX_TRAINING_WINDOWS = 200_000 # Windows beyond this are subsampled to bound training time
+CONFIDENCE_QUANTILES = (10, 90) # Per-tree forecast quantiles used for the confidence score
+
+
+def fill_gaps(prices):
+    """
+    Forward-fills gaps of up to MAX_GAP_MONTHS in a monthly price array (NaN = no observation).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    positions = np.arange(len(prices))
+    last_observed = np.maximum.accumulate(np.where(np.isnan(prices), -1, positions))
+    filled = prices[np.maximum(last_observed, 0)]
+    return np.where((last_observed >= 0) & (positions - last_observed <= MAX_GAP_MONTHS), filled, np.nan)
+
+
+def window_features(log_windows, origin_months):
+    """
+    Features for windows of WINDOW_MONTHS log prices (oldest -> origin), shape (n, WINDOW_MONTHS),
+    with the calendar month (1-12) of each origin. Returns {feature: array}.
+    """
+    origin = log_windows[:, -1]
+    features = {f'return_{lag}m': origin - log_windows[:, -1 - lag] for lag in LAGS}
+    features['volatility_6m'] = np.diff(log_windows[:, -7:], axis=1).std(axis=1)
+    features['log_price'] = origin
+    angle = 2 * np.pi * (np.asarray(origin_months) - 1) / 12
+    features['month_sin'] = np.sin(angle)
+    features['month_cos'] = np.cos(angle)
+    return features
+
+
+def build_horizon_training_set(store, level='state'):
+    """
+    Slides a (WINDOW_MONTHS + HORIZONS)-month window over every series in the store.
+    Returns (features dict, log-ratio targets of shape (n, HORIZONS)).
+    """
+    keys = np.asarray(store.arrays[level]['keys'])
+    prices = np.asarray(store.arrays[level]['price'], dtype=np.float64)
+    series_ids = keys // PERIOD_STRIDE
+    periods = keys % PERIOD_STRIDE
+    boundaries = np.flatnonzero(np.diff(series_ids)) + 1
+    span = WINDOW_MONTHS + HORIZONS
+
+    window_parts, month_parts = [], []
+    for rows in np.split(np.arange(len(keys)), boundaries):
+        first, last = periods[rows[0]], periods[rows[-1]]
+        if last - first + 1 < span:
+            continue
+        grid = np.full(last - first + 1, np.nan)
+        grid[periods[rows] - first] = prices[rows]
+        windows = sliding_window_view(np.log(fill_gaps(grid)), span)
+        complete = ~np.isnan(windows).any(axis=1)
+        window_parts.append(windows[complete])
+        origin_periods = first + np.flatnonzero(complete) + WINDOW_MONTHS - 1
+        month_parts.append(origin_periods % 12 + 1)
+
+    if not window_parts:
+        return None, None
+    windows = np.concatenate(window_parts)
+    months = np.concatenate(month_parts)
+    features = window_features(windows[:, :WINDOW_MONTHS], months)
+    targets = windows[:, WINDOW_MONTHS:] - windows[:, WINDOW_MONTHS - 1:WINDOW_MONTHS]
+    return features, targets
+
+
+def build_horizon_pipeline(n_estimators=50, random_state=42):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    return Pipeline(steps=[
+        ('preprocessor', ColumnTransformer(transformers=[('num', StandardScaler(), HORIZON_FEATURES)])),
+        ('regressor', RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=5, random_state=random_state, n_jobs=-1))
+    ])
+
+
+def train_horizon_model(store, out_dir, n_estimators=50, random_state=42):
+    """
+    Fits the multi-output forest on the store and exports it to out_dir as a flat artifact.
+    Returns the manifest, or None when the history is too short to train on.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    features, targets = build_horizon_training_set(store)
+    if features is None or len(targets) < MIN_TRAINING_WINDOWS:
+        print(f"Not enough complete {WINDOW_MONTHS + HORIZONS}-month price windows to train the horizon model; the chart forecast stays simulated.")
+        return None
+    if len(targets) > MAX_TRAINING_WINDOWS:
+        keep = np.sort(np.random.default_rng(random_state).choice(len(targets), MAX_TRAINING_WINDOWS, replace=False))
+        features = {name: values[keep] for name, values in features.items()}
+        targets = targets[keep]
+
+    pipeline = build_horizon_pipeline(n_estimators, random_state)
+    pipeline.fit(pd.DataFrame(features, columns=HORIZON_FEATURES), targets)
+    manifest = export_forest_artifact(pipeline, out_dir)
+    print(f"Horizon model trained on {len(targets)} windows ({HORIZONS} outputs, {manifest['n_trees']} trees) in {time.perf_counter() - start:.2f}s.")
+    return manifest
+
+
+def series_window(store, crop, path, end, level='state'):
+    """
+    Returns the gap-filled WINDOW_MONTHS prices ending at end for one series, or None if incomplete.
+    """
+    window = fill_gaps(store.monthly_prices(level, crop, path, end, WINDOW_MONTHS))
+    return None if np.isnan(window).any() else window
+
+
+def forecast_horizons(model, windows, end_periods):
+    """
+    Forecasts all horizons for a batch of series in one predict_per_tree call.
+    windows: (n, WINDOW_MONTHS) prices; end_periods: month number (year * 12 + month - 1) of each
+    window's last month. Returns (future_prices, confidence_scores), both shaped (n, HORIZONS).
+    """
+    windows = np.asarray(windows, dtype=np.float64)
+    months = np.array([from_period(int(period))[1] for period in end_periods])
+    per_tree = model.predict_per_tree(window_features(np.log(windows), months)) # (n, trees, horizons)
+    per_tree_prices = windows[:, -1, None, None] * np.exp(per_tree)
+    future_prices = per_tree_prices.mean(axis=1)
+    low, high = np.percentile(per_tree_prices, CONFIDENCE_QUANTILES, axis=1)
+    # A narrow spread between the trees' forecasts means high confidence
+    confidence_scores = np.clip(100 * (1 - (high - low) / future_prices), 0, 100)
+    return future_prices, confidence_scores
@@ -0,0 +1,54 @@
+# backend/metadata_store.py
+# Compact, indexed dropdown metadata written by train_model.py and served by /api/metadata.
+#
+# The artifact (models/metadata_index.json) stores each hierarchy level as a flat list of node
+# names plus the index of every node's parent in the level above:
+#   crop_category <- crop_type
+#   country <- state <- district <- market
+# Node names are unique per path, so a district name that appears in two states is two nodes.
+# Seasons and months are plain lists.
+
+import json
+
+METADATA_INDEX_VERSION = 1
+CROP_LEVELS = ['crop_category', 'crop_type']
+LOCATION_LEVELS = ['country', 'state', 'district', 'market']
+
+
+def load_metadata_index(path):
+    with open(path) as f:
+        index = json.load(f)
+    if index.get("version") != METADATA_INDEX_VERSION:
+        raise ValueError(f"Unsupported metadata index version: {index.get('version')}")
+    return index
+
+
+def _children_by_parent(index, parent_level, child_level):
+    """
+    Maps each parent name to the (de-duplicated) names of its children.
+    """
+    parent_names = index["levels"][parent_level]["names"]
+    child = index["levels"][child_level]
+    mapping = {}
+    for name, parent in zip(child["names"], child["parent"]):
+        children = mapping.setdefault(parent_names[parent], [])
+        if name not in children:
+            children.append(name)
+    return mapping
+
+
+def expand_metadata_index(index):
+    """
+    Expands the indexed artifact into the /api/metadata response shape.
+    """
+    levels = index["levels"]
+    return {
+        "crop_categories": levels["crop_category"]["names"],
+        "crop_types_by_category": _children_by_parent(index, "crop_category", "crop_type"),
+        "countries": levels["country"]["names"],
+        "states_by_country": _children_by_parent(index, "country", "state"),
+        "districts_by_state": _children_by_parent(index, "state", "district"),
+        "markets_by_district": _children_by_parent(index, "district", "market"),
+        "seasons": index["seasons"],
+        "months": index["months"]
+    }
@@ -0,0 +1,130 @@
+# backend/metrics.py
+# Minimal in-process instrumentation: labelled counters, latency histograms and per-request
+# stage profiles, rendered in the Prometheus text exposition format by /api/metrics.
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Stage timings for the request being profiled on this thread/task (None when not profiling)
+_current_profile = ContextVar('current_profile', default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and histograms keyed by (metric name, label tuple).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {} # name -> {labels: value}
+        self._histograms = {} # name -> {labels: [bucket_counts, sum, count]}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def counter_values(self, name):
+        """
+        Returns a copy of one counter's {labels_tuple: value} series.
+        """
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a block into the 'agriprice_stage_seconds' histogram and, when the current
+        request is being profiled, into its stage breakdown.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('agriprice_stage_seconds', elapsed, stage=name)
+            profile = _current_profile.get()
+            if profile is not None:
+                profile[name] = profile.get(name, 0.0) + elapsed
+
+    def render(self, gauges=()):
+        """
+        Returns all metrics in Prometheus text format. gauges is an iterable of
+        (name, help, value, labels_dict) sampled at scrape time (e.g. cache and queue stats).
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, (bucket_counts, total, count) in sorted(series.items()):
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        seen = set()
+        for name, help_text, value, labels in gauges:
+            if name not in seen:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def start_profile():
+    """
+    Starts collecting a stage breakdown for the current request; returns (profile, reset_token).
+    """
+    profile = {}
+    return profile, _current_profile.set(profile)
+
+
+def stop_profile(token):
+    _current_profile.reset(token)
+
+
+def format_server_timing(profile):
+    """
+    Formats a stage breakdown as a Server-Timing header value (durations in milliseconds).
+    """
+    return ', '.join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in profile.items())
@@ -0,0 +1,87 @@
+# backend/model_versions.py
+# Versioned model directories written by every training run (train_model.py, all modes).
+#
+#   models/                     training data for incremental updates (training_data/); assets
+#                               placed here directly (e.g. copied by hand) are served without a pointer
+#   models/versions/v0001/      complete asset set of one training run or incremental update
+#   models/CURRENT_VERSION      name of the version app.py should serve; absent -> serve models/
+#
+# The pointer is replaced with os.replace, so a reader sees either the old or the new version name,
+# never a partial write, and a version directory is always complete before it is pointed at.
+# Once the pointer has moved, prune_versions deletes all but the newest versions (plus the current one).
+
+import json
+import os
+import shutil
+
+VERSIONS_DIR = 'versions'
+POINTER_FILE = 'CURRENT_VERSION'
+VERSION_INFO_FILE = 'version.json'
+
+
+def current_version(models_dir):
+    """
+    Returns the version name in the pointer file, or None when the base assets are current.
+    """
+    try:
+        with open(os.path.join(models_dir, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_model_dir(models_dir):
+    """
+    Returns the directory holding the assets that should be served.
+    """
+    version = current_version(models_dir)
+    return os.path.join(models_dir, VERSIONS_DIR, version) if version else models_dir
+
+
+def list_versions(models_dir):
+    """
+    Returns the version names under models_dir/versions/, oldest first.
+    """
+    versions_dir = os.path.join(models_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted((name for name in os.listdir(versions_dir) if name[:1] == 'v' and name[1:].isdigit()), key=lambda name: int(name[1:]))
+
+
+def next_version_name(models_dir):
+    existing = list_versions(models_dir)
+    return f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+
+
+def write_version_info(version_dir, info):
+    with open(os.path.join(version_dir, VERSION_INFO_FILE), 'w') as f:
+        json.dump(info, f, indent=2)
+
+
+def set_current_version(models_dir, version):
+    """
+    Atomically points models_dir at a version (None resets it to the base assets).
+    """
+    pointer_path = os.path.join(models_dir, POINTER_FILE)
+    if version is None:
+        if os.path.exists(pointer_path):
+            os.remove(pointer_path)
+        return
+    tmp_path = pointer_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, pointer_path)
+
+
+def prune_versions(models_dir, keep):
+    """
+    Deletes all but the newest keep versions, never the current one. Call it only after
+    set_current_version, so the version being switched to is never a candidate.
+    Returns the deleted version names.
+    """
+    current = current_version(models_dir)
+    versions = list_versions(models_dir)
+    removed = [name for name in versions[:max(len(versions) - keep, 0)] if name != current]
+    for name in removed:
+        shutil.rmtree(os.path.join(models_dir, VERSIONS_DIR, name), ignore_errors=True)
+    return removed
@@ -0,0 +1,116 @@
+# backend/prediction_batcher.py
+# Micro-batching of concurrent single predictions onto a bounded pool of worker threads.
+#
+# Requests are queued (bounded; a full queue is rejected immediately so the server can answer
+# 503 instead of piling up latency). Each worker takes the first waiting request, collects any
+# others that arrive within a short window, and runs them through one batch predict call.
+# The forest evaluation releases the GIL for most of its work, so threads are enough here.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised by MicroBatcher.submit when the request queue is at capacity."""
+
+
+class MicroBatcher:
+    """
+    Groups items submitted within window_ms into one predict_batch(items) call.
+    predict_batch must return one result per item, in order. If it raises for a batch,
+    the items are retried one at a time.
+    """
+
+    def __init__(self, predict_batch, max_queue=256, max_batch=64, window_ms=5, workers=2):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.workers = workers
+        self._threads = []
+
+    def start(self):
+        """
+        Starts the worker threads. Call it in the process that serves requests: threads do not
+        survive a fork, so a preloading server (gunicorn --preload) starts them in each worker.
+        """
+        self._threads = [
+            threading.Thread(target=self._run, name=f"prediction-batcher-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item):
+        """
+        Queues one item and returns a concurrent.futures.Future for its result.
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError("Prediction queue is full.")
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()] # Block until there is work
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.predict_batch([item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # Retry one by one, so an item that breaks the batch only fails its own request
+                    self._run_each(batch)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.batched_items += len(batch)
+
+    def _run_each(self, batch):
+        for item, future in batch:
+            try:
+                future.set_result(self.predict_batch([item])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "workers": len(self._threads),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "mean_batch_size": self.batched_items / self.batches if self.batches else 0.0
+            }
@@ -0,0 +1,224 @@
+# backend/price_history.py
+# Columnar store of observed monthly prices, written by train_model.py and queried by app.py.
+#
+# Rows are aggregated to one mean price per (crop, market, month) and, as a rollup, per
+# (crop, state, month), then sorted and written as plain .npy columns that np.load maps read-only.
+# Location nodes are unique per full path (like metadata_index.json), so one integer identifies
+# a country/state or country/state/district/market, and each row gets a single sortable int64 key:
+#   key = (crop_code * n_nodes + node_id) * PERIOD_STRIDE + (year * 12 + month - 1)
+# A time-range query for one series is then two np.searchsorted calls (O(log n)) plus a slice.
+#
+# Store layout (one directory):
+#   manifest.json                       crops and state paths, row counts
+#   markets.json                        market paths (loaded on the first market-level query)
+#   state_keys.npy / market_keys.npy    int64 sorted keys
+#   state_price.npy / market_price.npy  float32 mean Average Price per month
+#   state_previous_year_price.npy / market_previous_year_price.npy
+#                                       float32 mean Previous Year Price per month (NaN if unknown)
+# Only the writer functions (used by train_model.py) need pandas, and they import it themselves,
+# so loading and querying a store stays NumPy-only.
+
+import json
+import os
+import shutil
+import numpy as np
+
+PRICE_HISTORY_FORMAT_VERSION = 1
+PERIOD_STRIDE = 12 * 10000 # Months per series slot in the key (years 0-9999)
+LEVELS = {
+    'state': ['country', 'state'],
+    'market': ['country', 'state', 'district', 'market']
+}
+ARRAY_NAMES = ['keys', 'price', 'previous_year_price']
+KEY_COLUMNS = ['crop', 'country', 'state', 'district', 'market', 'year', 'month']
+AGGREGATE_COLUMNS = ['price_sum', 'price_count', 'previous_year_price_sum', 'previous_year_price_count']
+
+
+def to_period(year, month):
+    return year * 12 + month - 1
+
+
+def from_period(period):
+    return period // 12, period % 12 + 1
+
+
+def aggregate_price_rows(frame):
+    """
+    Reduces raw rows (columns: KEY_COLUMNS + price, previous_year_price) to per-market monthly
+    sums and counts. Partial aggregates of several chunks can be concatenated and passed to
+    combine_price_aggregates.
+    """
+    import pandas as pd
+    frame = frame.assign(
+        year=pd.to_numeric(frame['year'], errors='coerce'),
+        month=pd.to_numeric(frame['month'], errors='coerce'),
+        price=pd.to_numeric(frame['price'], errors='coerce'),
+        previous_year_price=pd.to_numeric(frame['previous_year_price'], errors='coerce')
+    ).dropna(subset=KEY_COLUMNS + ['price'])
+    frame = frame[frame['month'].between(1, 12)]
+    frame = frame.assign(
+        year=frame['year'].astype(np.int64),
+        month=frame['month'].astype(np.int64),
+        **{col: frame[col].astype(str) for col in KEY_COLUMNS[:5]}
+    )
+    grouped = frame.groupby(KEY_COLUMNS, sort=False)
+    return pd.DataFrame({
+        'price_sum': grouped['price'].sum(),
+        'price_count': grouped['price'].count(),
+        'previous_year_price_sum': grouped['previous_year_price'].sum(),
+        'previous_year_price_count': grouped['previous_year_price'].count()
+    }).reset_index()
+
+
+def combine_price_aggregates(parts):
+    import pandas as pd
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=KEY_COLUMNS + AGGREGATE_COLUMNS)
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts, ignore_index=True).groupby(KEY_COLUMNS, sort=False)[AGGREGATE_COLUMNS].sum().reset_index()
+
+
+def _level_arrays(aggregate, path_columns, crop_codes):
+    """
+    Rolls the aggregate up to one row per (crop, node, month) and returns (node_paths, arrays),
+    with arrays sorted by key.
+    """
+    import pandas as pd
+    rolled = aggregate.groupby(['crop'] + path_columns + ['year', 'month'], sort=False)[AGGREGATE_COLUMNS].sum().reset_index()
+    node_ids, node_paths = pd.MultiIndex.from_frame(rolled[path_columns]).factorize(sort=True)
+    period = to_period(rolled['year'].to_numpy(np.int64), rolled['month'].to_numpy(np.int64))
+    keys = (crop_codes.get_indexer(rolled['crop']).astype(np.int64) * len(node_paths) + node_ids) * PERIOD_STRIDE + period
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price = rolled['price_sum'].to_numpy(np.float64) / rolled['price_count'].to_numpy(np.float64)
+        previous_year_price = rolled['previous_year_price_sum'].to_numpy(np.float64) / rolled['previous_year_price_count'].to_numpy(np.float64)
+    order = np.argsort(keys, kind='stable')
+    arrays = {
+        'keys': keys[order],
+        'price': price[order].astype(np.float32),
+        'previous_year_price': previous_year_price[order].astype(np.float32) # NaN where count was 0
+    }
+    return [list(path) for path in node_paths], arrays
+
+
+def export_price_history(aggregate, out_dir):
+    """
+    Writes the store for a (combined) aggregate from aggregate_price_rows. Returns the manifest.
+    """
+    import pandas as pd
+    crops = pd.Index(sorted(aggregate['crop'].unique()))
+    manifest = {"format_version": PRICE_HISTORY_FORMAT_VERSION, "crops": crops.tolist(), "period_stride": PERIOD_STRIDE}
+    level_outputs = {}
+    for level, path_columns in LEVELS.items():
+        paths, arrays = _level_arrays(aggregate, path_columns, crops)
+        level_outputs[level] = (paths, arrays)
+        manifest[f"n_{level}_rows"] = int(len(arrays['keys']))
+        manifest[f"n_{level}s"] = len(paths)
+    manifest["states"] = level_outputs['state'][0]
+
+    # Write into a temporary directory, then swap it in, so readers never see a partial store
+    tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for level, (_, arrays) in level_outputs.items():
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{level}_{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, 'markets.json'), 'w') as f:
+        json.dump(level_outputs['market'][0], f, separators=(',', ':'))
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+class PriceHistoryStore:
+    """
+    Read side of the store. Periods are (year, month) tuples; ranges are inclusive.
+    """
+
+    def __init__(self, store_dir, manifest, arrays):
+        self.store_dir = store_dir
+        self.manifest = manifest
+        self.arrays = arrays # level -> {name: array}
+        self.crop_codes = {name: code for code, name in enumerate(manifest["crops"])}
+        self.node_ids = {'state': {tuple(path): i for i, path in enumerate(manifest["states"])}}
+        self.node_counts = {level: manifest[f"n_{level}s"] for level in LEVELS}
+
+    def _node_ids(self, level):
+        if level not in self.node_ids: # Market paths can be large; only load them when asked for
+            with open(os.path.join(self.store_dir, 'markets.json')) as f:
+                self.node_ids[level] = {tuple(path): i for i, path in enumerate(json.load(f))}
+        return self.node_ids[level]
+
+    def _series_base(self, level, crop, path):
+        crop_code = self.crop_codes.get(crop)
+        node_id = self._node_ids(level).get(tuple(path))
+        if crop_code is None or node_id is None:
+            return None
+        return (crop_code * self.node_counts[level] + node_id) * PERIOD_STRIDE
+
+    def _slice(self, level, crop, path, start, end):
+        base = self._series_base(level, crop, path)
+        if base is None:
+            return slice(0, 0)
+        keys = self.arrays[level]['keys']
+        lo = np.searchsorted(keys, base + to_period(*start), side='left')
+        hi = np.searchsorted(keys, base + to_period(*end), side='right')
+        return slice(int(lo), int(hi))
+
+    def query(self, level, crop, path, start, end):
+        """
+        Returns (periods, price, previous_year_price) arrays for one series between start and end,
+        where periods are month numbers (year * 12 + month - 1).
+        """
+        rows = self._slice(level, crop, path, start, end)
+        arrays = self.arrays[level]
+        return arrays['keys'][rows] % PERIOD_STRIDE, arrays['price'][rows], arrays['previous_year_price'][rows]
+
+    def latest_period(self, level, crop, path, end):
+        """
+        Returns the most recent (year, month) with an observation at or before end, or None.
+        """
+        base = self._series_base(level, crop, path)
+        if base is None:
+            return None
+        keys = self.arrays[level]['keys']
+        i = np.searchsorted(keys, base + to_period(*end), side='right') - 1
+        if i < 0 or keys[i] < base:
+            return None
+        return from_period(int(keys[i] - base))
+
+    def monthly_prices(self, level, crop, path, end, n_months):
+        """
+        Returns the n_months prices ending at end (inclusive) as a float64 array, NaN where
+        a month has no observation.
+        """
+        start_period = to_period(*end) - n_months + 1
+        periods, price, _ = self.query(level, crop, path, from_period(start_period), end)
+        out = np.full(n_months, np.nan)
+        out[periods - start_period] = price
+        return out
+
+    def price_at(self, level, crop, path, period):
+        """
+        Returns (price, previous_year_price) observed in one (year, month), or None.
+        """
+        _, price, previous_year_price = self.query(level, crop, path, period, period)
+        if len(price) == 0:
+            return None
+        return float(price[0]), float(previous_year_price[0])
+
+
+def load_price_history(store_dir, mmap=True):
+    with open(os.path.join(store_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != PRICE_HISTORY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported price history format: {manifest.get('format_version')}")
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        level: {name: np.load(os.path.join(store_dir, f'{level}_{name}.npy'), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        for level in LEVELS
+    }
+    return PriceHistoryStore(store_dir, manifest, arrays)
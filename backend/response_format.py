@@ -0,0 +1,160 @@
+# backend/response_format.py
+# Text blocks, compact encoding and compression for prediction responses.
+#
+# The factor and recommendation texts of a prediction come from a fixed set of templates
+# (TEXT_BLOCKS). Predictions refer to them by ID plus a few "text_params", and the full response
+# renders them. A compact response (/api/predict?compact=1) instead sends the IDs and params as-is,
+# and the client renders them from the templates it fetched once from /api/texts (cacheable).
+# Compact prices and confidence scores are fixed-point integers (value * scale, with the scales in
+# the response), which are shorter than full-precision floats and much cheaper to serialize.
+# Bodies are compressed with brotli (if the 'brotli' package is installed) or gzip, depending on
+# the client's Accept-Encoding. Compact responses can also be MessagePack (if 'msgpack' is installed).
+
+import gzip
+import json
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None # Only gzip is offered
+try:
+    import msgpack
+except ImportError:
+    msgpack = None # Compact responses are always JSON
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', MSGPACK_MIMETYPE)
+MIN_COMPRESS_BYTES = 512 # Smaller bodies are not worth a compression pass
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Close to gzip's speed at a better ratio; 11 is far too slow per request
+STATIC_GZIP_LEVEL = 9 # Static bodies (see precompress) are compressed once, so slower levels pay off
+STATIC_BROTLI_QUALITY = 9 # 11 takes seconds on a large metadata body, which is recompressed on every model reload
+PRICE_SCALE = 100 # Compact prices are in hundredths of the unit
+CONFIDENCE_SCALE = 10 # Compact confidence scores are in tenths of a percent
+
+# Templates use {name} placeholders, filled from a prediction's text_params
+TEXT_BLOCKS = {
+    # Model predictions
+    "model.weather.condition": "Normal monsoon expected, with {rainfall}mm rainfall forecast. Localized showers likely.",
+    "model.weather.impact": "Generally favorable conditions for crop growth. Watch for potential excess rainfall.",
+    "model.supply.condition": "Area under cultivation is {area} hectares. Good harvest expected.",
+    "model.supply.impact": "Adequate supply anticipated, which may keep prices stable.",
+    "model.demand.condition": "Domestic demand is steady, with moderate export interest.",
+    "model.demand.impact": "Consistent demand provides a floor for prices. No significant spikes expected.",
+    "model.sell_time": "The model suggests a moderate upward trend in the next 2-3 months. Consider selling during peak seasonal demand.",
+    "model.trend_analysis": "Predicted trend shows slight seasonality with overall stability. Long-term (6-12 months) prices are expected to remain within a narrow range.",
+    # Fallback simulation
+    "fallback.weather.condition": "Expected normal monsoon; potential for localized heavy rains in few regions.",
+    "fallback.weather.impact": "Overall positive outlook, but watch for regional disruptions.",
+    "fallback.supply.condition": "Recent harvest was good, leading to moderate supply levels.",
+    "fallback.supply.impact": "Prices are currently stable due to sufficient supply.",
+    "fallback.demand.condition": "Domestic demand is steady, with moderate export interest.",
+    "fallback.demand.impact": "Consistent demand provides a floor for prices.",
+    "fallback.sell_time": "The model suggests that the best time to sell could be in the next 2-3 months, as prices show a slight upward trend before seasonal increases in supply.",
+    "fallback.trend_analysis": "The predicted trend indicates a gradual increase in price for the next quarter, followed by a plateau. Long-term outlook (6-12 months) suggests stability."
+}
+FACTOR_TEXT_FIELDS = ('condition', 'impact')
+RECOMMENDATION_TEXT_FIELDS = ('sell_time', 'trend_analysis')
+
+
+def render_text(text_id, params):
+    return TEXT_BLOCKS[text_id].format(**params)
+
+
+def expand_texts(result):
+    """
+    Replaces the text IDs of a prediction with the rendered texts (the full response form).
+    Nested dicts are copied, so cached results are not modified.
+    """
+    params = result.pop("text_params", {})
+    result["factors"] = {
+        name: {**factor, **{field: render_text(factor[field], params) for field in FACTOR_TEXT_FIELDS}}
+        for name, factor in result["factors"].items()
+    }
+    result["recommendations"] = {
+        **result["recommendations"],
+        **{field: render_text(result["recommendations"][field], params) for field in RECOMMENDATION_TEXT_FIELDS}
+    }
+    return result
+
+
+def _fixed_point(values, scale):
+    return np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64).tolist()
+
+
+def encode_series(result):
+    """
+    Converts the prices and confidence scores of a prediction to fixed-point integers.
+    """
+    n_historical = len(result["historical_prices"])
+    prices = _fixed_point([result["current_price"], result["predicted_price"], *result["historical_prices"], *result["future_prices"]], PRICE_SCALE)
+    result["current_price"], result["predicted_price"] = prices[0], prices[1]
+    result["historical_prices"] = prices[2:2 + n_historical]
+    result["future_prices"] = prices[2 + n_historical:]
+    result["confidence_scores"] = _fixed_point(result["confidence_scores"], CONFIDENCE_SCALE)
+    result["scales"] = {"price": PRICE_SCALE, "confidence": CONFIDENCE_SCALE}
+    return result
+
+
+def encode_compact(payload, mimetype):
+    """
+    Serializes a compact payload as JSON or, when requested and available, MessagePack.
+    Returns (body, mimetype).
+    """
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        return msgpack.packb(payload), MSGPACK_MIMETYPE
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8'), 'application/json'
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Parses an Accept-Encoding header value into {coding: quality}.
+    """
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def encoding_quality(accepted, coding):
+    # A coding the header doesn't name gets the quality of '*', if given
+    return accepted.get(coding, accepted.get('*', 0.0))
+
+
+def choose_encoding(accept_encoding):
+    """
+    Picks 'br' or 'gzip' from an Accept-Encoding header value by the client's quality values
+    (ties go to br), or None for an uncompressed body.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best = max(offered, key=lambda coding: encoding_quality(accepted, coding)) # First of equals, so br wins ties
+    return best if encoding_quality(accepted, best) > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def precompress(body):
+    """
+    Compresses a static body once per offered encoding, when it is large enough to be worth it.
+    Returns {encoding: bytes}, with the uncompressed body under None.
+    """
+    bodies = {None: body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        bodies['gzip'] = gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL)
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body, quality=STATIC_BROTLI_QUALITY)
+    return bodies
@@ -0,0 +1,92 @@
+# backend/simulation.py
+# Deterministic, per-request simulation of the demo inputs and price series.
+# Every function takes its own numpy.random.Generator, so concurrent requests never share
+# (or reseed) global random state, and the same key always produces the same numbers.
+
+import hashlib
+import numpy as np
+
+
+def make_rng(*key_parts):
+    """
+    Returns a numpy Generator seeded from a stable hash of the key parts.
+    Unlike hash(), the digest is the same across processes and restarts.
+    """
+    digest = hashlib.blake2b(repr(key_parts).encode('utf-8'), digest_size=8).digest()
+    return np.random.default_rng(int.from_bytes(digest, 'little'))
+
+
+def simulate_input_features(rng, current_month, base_previous_year_price):
+    """
+    Simulates rainfall, area under cultivation and previous year price for one request.
+    """
+    rainfall = max(0.0, 70 + 60 * np.sin(np.pi * current_month / 6) + rng.normal(0, 15))
+    area_under_cultivation = max(100.0, 1000 + rng.normal(0, 100)) # Simple fixed + noise
+    previous_year_price = base_previous_year_price * (1 + rng.uniform(-0.1, 0.1)) # Add some variability
+    return rainfall, area_under_cultivation, previous_year_price
+
+
+def simulate_confidence_scores(rng, num_future_months):
+    """
+    Mock confidence scores (higher for near future, lower for far future), clipped to [50, 100].
+    """
+    steps = np.arange(num_future_months)
+    return np.clip(95 - steps * 3 - rng.uniform(0, 5, size=num_future_months), 50, 100)
+
+
+def simulate_series_around_prediction(rng, predicted_price, current_month, num_historical_months=24, num_future_months=12):
+    """
+    Simulates the chart series around one ML point prediction.
+    History is a reverse random walk ending near the prediction; the future adds a seasonal
+    sine wave, a slight upward trend and noise. Returns (current_price, historical, future, confidence).
+    """
+    current_price = predicted_price * (1 + rng.uniform(-0.05, 0.05)) # Close to prediction
+
+    # Reverse random walk as a cumulative product, then flipped to oldest -> newest
+    steps = 1 + rng.uniform(-0.02, 0.02, size=num_historical_months - 1)
+    walk = current_price * np.concatenate(([1.0], np.cumprod(steps)))
+    historical_prices = np.maximum(10, walk)[::-1]
+    historical_prices[-1] = current_price
+
+    months_ahead = np.arange(num_future_months)
+    seasonal_factor = 1 + 0.05 * np.sin(np.pi * (current_month + months_ahead) / 6)
+    trend_factor = 1 + 0.002 * months_ahead
+    noise = rng.normal(0, predicted_price * 0.01, size=num_future_months)
+    future_prices = np.maximum(10, predicted_price * seasonal_factor * trend_factor + noise)
+
+    confidence_scores = simulate_confidence_scores(rng, num_future_months)
+    return current_price, historical_prices, future_prices, confidence_scores
+
+
+def simulate_fallback_series(rng, unit, num_historical_months=24, num_future_months=12):
+    """
+    Simulates a full price history and forecast without a model, using unit-based price ranges.
+    Returns (predicted_price, historical, future, confidence).
+    """
+    if unit == "/kg":
+        base_price = rng.uniform(20, 150)
+        fluctuation_factor = 0.08
+    elif unit == "/dozen":
+        base_price = rng.uniform(30, 100)
+        fluctuation_factor = 0.07
+    elif unit == "/quintal":
+        base_price = rng.uniform(1500, 8000)
+        fluctuation_factor = 0.05
+    else:
+        base_price = rng.uniform(10, 100)
+        fluctuation_factor = 0.10
+
+    start_price = base_price * (1 + rng.uniform(-0.15, 0.15))
+    steps = 1 + rng.uniform(-fluctuation_factor, fluctuation_factor, size=num_historical_months)
+    historical_prices = np.maximum(10, start_price * np.cumprod(steps))[::-1]
+
+    months_ahead = np.arange(num_future_months)
+    seasonal_adjust = 1 + np.sin(months_ahead / 3.0 * np.pi) * 0.05
+    trend_factor = 1 + rng.uniform(-0.005, 0.01, size=num_future_months)
+    jitter = 1 + rng.uniform(-fluctuation_factor / 2, fluctuation_factor / 2, size=num_future_months)
+    start_future = historical_prices[-1] if num_historical_months else base_price
+    future_prices = np.maximum(10, start_future * np.cumprod(trend_factor * seasonal_adjust * jitter))
+
+    predicted_price = future_prices[:3].mean() if num_future_months else base_price
+    confidence_scores = simulate_confidence_scores(rng, num_future_months)
+    return predicted_price, historical_prices, future_prices, confidence_scores
@@ -0,0 +1,70 @@
+# backend/snapshot_store.py
+# Precomputed /api/predict responses, written by export_snapshots.py and served by app.py
+# (SNAPSHOT_DIR) without running the model.
+#
+# Snapshot layout (one directory):
+#   index.json         model version and month the snapshots were computed for, plus
+#                      "crop|season|country|state" -> {variant: {"file", "etag", "size"}}
+#   <sha256>.json.gz   one gzip'd response body per key and variant, named by the hash of its JSON,
+#                      so identical bodies are stored once and a file never changes in place
+# The variants are the full response and the compact one (/api/predict?compact=1, see
+# response_format.py), both as JSON.
+# Forecasts depend on the model and the current month, so a snapshot set is only valid for the
+# model_version, year and month recorded in its index.
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+SNAPSHOT_INDEX_VERSION = 2 # 2: full and compact variant per key
+VARIANTS = ('full', 'compact')
+KEY_SEPARATOR = '|'
+
+
+def snapshot_key(item):
+    return KEY_SEPARATOR.join(item)
+
+
+def write_snapshots(out_dir, responses, model_version, year, month):
+    """
+    Writes (item, {variant: response dict}) pairs as gzip'd, content-hashed files plus index.json.
+    Returns the index.
+    """
+    tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    entries = {}
+    for item, variants in responses:
+        entry = entries[snapshot_key(item)] = {}
+        for variant, response in variants.items():
+            body = json.dumps(response, separators=(',', ':')).encode('utf-8')
+            digest = hashlib.sha256(body).hexdigest()
+            file_name = f"{digest[:32]}.json.gz"
+            file_path = os.path.join(tmp_dir, file_name)
+            if not os.path.exists(file_path):
+                with open(file_path, 'wb') as f:
+                    f.write(gzip.compress(body, compresslevel=9, mtime=0)) # mtime=0 keeps the bytes reproducible
+            entry[variant] = {"file": file_name, "etag": digest[:32], "size": os.path.getsize(file_path)}
+
+    index = {
+        "version": SNAPSHOT_INDEX_VERSION,
+        "model_version": model_version,
+        "year": year,
+        "month": month,
+        "entries": entries
+    }
+    with open(os.path.join(tmp_dir, 'index.json'), 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return index
+
+
+def load_snapshot_index(snapshot_dir):
+    with open(os.path.join(snapshot_dir, 'index.json')) as f:
+        index = json.load(f)
+    if index.get("version") != SNAPSHOT_INDEX_VERSION:
+        raise ValueError(f"Unsupported snapshot index version: {index.get('version')}")
+    return index
@@ -0,0 +1,202 @@
+# backend/streaming_training.py
+# Chunked training helpers for datasets too large to load with pd.read_excel.
+#
+# Two streaming passes over CSV/Parquet:
+#   1. statistics pass - per-column sums/counts for mean imputation, category counts for mode
+#      imputation and the one-hot vocabulary, and the unique dropdown hierarchy rows
+#   2. encoding pass   - impute each chunk, update the StandardScaler incrementally and keep only
+#      float32 numeric columns and int32 category codes
+# The codes become a sparse one-hot CSR matrix directly, so no dense (rows x categories) matrix
+# and no object-dtype feature frame is ever materialized.
+
+import time
+import tracemalloc
+import resource
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.compose import ColumnTransformer
+from price_history import aggregate_price_rows, combine_price_aggregates
+
+DEFAULT_CHUNKSIZE = 250_000
+
+
+class StageProfiler:
+    """
+    Records wall time and peak traced memory (tracemalloc) for each named training stage.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            self.stages.append({"stage": name, "seconds": elapsed, "peak_mb": peak / 2**20})
+            print(f"[{name}] {elapsed:.2f}s, peak traced memory {peak / 2**20:.1f} MB")
+
+    def report(self):
+        # ru_maxrss is in KiB on Linux (bytes on macOS); it is the process-wide high-water mark
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print("--- Training stage report ---")
+        for entry in self.stages:
+            print(f"{entry['stage']:<12} {entry['seconds']:>9.2f}s {entry['peak_mb']:>10.1f} MB")
+        print(f"Process peak RSS: {max_rss_mb:.1f} MB")
+        return {"stages": self.stages, "max_rss_mb": max_rss_mb}
+
+
+def iter_chunks(path, columns, dtypes, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields DataFrame chunks with explicit dtypes from a .csv or .parquet file.
+    """
+    if path.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet in chunks requires 'pyarrow' (pip install pyarrow).")
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas().astype(dtypes)
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+
+def compute_streaming_stats(path, numerical_features, categorical_features, target_column, hierarchy_columns, chunksize=DEFAULT_CHUNKSIZE, history_columns=None,
+                            period_columns=None):
+    """
+    First pass: imputation statistics, category vocabularies and unique hierarchy rows.
+    With history_columns (dataset column -> price_history column), also the per-market monthly
+    price aggregate for the price history store, from the raw (un-imputed) values.
+    With period_columns (year column, month column), also the latest period (year * 12 + month)
+    of the rows with a target value.
+    """
+    columns = numerical_features + categorical_features + [target_column]
+    dtypes = {col: 'float64' for col in numerical_features + [target_column]}
+    dtypes.update({col: str for col in categorical_features})
+
+    sums = pd.Series(0.0, index=numerical_features)
+    counts = pd.Series(0, index=numerical_features)
+    category_counts = {col: pd.Series(dtype='int64') for col in categorical_features}
+    hierarchy_parts = []
+    price_aggregate = None
+    latest_period = None
+    total_rows = 0
+
+    for chunk in iter_chunks(path, columns, dtypes, chunksize):
+        total_rows += len(chunk)
+        sums += chunk[numerical_features].sum()
+        counts += chunk[numerical_features].count()
+        for col in categorical_features:
+            category_counts[col] = category_counts[col].add(chunk[col].value_counts(), fill_value=0)
+        hierarchy_parts.append(chunk[hierarchy_columns].dropna().drop_duplicates())
+        if history_columns:
+            part = aggregate_price_rows(chunk[list(history_columns)].rename(columns=history_columns))
+            price_aggregate = part if price_aggregate is None else combine_price_aggregates([price_aggregate, part])
+        if period_columns:
+            year_col, month_col = period_columns
+            periods = pd.to_numeric(chunk[year_col], errors='coerce') * 12 + pd.to_numeric(chunk[month_col], errors='coerce')
+            chunk_latest = periods[chunk[target_column].notna()].max()
+            if pd.notna(chunk_latest):
+                latest_period = chunk_latest if latest_period is None else max(latest_period, chunk_latest)
+
+    means = (sums / counts.where(counts > 0)).fillna(0.0)
+    modes = {col: (category_counts[col].idxmax() if not category_counts[col].empty else 'Unknown') for col in categorical_features}
+    vocabularies = {col: sorted(set(category_counts[col].index) | {modes[col]}) for col in categorical_features}
+    hierarchy = pd.concat(hierarchy_parts, ignore_index=True).drop_duplicates() if hierarchy_parts else pd.DataFrame(columns=hierarchy_columns)
+
+    print(f"Statistics pass: {total_rows} rows, {sum(len(v) for v in vocabularies.values())} categories.")
+    return {
+        "total_rows": total_rows,
+        "means": means.to_dict(),
+        "modes": modes,
+        "vocabularies": vocabularies,
+        "hierarchy": hierarchy,
+        "price_aggregate": price_aggregate,
+        "latest_period": None if latest_period is None else int(latest_period)
+    }
+
+
+def encode_streaming(path, stats, numerical_features, categorical_features, target_column, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Second pass: imputes each chunk, fits the scaler incrementally and returns
+    (X_sparse_csr, y, fitted_scaler).
+    """
+    columns = numerical_features + categorical_features + [target_column]
+    dtypes = {col: 'float64' for col in numerical_features + [target_column]}
+    dtypes.update({col: str for col in categorical_features})
+
+    scaler = StandardScaler()
+    numeric_parts, code_parts, target_parts = [], [], []
+
+    for chunk in iter_chunks(path, columns, dtypes, chunksize):
+        chunk = chunk[chunk[target_column].notna()] # Can't train without a price
+        if chunk.empty:
+            continue
+        numeric = chunk[numerical_features].fillna(stats["means"]).to_numpy(dtype=np.float64)
+        scaler.partial_fit(numeric)
+        numeric_parts.append(numeric.astype(np.float32))
+        codes = np.column_stack([
+            pd.Categorical(chunk[col].fillna(stats["modes"][col]), categories=stats["vocabularies"][col]).codes.astype(np.int32)
+            for col in categorical_features
+        ])
+        code_parts.append(codes)
+        target_parts.append(chunk[target_column].to_numpy(dtype=np.float32))
+
+    if not target_parts:
+        raise ValueError("Dataset is empty after cleaning. Cannot train model.")
+
+    numeric = np.concatenate(numeric_parts)
+    codes = np.concatenate(code_parts)
+    y = np.concatenate(target_parts)
+    del numeric_parts, code_parts, target_parts
+
+    # Scaled numeric block plus one-hot block, built directly as CSR (one 1.0 per categorical column)
+    scaled = ((numeric - scaler.mean_) / scaler.scale_).astype(np.float32)
+    offsets = np.cumsum([0] + [len(stats["vocabularies"][col]) for col in categorical_features[:-1]]).astype(np.int32)
+    n_rows = scaled.shape[0]
+    n_categorical = len(categorical_features)
+    n_onehot = sum(len(stats["vocabularies"][col]) for col in categorical_features)
+    onehot = sparse.csr_matrix(
+        (np.ones(n_rows * n_categorical, dtype=np.float32), (codes + offsets).ravel(), np.arange(0, n_rows * n_categorical + 1, n_categorical)),
+        shape=(n_rows, n_onehot)
+    )
+    X = sparse.hstack([sparse.csr_matrix(scaled), onehot], format='csr', dtype=np.float32)
+    return X, y, scaler
+
+
+def build_fitted_preprocessor(stats, scaler, numerical_features, categorical_features):
+    """
+    Returns a fitted ColumnTransformer equivalent to the streamed encoding, so the saved Pipeline
+    accepts raw DataFrames in app.py exactly like the in-memory training mode.
+    The one-hot encoder is fitted on one row per category; the scaler state comes from the
+    incremental fit over all chunks.
+    """
+    vocab_rows = max(len(stats["vocabularies"][col]) for col in categorical_features)
+    vocab_frame = pd.DataFrame({col: 0.0 for col in numerical_features}, index=range(vocab_rows))
+    for col in categorical_features:
+        vocab = stats["vocabularies"][col]
+        vocab_frame[col] = [vocab[i % len(vocab)] for i in range(vocab_rows)]
+
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numerical_features),
+            ('cat', OneHotEncoder(categories=[stats["vocabularies"][col] for col in categorical_features],
+                                  handle_unknown='ignore', sparse_output=True), categorical_features)
+        ],
+        sparse_threshold=1.0) # Always keep the output sparse
+    preprocessor.fit(vocab_frame)
+
+    fitted_scaler = preprocessor.named_transformers_['num']
+    for attribute in ('mean_', 'var_', 'scale_', 'n_samples_seen_'):
+        setattr(fitted_scaler, attribute, getattr(scaler, attribute))
+    return preprocessor
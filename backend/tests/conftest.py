@@ -0,0 +1,112 @@
+# backend/tests/conftest.py
+# Run from backend/:  python -m pytest -q
+#
+# The backend modules import each other by name (they are run from backend/), so the tests do the same.
+# The app fixture trains a small forest on a seeded synthetic table (benchmark.generate_price_table)
+# once per session and imports app.py against it, the way it is served from backend/models/.
+
+import datetime
+import importlib
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+TRAINING_ROWS = 2000
+TRAINING_TREES = 10
+DENSE_CROPS = 4
+DENSE_STATES = 3
+DENSE_MONTHS = 36
+
+
+@pytest.fixture(scope='session')
+def training_table():
+    from benchmark import generate_price_table
+    return generate_price_table(TRAINING_ROWS, seed=7)
+
+
+@pytest.fixture(scope='session')
+def dense_table(training_table):
+    """
+    Complete monthly series (every month of DENSE_MONTHS, ending last month) for a few crops and
+    states, long enough for the horizon model and the observed-history path.
+    """
+    import numpy as np
+    import pandas as pd
+    from train_model import TARGET_COLUMN
+
+    rng = np.random.default_rng(11)
+    crops = training_table[['Crop Type', 'Crop Category']].drop_duplicates('Crop Type').head(DENSE_CROPS)
+    locations = training_table[['Country', 'State', 'District', 'Market']].drop_duplicates('State').head(DENSE_STATES)
+    today = datetime.date.today()
+    last_period = today.year * 12 + today.month - 2 # Last month, as year * 12 + month - 1
+    periods = np.arange(last_period - DENSE_MONTHS + 1, last_period + 1)
+    month = periods % 12 + 1
+
+    frames = []
+    pairs = [(crop, location) for crop in crops.itertuples(index=False) for location in locations.itertuples(index=False)]
+    for level, (crop, location) in enumerate(pairs):
+        rows = training_table.sample(len(periods), random_state=level).reset_index(drop=True)
+        price = (1500 + 300 * level) * (1 + 0.08 * np.sin(2 * np.pi * month / 12)) * (1 + 0.002 * np.arange(len(periods))) * rng.normal(1, 0.02, len(periods))
+        frames.append(rows.assign(**{
+            'Crop Type': crop[0], 'Crop Category': crop[1],
+            'Country': location[0], 'State': location[1], 'District': location[2], 'Market': location[3],
+            'Year': periods // 12, 'Month': month,
+            'Previous Year Price (INR/Quintal)': price / 1.02, TARGET_COLUMN: price
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture(scope='session')
+def dense_models_dir(tmp_path_factory, dense_table):
+    """
+    A working directory holding models/ trained on dense_table (with a horizon forest).
+    """
+    import train_model
+    work_dir = tmp_path_factory.mktemp('dense')
+    data_path = str(work_dir / 'prices.csv')
+    dense_table.to_csv(data_path, index=False)
+    train_model.train_full(data_path, str(work_dir / 'models'), {"n_estimators": TRAINING_TREES})
+    return work_dir
+
+
+@pytest.fixture(scope='session')
+def trained_models_dir(tmp_path_factory, training_table):
+    """
+    A working directory holding models/ as written by a full training run.
+    """
+    import train_model
+    work_dir = tmp_path_factory.mktemp('trained')
+    data_path = str(work_dir / 'prices.csv')
+    training_table.to_csv(data_path, index=False)
+    train_model.train_full(data_path, str(work_dir / 'models'), {"n_estimators": TRAINING_TREES})
+    return work_dir
+
+
+@pytest.fixture(scope='session')
+def app_module(trained_models_dir):
+    """
+    app.py imported with its working directory at the trained models, without background threads.
+    """
+    previous_dir = os.getcwd()
+    os.environ.update({'START_BACKGROUND_THREADS': '0', 'MODEL_RELOAD_INTERVAL': '0', 'FORECAST_CACHE_WARMUP': '0'})
+    os.chdir(trained_models_dir)
+    try:
+        yield importlib.import_module('app')
+    finally:
+        os.chdir(previous_dir)
+
+
+@pytest.fixture
+def dense_app(app_module, dense_models_dir, monkeypatch):
+    """
+    app.py serving the dense model, swapped in like a hot reload.
+    """
+    from model_versions import resolve_model_dir
+    monkeypatch.setattr(app_module, 'model_bundle', app_module.load_model_bundle(resolve_model_dir(str(dense_models_dir / 'models'))))
+    app_module.forecast_cache.clear()
+    yield app_module
+    app_module.forecast_cache.clear()
@@ -0,0 +1,146 @@
+import datetime
+
+import numpy as np
+
+from price_history import from_period, to_period
+from train_model import TRAINING_FEATURES_ORDER
+
+
+def _predictions_by_source(app_module):
+    return {dict(labels)["source"]: value for labels, value in app_module.metrics.counter_values('agriprice_predictions_total').items()}
+
+
+def test_feature_frame_uses_training_columns(app_module):
+    bundle = app_module.model_bundle
+    items = app_module.prediction_grid()[:3]
+    rngs = [np.random.default_rng(i) for i in range(len(items))]
+    today = datetime.date.today()
+    frame, _, _ = app_module.build_feature_frame(bundle, items, rngs, today.year, today.month)
+    assert list(frame.columns) == TRAINING_FEATURES_ORDER
+    assert frame['Crop Type'].tolist() == [item[0] for item in items]
+    # Fields a request doesn't carry get the stored training fill values
+    assert (frame['Production (Tonnes)'] == bundle.features["means"]['Production (Tonnes)']).all()
+    assert (frame['Market'] == bundle.features["modes"]['Market']).all()
+
+
+def test_predictions_come_from_the_model(app_module):
+    app_module.forecast_cache.clear()
+    before = _predictions_by_source(app_module)
+    items = app_module.prediction_grid()[:20]
+    results = app_module.get_ml_predictions(items)
+    after = _predictions_by_source(app_module)
+    assert after.get('ml', 0) - before.get('ml', 0) == len(items)
+    assert after.get('fallback', 0) == before.get('fallback', 0)
+    assert all(result["factors"]["weather"]["condition"].startswith('model.') for result in results)
+
+
+def test_predict_endpoint(app_module):
+    crop_type, season, country, state = app_module.prediction_grid()[0]
+    response = app_module.app.test_client().post('/api/predict', json={
+        "crop_type": crop_type, "season": season, "country": country, "state": state
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["crop_type"] == crop_type
+    assert body["predicted_price"] > 1.0
+    assert not body["recommendations"]["sell_time"].startswith('model.') # Rendered texts in the full form
+
+
+def test_lag_feature_uses_observed_previous_year_price(app_module):
+    bundle = app_module.model_bundle
+    items = app_module.prediction_grid()[:2]
+    rngs = [np.random.default_rng(i) for i in range(len(items))]
+    histories = [{"previous_year_price": 1234.5}, None]
+    frame, _, _ = app_module.build_feature_frame(bundle, items, rngs, 2024, 6, histories)
+    lag = frame['Previous Year Price (INR/Quintal)'].tolist()
+    assert lag[0] == 1234.5
+    assert lag[1] != 1234.5 # Simulated without an observed history
+
+
+def _dense_series(dense_table):
+    row = dense_table.iloc[0]
+    periods = dense_table[dense_table['Crop Type'].eq(row['Crop Type']) & dense_table['State'].eq(row['State'])]
+    first = to_period(int(periods['Year'].iloc[0]), int(periods['Month'].iloc[0]))
+    last = to_period(int(periods['Year'].iloc[-1]), int(periods['Month'].iloc[-1]))
+    return (row['Crop Type'], row['Country'], row['State']), first, last
+
+
+def test_stale_price_history_is_not_served(dense_app, dense_table):
+    store = dense_app.model_bundle.price_history
+    (crop_type, country, state), _, last = _dense_series(dense_table)
+    history = dense_app.lookup_price_history(store, crop_type, country, state, *from_period(last + dense_app.HISTORY_MAX_AGE_MONTHS))
+    assert history["end"] == from_period(last)
+    assert len(history["prices"]) == dense_app.HISTORY_MONTHS
+    stale = from_period(last + dense_app.HISTORY_MAX_AGE_MONTHS + 1)
+    assert dense_app.lookup_price_history(store, crop_type, country, state, *stale) is None
+
+
+def test_sparse_price_history_is_not_served(dense_app, dense_table):
+    store = dense_app.model_bundle.price_history
+    (crop_type, country, state), first, _ = _dense_series(dense_table)
+    minimum = dense_app.HISTORY_MIN_OBSERVED_MONTHS
+    # Asked for early in the series, the window holds only the months observed so far
+    history = dense_app.lookup_price_history(store, crop_type, country, state, *from_period(first + minimum - 1))
+    assert history["observed_months"] == minimum
+    assert dense_app.lookup_price_history(store, crop_type, country, state, *from_period(first + minimum - 2)) is None
+
+
+def test_observed_history_in_predictions(dense_app, dense_table):
+    (crop_type, country, state), _, _ = _dense_series(dense_table)
+    result = dense_app.get_ml_predictions([(crop_type, dense_table['Season'].dropna().iloc[0], country, state)])[0]
+    assert result["history_source"] == 'observed'
+    assert result["history_observed_months"] == dense_app.HISTORY_MONTHS
+
+
+def test_batch_rejects_non_string_fields_per_item(app_module):
+    crop_type, season, country, state = app_module.prediction_grid()[1]
+    fallbacks = app_module.metrics.counter_values('agriprice_fallbacks_total')
+    response = app_module.app.test_client().post('/api/predict/batch', json={"requests": [
+        {"crop_type": [crop_type], "season": season, "country": country, "state": state},
+        {"crop_type": crop_type, "season": season, "country": country, "state": state},
+        {"crop_type": 5, "season": season, "country": country, "state": state}
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert results[0]["error"] == results[2]["error"] == app_module.MISSING_PARAMETERS_ERROR
+    assert results[1]["crop_type"] == crop_type
+    assert not results[1]["factors"]["weather"]["condition"].startswith('Expected normal monsoon') # Not the fallback text
+    assert app_module.metrics.counter_values('agriprice_fallbacks_total') == fallbacks
+
+
+def test_failing_item_does_not_fall_back_the_batch(app_module, monkeypatch):
+    lookup = app_module.lookup_price_history
+
+    def broken_lookup(price_history, crop_type, *args):
+        if crop_type == 'Broken':
+            raise RuntimeError("broken item")
+        return lookup(price_history, crop_type, *args)
+
+    monkeypatch.setattr(app_module, 'lookup_price_history', broken_lookup)
+    app_module.forecast_cache.clear()
+    good_items = app_module.prediction_grid()[2:4]
+    before = _predictions_by_source(app_module)
+    results = app_module.get_ml_predictions([good_items[0], ('Broken', *good_items[0][1:]), good_items[1]])
+    after = _predictions_by_source(app_module)
+    assert after.get('ml', 0) - before.get('ml', 0) == 2
+    assert after.get('fallback', 0) - before.get('fallback', 0) == 1
+    assert results[1]["factors"]["weather"]["condition"].startswith('fallback.')
+    assert results[0]["factors"]["weather"]["condition"].startswith('model.')
+
+
+def test_request_fields_are_normalized_once(app_module):
+    crop_type, season, country, state = app_module.prediction_grid()[4]
+    padded = app_module.parse_prediction_item({"crop_type": f" {crop_type} ", "season": season, "country": country, "state": f"{state}\t"})
+    assert padded == (crop_type, season, country, state)
+    assert app_module.parse_prediction_item({"crop_type": "  ", "season": season, "country": country, "state": state}) is None
+
+    client = app_module.app.test_client()
+    plain = client.post('/api/predict', json={"crop_type": crop_type, "season": season, "country": country, "state": state}).get_json()
+    spaced = client.post('/api/predict', json={"crop_type": crop_type + " ", "season": season, "country": country, "state": state}).get_json()
+    assert spaced == plain
+
+
+def test_oversized_body_is_refused(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', 64)
+    response = app_module.app.test_client().post('/api/predict/batch', json={"requests": [{"crop_type": "x" * 100}]})
+    assert response.status_code == 413
@@ -0,0 +1,78 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from snapshot_store import snapshot_key, write_snapshots
+
+
+@pytest.fixture
+def asgi_module(app_module):
+    import asgi # Imported after app.py, so it serves the trained test model
+    return asgi
+
+
+def _call(handler, body=b'', headers=()):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/predict', 'query_string': b'', 'headers': list(headers)}
+    asyncio.run(handler(scope, receive, send))
+    start, body_message = messages
+    return start['status'], dict(start['headers']), body_message['body']
+
+
+def test_non_string_field_is_a_bad_request(asgi_module):
+    body = json.dumps({"crop_type": 5, "season": "Rabi (Winter)", "country": "India", "state": "Punjab"}).encode()
+    status, _, response = _call(asgi_module.predict, body=body)
+    assert status == 400
+    assert json.loads(response)["error"] == asgi_module.backend.MISSING_PARAMETERS_ERROR
+
+
+@pytest.mark.parametrize('accept_encoding, gzipped', [(b'gzip', True), (b'gzip, br', True), (b'gzip;q=0', False), (b'br', False), (b'', False), (b'*', True), (b'br, *;q=0', False)])
+def test_snapshot_gzip_negotiation(asgi_module, tmp_path, monkeypatch, accept_encoding, gzipped):
+    item = ('Rice', 'Kharif (Monsoon)', 'India', 'Punjab')
+    response = {"predicted_price": 2100.5}
+    index = write_snapshots(str(tmp_path), [(item, {"full": response})], 'v1', 2026, 10)
+    monkeypatch.setattr(asgi_module.backend, 'SNAPSHOT_DIR', str(tmp_path))
+    entry = index["entries"][snapshot_key(item)]["full"]
+
+    status, headers, body = _call(lambda scope, receive, send: asgi_module._send_snapshot(scope, send, entry), headers=[(b'accept-encoding', accept_encoding)])
+    assert status == 200
+    assert (headers.get(b'content-encoding') == b'gzip') == gzipped
+    assert json.loads(gzip.decompress(body) if gzipped else body) == response
+
+
+def _predict_requests(asgi_module, status):
+    return asgi_module.backend.metrics.counter_values('agriprice_http_requests_total').get((('endpoint', '/api/predict'), ('status', status)), 0)
+
+
+def test_native_predict_is_instrumented(asgi_module):
+    body = json.dumps({"crop_type": "", "season": "Rabi (Winter)", "country": "India", "state": "Punjab"}).encode()
+    before = _predict_requests(asgi_module, 400)
+    status, headers, _ = _call(asgi_module.predict, body=body)
+    assert status == 400
+    assert _predict_requests(asgi_module, 400) == before + 1
+    assert b'server-timing' not in headers
+
+    status, headers, _ = _call(asgi_module.predict, body=body, headers=[(b'x-profile', b'1')])
+    assert b'total;dur=' in headers[b'server-timing']
+    assert headers[b'access-control-expose-headers'] == b'Server-Timing'
+
+
+def test_oversized_body_is_refused(asgi_module, monkeypatch):
+    monkeypatch.setattr(asgi_module.backend, 'MAX_REQUEST_BYTES', 64)
+    body = json.dumps({"crop_type": "x" * 100, "season": "Rabi (Winter)", "country": "India", "state": "Punjab"}).encode()
+    before = _predict_requests(asgi_module, 413)
+    status, _, _ = _call(asgi_module.predict, body=body)
+    assert status == 413
+    # Refused from the Content-Length header alone, before the body is read
+    status, _, _ = _call(asgi_module.predict, headers=[(b'content-length', str(len(body)).encode())])
+    assert status == 413
+    assert _predict_requests(asgi_module, 413) == before + 2
@@ -0,0 +1,46 @@
+import forecast_cache
+from forecast_cache import ForecastCache, make_forecast_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(forecast_cache.time, 'monotonic', clock.monotonic)
+    cache = ForecastCache(max_size=10, ttl_seconds=60)
+    cache.put('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.stats()["size"] == 0
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ForecastCache(max_size=2, ttl_seconds=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1 # 'b' is now the least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_size_disables_the_cache():
+    cache = ForecastCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+
+def test_key_rolls_over_with_month_and_model():
+    key = make_forecast_key('Rice', 'Rabi (Winter)', 'India', 'Punjab', 2026, 10, 'v1')
+    assert key != make_forecast_key('Rice', 'Rabi (Winter)', 'India', 'Punjab', 2026, 11, 'v1')
+    assert key != make_forecast_key('Rice', 'Rabi (Winter)', 'India', 'Punjab', 2026, 10, 'v2')
@@ -0,0 +1,38 @@
+import joblib
+import numpy as np
+import pytest
+
+from forest_artifact import compile_pipeline, export_forest_artifact, load_forest_artifact
+from model_versions import resolve_model_dir
+from train_model import CATEGORICAL_FEATURES, NUMERICAL_FEATURES, clean_dataset
+
+
+@pytest.fixture(scope='module')
+def pipeline(trained_models_dir):
+    return joblib.load(f"{resolve_model_dir(str(trained_models_dir / 'models'))}/crop_price_rf_pipeline.pkl")
+
+
+@pytest.fixture(scope='module')
+def features(training_table):
+    return clean_dataset(training_table.copy())[CATEGORICAL_FEATURES + NUMERICAL_FEATURES].iloc[:300]
+
+
+def test_compiled_forest_matches_pipeline(pipeline, features):
+    expected = pipeline.predict(features)
+    flat = compile_pipeline(pipeline)
+    np.testing.assert_allclose(flat.predict(features), expected, rtol=1e-9)
+    np.testing.assert_allclose(flat.predict({col: features[col].tolist() for col in features.columns}), expected, rtol=1e-9)
+    np.testing.assert_allclose(flat.predict_records(features.to_dict('records')), expected, rtol=1e-9)
+
+
+def test_memory_mapped_artifact_matches_pipeline(pipeline, features, tmp_path):
+    export_forest_artifact(pipeline, str(tmp_path / 'flat'))
+    flat = load_forest_artifact(str(tmp_path / 'flat'))
+    assert isinstance(flat.threshold, np.memmap)
+    np.testing.assert_allclose(flat.predict(features), pipeline.predict(features), rtol=1e-9)
+
+
+def test_unknown_categories_match_pipeline(pipeline, features):
+    # handle_unknown='ignore': unseen values encode as all zeros in both engines
+    unseen = features.head(20).assign(**{'Crop Type': 'Unseen crop', 'Market': 'Unseen market'})
+    np.testing.assert_allclose(compile_pipeline(pipeline).predict(unseen), pipeline.predict(unseen), rtol=1e-9)
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forest_artifact import export_forest_artifact, load_forest_artifact
+from horizon_forecast import (HORIZON_FEATURES, HORIZONS, WINDOW_MONTHS, build_horizon_pipeline, build_horizon_training_set,
+                              forecast_horizons, series_window, train_horizon_model)
+from model_versions import resolve_model_dir
+from price_history import from_period, load_price_history, to_period
+
+
+@pytest.fixture(scope='module')
+def dense_store(dense_models_dir):
+    return load_price_history(os.path.join(resolve_model_dir(str(dense_models_dir / 'models')), 'price_history'))
+
+
+def _state_series(dense_table):
+    # (crop, (country, state)) of every dense series, and the month of their last price
+    series = dense_table[['Crop Type', 'Country', 'State']].drop_duplicates()
+    end = int((dense_table['Year'] * 12 + dense_table['Month'] - 1).max())
+    return [(crop, (country, state)) for crop, country, state in series.itertuples(index=False)], end
+
+
+def test_dense_training_writes_a_horizon_forest(dense_models_dir):
+    model = load_forest_artifact(os.path.join(resolve_model_dir(str(dense_models_dir / 'models')), 'horizon_forest'))
+    assert model.n_outputs == HORIZONS
+
+
+def test_train_horizon_model(dense_store, tmp_path):
+    manifest = train_horizon_model(dense_store, str(tmp_path / 'horizon'), n_estimators=4)
+    assert manifest["n_trees"] == 4
+    assert load_forest_artifact(str(tmp_path / 'horizon')).n_outputs == HORIZONS
+
+
+def test_flat_per_tree_output_matches_sklearn_estimators(dense_store, tmp_path):
+    features, targets = build_horizon_training_set(dense_store)
+    frame = pd.DataFrame(features, columns=HORIZON_FEATURES)
+    pipeline = build_horizon_pipeline(n_estimators=4)
+    pipeline.fit(frame, targets)
+    export_forest_artifact(pipeline, str(tmp_path / 'horizon'))
+    flat = load_forest_artifact(str(tmp_path / 'horizon'))
+
+    scaled = pipeline.named_steps['preprocessor'].transform(frame)
+    expected = np.stack([tree.predict(scaled) for tree in pipeline.named_steps['regressor'].estimators_], axis=1)
+    per_tree = flat.predict_per_tree(features)
+    assert per_tree.shape == (len(targets), 4, HORIZONS)
+    np.testing.assert_allclose(per_tree, expected, rtol=1e-9)
+    np.testing.assert_allclose(flat.predict(features), pipeline.predict(frame), rtol=1e-9)
+
+
+def test_forecast_horizons_shapes(dense_store, dense_models_dir, dense_table):
+    model = load_forest_artifact(os.path.join(resolve_model_dir(str(dense_models_dir / 'models')), 'horizon_forest'))
+    series, end = _state_series(dense_table)
+    windows = [series_window(dense_store, crop, path, from_period(end)) for crop, path in series]
+    assert all(window is not None and len(window) == WINDOW_MONTHS for window in windows)
+    future_prices, confidence_scores = forecast_horizons(model, windows, [end] * len(windows))
+    assert future_prices.shape == confidence_scores.shape == (len(series), HORIZONS)
+    assert (future_prices > 0).all()
+    assert ((confidence_scores >= 0) & (confidence_scores <= 100)).all()
+
+
+def test_forecast_price_horizons(dense_app, dense_table):
+    bundle = dense_app.model_bundle
+    series, end = _state_series(dense_table)
+    crop, (country, state) = series[0]
+    items = [(crop, 'Kharif (Monsoon)', country, state), ('Unknown crop', 'Kharif (Monsoon)', country, state)]
+    histories = [dense_app.lookup_price_history(bundle.price_history, crop, country, state, *from_period(end + 1)), None]
+    forecast, missing = dense_app.forecast_price_horizons(bundle, items, histories)
+    assert missing is None # No observed history, so the chart is simulated
+    assert forecast["future_prices"].shape == forecast["confidence_scores"].shape == (HORIZONS,)
+    year, month = from_period(end + 1)
+    assert forecast["start"] == f"{year:04d}-{month:02d}" # The month after the last observed price
+
+
+def test_predictions_use_the_horizon_model(dense_app, dense_table):
+    series, end = _state_series(dense_table)
+    crop, (country, state) = series[0]
+    result = dense_app.get_ml_predictions([(crop, dense_table['Season'].dropna().iloc[0], country, state)])[0]
+    assert result["forecast_source"] == 'model'
+    year, month = from_period(end + 1)
+    assert result["forecast_start"] == f"{year:04d}-{month:02d}"
+    assert len(result["future_prices"]) == len(result["confidence_scores"]) == HORIZONS
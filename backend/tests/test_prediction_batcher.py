@@ -0,0 +1,36 @@
+import pytest
+
+from prediction_batcher import MicroBatcher, QueueFullError
+
+
+def _predict_batch(items):
+    if 'bad' in items:
+        raise ValueError("bad item")
+    return [item.upper() for item in items]
+
+
+def test_full_queue_is_rejected():
+    batcher = MicroBatcher(_predict_batch, max_queue=2) # Not started: nothing drains the queue
+    batcher.submit('a')
+    batcher.submit('b')
+    with pytest.raises(QueueFullError):
+        batcher.submit('c')
+    assert batcher.stats()["rejected"] == 1
+    assert batcher.stats()["queue_depth"] == 2
+
+
+def test_results_keep_their_items():
+    batcher = MicroBatcher(_predict_batch, window_ms=20, workers=1)
+    futures = [batcher.submit(item) for item in ('a', 'b', 'c')]
+    batcher.start()
+    assert [future.result(timeout=5) for future in futures] == ['A', 'B', 'C']
+
+
+def test_failing_item_only_fails_its_own_request():
+    batcher = MicroBatcher(_predict_batch, window_ms=20, workers=1)
+    futures = [batcher.submit(item) for item in ('a', 'bad', 'c')] # Queued before start, so they share one batch
+    batcher.start()
+    assert futures[0].result(timeout=5) == 'A'
+    assert futures[2].result(timeout=5) == 'C'
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_history import aggregate_price_rows, combine_price_aggregates, export_price_history, load_price_history
+
+ROWS = [
+    # crop, country, state, district, market, year, month, price, previous_year_price
+    ('Rice', 'India', 'Punjab', 'Ludhiana', 'Khanna', 2023, 11, 100.0, 90.0),
+    ('Rice', 'India', 'Punjab', 'Ludhiana', 'Khanna', 2023, 12, 110.0, np.nan),
+    ('Rice', 'India', 'Punjab', 'Amritsar', 'Ajnala', 2023, 12, 130.0, 95.0),
+    ('Rice', 'India', 'Punjab', 'Ludhiana', 'Khanna', 2024, 2, 120.0, 100.0),
+    ('Rice', 'India', 'Karnataka', 'Mysuru', 'Nanjangud', 2024, 1, 500.0, 450.0),
+    ('Wheat', 'India', 'Punjab', 'Ludhiana', 'Khanna', 2024, 1, 900.0, 800.0)
+]
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    frame = pd.DataFrame(ROWS, columns=['crop', 'country', 'state', 'district', 'market', 'year', 'month', 'price', 'previous_year_price'])
+    # Two partial aggregates, as streaming training produces them chunk by chunk
+    aggregate = combine_price_aggregates([aggregate_price_rows(frame.iloc[:3]), aggregate_price_rows(frame.iloc[3:])])
+    out_dir = str(tmp_path_factory.mktemp('history') / 'price_history')
+    export_price_history(aggregate, out_dir)
+    return load_price_history(out_dir)
+
+
+def test_range_query_returns_one_series_in_order(store):
+    periods, price, previous_year_price = store.query('state', 'Rice', ('India', 'Punjab'), (2023, 1), (2024, 12))
+    assert periods.tolist() == [2023 * 12 + 10, 2023 * 12 + 11, 2024 * 12 + 1]
+    np.testing.assert_allclose(price, [100.0, 120.0, 120.0]) # December is the mean of both markets
+    np.testing.assert_allclose(previous_year_price, [90.0, 95.0, 100.0]) # Missing values don't count
+
+
+def test_range_bounds_are_inclusive(store):
+    periods, _, _ = store.query('state', 'Rice', ('India', 'Punjab'), (2023, 12), (2024, 2))
+    assert len(periods) == 2
+    assert len(store.query('state', 'Rice', ('India', 'Punjab'), (2024, 3), (2025, 1))[0]) == 0
+    assert len(store.query('state', 'Rice', ('India', 'Gujarat'), (2000, 1), (2030, 1))[0]) == 0
+
+
+def test_market_level_and_point_lookups(store):
+    path = ('India', 'Punjab', 'Ludhiana', 'Khanna')
+    assert store.query('market', 'Rice', path, (2023, 1), (2024, 12))[1].tolist() == [100.0, 110.0, 120.0]
+    assert store.price_at('market', 'Wheat', path, (2024, 1)) == (900.0, 800.0)
+    assert store.price_at('market', 'Wheat', path, (2024, 2)) is None
+
+
+def test_latest_period_and_monthly_prices(store):
+    path = ('India', 'Punjab')
+    assert store.latest_period('state', 'Rice', path, (2024, 1)) == (2023, 12)
+    assert store.latest_period('state', 'Rice', path, (2023, 10)) is None
+    assert store.latest_period('state', 'Barley', path, (2024, 1)) is None
+    prices = store.monthly_prices('state', 'Rice', path, (2024, 2), 4)
+    np.testing.assert_allclose(prices, [100.0, 120.0, np.nan, 120.0])
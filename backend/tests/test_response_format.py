@@ -0,0 +1,154 @@
+import gzip
+import json
+
+import pytest
+
+import response_format
+from response_format import CONFIDENCE_SCALE, MSGPACK_MIMETYPE, PRICE_SCALE, TEXT_BLOCKS, encode_compact, encode_series
+
+
+def _prediction():
+    return {
+        "current_price": 2100.123, "predicted_price": 2200.456,
+        "historical_prices": [2000.0, 2050.5], "future_prices": [2300.25],
+        "confidence_scores": [91.23, 88.76]
+    }
+
+
+def test_series_are_fixed_point():
+    result = encode_series(_prediction())
+    assert result["scales"] == {"price": PRICE_SCALE, "confidence": CONFIDENCE_SCALE}
+    assert result["current_price"] == 210012 and result["predicted_price"] == 220046
+    assert result["historical_prices"] == [200000, 205050]
+    assert result["future_prices"] == [230025]
+    assert result["confidence_scores"] == [912, 888]
+
+
+def test_compact_json_round_trip():
+    payload = encode_series(_prediction())
+    body, mimetype = encode_compact(payload, 'application/json')
+    assert mimetype == 'application/json'
+    assert json.loads(body) == payload
+
+
+def test_compact_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    payload = encode_series(_prediction())
+    body, mimetype = encode_compact(payload, MSGPACK_MIMETYPE)
+    assert mimetype == MSGPACK_MIMETYPE
+    assert msgpack.unpackb(body) == payload
+
+
+def test_compact_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(response_format, 'msgpack', None)
+    body, mimetype = encode_compact({"a": 1}, MSGPACK_MIMETYPE)
+    assert (body, mimetype) == (b'{"a":1}', 'application/json')
+
+
+def _predict_body(app_module):
+    crop_type, season, country, state = app_module.prediction_grid()[6]
+    return {"crop_type": crop_type, "season": season, "country": country, "state": state}
+
+
+def test_compact_prediction_renders_like_the_full_one(app_module):
+    client = app_module.app.test_client()
+    body = _predict_body(app_module)
+    full = client.post('/api/predict', json=body).get_json()
+    compact = client.post('/api/predict?compact=1', json=body).get_json()
+    texts = client.get('/api/texts').get_json()
+    assert texts == TEXT_BLOCKS
+
+    params = compact["text_params"]
+    for name, factor in compact["factors"].items():
+        assert {field: texts[factor[field]].format(**params) for field in ('condition', 'impact')} == \
+            {field: full["factors"][name][field] for field in ('condition', 'impact')}
+    assert compact["predicted_price"] / compact["scales"]["price"] == pytest.approx(full["predicted_price"], abs=0.005)
+    assert [price / compact["scales"]["price"] for price in compact["future_prices"]] == pytest.approx(full["future_prices"], abs=0.005)
+
+
+def test_compact_prediction_as_msgpack(app_module):
+    msgpack = pytest.importorskip('msgpack')
+    client = app_module.app.test_client()
+    body = _predict_body(app_module)
+    packed = client.post('/api/predict?compact=1', json=body, headers={"Accept": MSGPACK_MIMETYPE})
+    assert packed.mimetype == MSGPACK_MIMETYPE
+    assert 'Accept' in packed.headers["Vary"]
+    assert msgpack.unpackb(packed.get_data()) == client.post('/api/predict?compact=1', json=body).get_json()
+
+
+def test_texts_are_revalidated_with_a_304(app_module):
+    client = app_module.app.test_client()
+    first = client.get('/api/texts')
+    assert first.status_code == 200
+    assert first.cache_control.max_age == app_module.TEXTS_MAX_AGE
+    etag = first.headers["ETag"]
+    assert client.get('/api/texts', headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_compressed_responses_get_a_weak_etag(app_module, monkeypatch, encoding):
+    if encoding == 'br':
+        brotli = pytest.importorskip('brotli')
+        decompress = brotli.decompress
+    else:
+        monkeypatch.setattr(response_format, 'brotli', None) # gzip only
+        decompress = gzip.decompress
+    client = app_module.app.test_client()
+    plain = client.get('/api/texts')
+    compressed = client.get('/api/texts', headers={"Accept-Encoding": encoding})
+    assert compressed.headers["Content-Encoding"] == encoding
+    assert 'Accept-Encoding' in compressed.headers["Vary"]
+    assert decompress(compressed.get_data()) == plain.get_data()
+    assert compressed.headers["ETag"] == 'W/' + plain.headers["ETag"] # Same content, different bytes
+    revalidated = client.get('/api/texts', headers={"Accept-Encoding": encoding, "If-None-Match": compressed.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_small_and_refused_bodies_are_not_compressed(app_module):
+    client = app_module.app.test_client()
+    assert 'Content-Encoding' not in client.get('/api/texts', headers={"Accept-Encoding": "gzip;q=0"}).headers
+    assert 'Content-Encoding' not in client.get('/api/texts').headers
+    small = client.get('/api/cache/stats', headers={"Accept-Encoding": "gzip"})
+    assert small.status_code == 200 and len(small.get_data()) < app_module.MIN_COMPRESS_BYTES
+    assert 'Content-Encoding' not in small.headers
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('', None),
+    ('gzip', 'gzip'),
+    ('gzip, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0.8, br;q=0.8', 'br'), # Ties go to br
+    ('br;q=0, gzip;q=0.1', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0.5, br;q=0.2', 'gzip'),
+    ('identity, *;q=0', None),
+    ('gzip;q=0, br;q=0', None)
+])
+def test_choose_encoding_by_quality(monkeypatch, header, expected):
+    monkeypatch.setattr(response_format, 'brotli', object()) # Offered whether or not it is installed
+    assert response_format.choose_encoding(header) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(response_format, 'brotli', None)
+    assert response_format.choose_encoding('br, gzip;q=0.5') == 'gzip'
+    assert response_format.choose_encoding('br') is None
+    assert response_format.choose_encoding('*') == 'gzip'
+
+
+@pytest.mark.parametrize('path', ['/api/metadata', '/api/texts'])
+def test_static_bodies_are_compressed_once(app_module, monkeypatch, path):
+    def no_compression(body, encoding):
+        raise AssertionError("static bodies are compressed at load time")
+
+    monkeypatch.setattr(app_module, 'compress', no_compression)
+    monkeypatch.setattr(response_format, 'brotli', None) # gzip only
+    client = app_module.app.test_client()
+    plain = client.get(path)
+    first = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == 'gzip'
+    assert gzip.decompress(first.get_data()) == plain.get_data()
+    assert client.get(path, headers={"Accept-Encoding": "gzip"}).get_data() == first.get_data() # The same stored bytes
+    revalidated = client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
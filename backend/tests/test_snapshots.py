@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import pytest
+
+from snapshot_store import load_snapshot_index, snapshot_key, write_snapshots
+
+
+def test_write_and_load_round_trip(tmp_path):
+    item = ('Rice', 'Kharif (Monsoon)', 'India', 'Punjab')
+    full, compact = {"predicted_price": 2100.5}, {"predicted_price": 210050}
+    written = write_snapshots(str(tmp_path / 'snapshots'), [(item, {"full": full, "compact": compact})], 'v1', 2026, 10)
+    index = load_snapshot_index(str(tmp_path / 'snapshots'))
+    assert index == written
+    assert (index["model_version"], index["year"], index["month"]) == ('v1', 2026, 10)
+    entry = index["entries"][snapshot_key(item)]
+    for variant, response in (('full', full), ('compact', compact)):
+        with open(tmp_path / 'snapshots' / entry[variant]["file"], 'rb') as f:
+            assert json.loads(gzip.decompress(f.read())) == response
+
+
+@pytest.fixture
+def exported_snapshots(app_module, tmp_path, monkeypatch):
+    import export_snapshots
+    out_dir = str(tmp_path / 'snapshots')
+    index = export_snapshots.main(['--out', out_dir])
+    assert len(index["entries"]) == len(app_module.prediction_grid())
+    monkeypatch.setattr(app_module, 'SNAPSHOT_DIR', out_dir)
+    monkeypatch.setattr(app_module, 'snapshot_index', None)
+    app_module.load_snapshots()
+    return index
+
+
+@pytest.mark.parametrize('query', ['', '?compact=1'])
+def test_snapshots_match_live_predictions(app_module, exported_snapshots, monkeypatch, query):
+    crop_type, season, country, state = app_module.prediction_grid()[5]
+    body = {"crop_type": crop_type, "season": season, "country": country, "state": state}
+    client = app_module.app.test_client()
+
+    served = client.post('/api/predict' + query, json=body, headers={"Accept-Encoding": "gzip"})
+    variant = exported_snapshots["entries"][snapshot_key((crop_type, season, country, state))]['compact' if query else 'full']
+    assert served.headers["ETag"] == f'"{variant["etag"]}"' # Sent from the snapshot file, not predicted live
+    assert served.headers["Content-Encoding"] == 'gzip'
+    snapshot = json.loads(gzip.decompress(served.get_data()))
+
+    refused = client.post('/api/predict' + query, json=body, headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+    assert json.loads(refused.get_data()) == snapshot
+
+    monkeypatch.setattr(app_module, 'snapshot_index', None)
+    live = client.post('/api/predict' + query, json=body)
+    assert json.loads(live.get_data()) == snapshot
+
+
+def test_export_skips_only_failing_items(app_module, tmp_path, monkeypatch):
+    import export_snapshots
+    grid = app_module.prediction_grid()
+    broken = grid[3]
+    lookup = app_module.lookup_price_history
+
+    def broken_lookup(price_history, crop_type, country, state, *args):
+        if (crop_type, country, state) == (broken[0], broken[2], broken[3]):
+            raise RuntimeError("broken item")
+        return lookup(price_history, crop_type, country, state, *args)
+
+    monkeypatch.setattr(app_module, 'lookup_price_history', broken_lookup)
+    app_module.forecast_cache.clear()
+    index = export_snapshots.main(['--out', str(tmp_path / 'snapshots')])
+    failing = [item for item in grid if (item[0], item[2], item[3]) == (broken[0], broken[2], broken[3])]
+    assert len(index["entries"]) == len(grid) - len(failing) # The rest of the chunk is still exported
+    assert snapshot_key(broken) not in index["entries"]
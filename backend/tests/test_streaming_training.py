@@ -0,0 +1,67 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_model
+from model_versions import resolve_model_dir
+from streaming_training import build_fitted_preprocessor, compute_streaming_stats, encode_streaming
+from train_model import CATEGORICAL_FEATURES, HIERARCHY_COLUMNS, NUMERICAL_FEATURES, TARGET_COLUMN
+
+CHUNKSIZE = 300 # Several chunks for the 2000-row table
+
+
+@pytest.fixture(scope='module')
+def data_path(tmp_path_factory, training_table):
+    path = str(tmp_path_factory.mktemp('streaming') / 'prices.csv')
+    training_table.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module')
+def streamed(data_path):
+    stats = compute_streaming_stats(data_path, NUMERICAL_FEATURES, CATEGORICAL_FEATURES, TARGET_COLUMN, HIERARCHY_COLUMNS, CHUNKSIZE)
+    X, y, scaler = encode_streaming(data_path, stats, NUMERICAL_FEATURES, CATEGORICAL_FEATURES, TARGET_COLUMN, CHUNKSIZE)
+    return stats, X, y, scaler
+
+
+def test_rebuilt_preprocessor_matches_the_streamed_encoding(data_path, streamed):
+    stats, X, y, scaler = streamed
+    preprocessor = build_fitted_preprocessor(stats, scaler, NUMERICAL_FEATURES, CATEGORICAL_FEATURES)
+    # Raw rows as app.py passes them: categories as strings, gaps filled with the stored values
+    rows = pd.read_csv(data_path, dtype={col: str for col in CATEGORICAL_FEATURES})
+    rows = rows[rows[TARGET_COLUMN].notna()]
+    rows = rows.fillna({**stats["means"], **stats["modes"]})
+    rebuilt = preprocessor.transform(rows[NUMERICAL_FEATURES + CATEGORICAL_FEATURES])
+    assert rebuilt.shape == X.shape
+    n_numeric = len(NUMERICAL_FEATURES)
+    np.testing.assert_allclose(rebuilt[:, :n_numeric].toarray(), X[:, :n_numeric].toarray(), rtol=1e-5, atol=1e-5) # X is float32
+    assert (rebuilt[:, n_numeric:] != X[:, n_numeric:]).nnz == 0 # Identical one-hot columns
+    np.testing.assert_allclose(y, rows[TARGET_COLUMN].to_numpy(), rtol=1e-6)
+
+
+def test_streaming_and_full_modes_fit_the_same_preprocessing(data_path, streamed, tmp_path):
+    stats, _, _, scaler = streamed
+    train_model.train_full(data_path, str(tmp_path / 'models'), {"n_estimators": 5})
+    pipeline = joblib.load(os.path.join(resolve_model_dir(str(tmp_path / 'models')), 'crop_price_rf_pipeline.pkl'))
+    full = pipeline.named_steps['preprocessor']
+    np.testing.assert_allclose(full.named_transformers_['num'].mean_, scaler.mean_, rtol=1e-9)
+    np.testing.assert_allclose(full.named_transformers_['num'].scale_, scaler.scale_, rtol=1e-9)
+    for col, categories in zip(CATEGORICAL_FEATURES, full.named_transformers_['cat'].categories_):
+        assert list(categories) == stats["vocabularies"][col]
+
+
+def test_streaming_model_is_served(app_module, data_path, tmp_path, monkeypatch):
+    models_dir = str(tmp_path / 'models')
+    train_model.train_streaming(data_path, models_dir, CHUNKSIZE)
+    monkeypatch.setattr(app_module, 'model_bundle', app_module.load_model_bundle(resolve_model_dir(models_dir)))
+    app_module.forecast_cache.clear()
+    predictions = app_module.metrics.counter_values('agriprice_predictions_total')
+    items = app_module.prediction_grid()[:5]
+    results = app_module.get_ml_predictions(items)
+    after = app_module.metrics.counter_values('agriprice_predictions_total')
+    assert after.get((('source', 'ml'),), 0) - predictions.get((('source', 'ml'),), 0) == len(items)
+    assert all(result["factors"]["weather"]["condition"].startswith('model.') for result in results)
+    app_module.forecast_cache.clear()
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pandas as pd
+
+import train_model
+from model_versions import VERSIONS_DIR, current_version, list_versions, prune_versions, resolve_model_dir, set_current_version
+
+SERVED_ASSETS = ['crop_price_rf_pipeline.pkl', 'crop_price_rf_flat', 'metadata_index.json', 'price_history'] # horizon_forest needs longer series (tests/test_horizon_forecast.py)
+
+
+def test_full_training_switches_to_a_complete_version(tmp_path, training_table, monkeypatch):
+    data_path = str(tmp_path / 'prices.csv')
+    training_table.to_csv(data_path, index=False)
+    models_dir = str(tmp_path / 'models')
+    set_current_version = train_model.set_current_version
+    pointed_at = []
+
+    def checked_set_current_version(directory, version):
+        # Everything app.py loads must be in place before the pointer moves
+        version_dir = os.path.join(directory, VERSIONS_DIR, version)
+        assert all(os.path.exists(os.path.join(version_dir, name)) for name in SERVED_ASSETS)
+        assert current_version(directory) == (pointed_at[-1] if pointed_at else None)
+        pointed_at.append(version)
+        set_current_version(directory, version)
+
+    monkeypatch.setattr(train_model, 'set_current_version', checked_set_current_version)
+    for _ in range(2):
+        train_model.train_full(data_path, models_dir, {"n_estimators": 5})
+    assert pointed_at == ['v0001', 'v0002']
+    assert resolve_model_dir(models_dir) == os.path.join(models_dir, VERSIONS_DIR, 'v0002')
+    assert not os.path.exists(os.path.join(models_dir, 'crop_price_rf_pipeline.pkl')) # Nothing is rewritten in place
+
+
+def test_old_versions_are_pruned_after_the_switch(tmp_path, training_table):
+    data_path = str(tmp_path / 'prices.csv')
+    training_table.to_csv(data_path, index=False)
+    models_dir = str(tmp_path / 'models')
+    for _ in range(3):
+        train_model.train_full(data_path, models_dir, {"n_estimators": 5}, keep_versions=2)
+    assert list_versions(models_dir) == ['v0002', 'v0003']
+    assert current_version(models_dir) == 'v0003'
+
+
+def test_prune_keeps_the_current_version(tmp_path):
+    models_dir = str(tmp_path)
+    for name in ['v0001', 'v0002', 'v0003', 'v0010']:
+        os.makedirs(os.path.join(models_dir, VERSIONS_DIR, name))
+    set_current_version(models_dir, 'v0001') # Rolled back by hand
+    assert prune_versions(models_dir, 2) == ['v0002']
+    assert list_versions(models_dir) == ['v0001', 'v0003', 'v0010']
+
+
+def test_incremental_on_a_streaming_base_trains_only_new_months(tmp_path, training_table):
+    data_path = str(tmp_path / 'prices.csv')
+    training_table.to_csv(data_path, index=False)
+    models_dir = str(tmp_path / 'models')
+    train_model.train_streaming(data_path, models_dir)
+    state, stored_rows, _ = train_model.load_training_state(models_dir)
+    assert stored_rows.empty # The streaming base keeps no rows, only the latest month
+    assert state["latest_period"] == train_model._latest_period(training_table)
+
+    # Passing the same file again adds nothing
+    train_model.train_incremental(data_path, models_dir, add_trees=2)
+    assert list_versions(models_dir) == ['v0001']
+
+    next_month = training_table.dropna(subset=[train_model.TARGET_COLUMN]).sample(50, random_state=3).assign(Year=state["latest_period"] // 12, Month=state["latest_period"] % 12 + 1)
+    pd.concat([training_table, next_month]).to_csv(data_path, index=False)
+    train_model.train_incremental(data_path, models_dir, add_trees=2)
+    with open(os.path.join(models_dir, VERSIONS_DIR, 'v0002', 'version.json')) as f:
+        assert json.load(f)["rows_added"] == len(next_month)
+    state, stored_rows, _ = train_model.load_training_state(models_dir)
+    assert len(stored_rows) == len(next_month)
+    assert state["latest_period"] == train_model._latest_period(training_table) + 1
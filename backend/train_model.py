@@ -8,8 +8,19 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import joblib
 import os
-
-print("Loading your dataset and training Random Forest Regressor...")
+import json
+import shutil
+import tempfile
+import argparse
+from forest_artifact import export_forest_artifact
+from price_history import aggregate_price_rows, combine_price_aggregates, export_price_history, load_price_history
+from horizon_forecast import train_horizon_model
+from model_versions import VERSIONS_DIR, next_version_name, prune_versions, resolve_model_dir, set_current_version, write_version_info
+from metadata_store import CROP_LEVELS, LOCATION_LEVELS, METADATA_INDEX_VERSION, expand_metadata_index
+from tuning import DEFAULT_N_SPLITS, DEFAULT_PARAM_GRID, EARLY_STOP_TOLERANCE, period_folds, print_leaderboard, run_search
+from streaming_training import (
+    DEFAULT_CHUNKSIZE, StageProfiler, build_fitted_preprocessor, compute_streaming_stats, encode_streaming
+)
 
 # --- Configuration for your Dataset ---
 # Updated path to your .xlsx file
@@ -37,114 +48,558 @@ TRAINING_FEATURES_ORDER = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
 # Ensure all feature columns are present in the defined lists
 EXPECTED_COLUMNS = CATEGORICAL_FEATURES + NUMERICAL_FEATURES + [TARGET_COLUMN]
 
+# Columns needed to build the dropdown metadata (category -> crop, country -> state -> district -> market)
+HIERARCHY_COLUMNS = ['Crop Category', 'Crop Type', 'Country', 'State', 'District', 'Market', 'Season', 'Month']
+
+# Dataset columns -> price history store columns (see price_history.py)
+PRICE_HISTORY_COLUMNS = {
+    'Crop Type': 'crop', 'Country': 'country', 'State': 'state', 'District': 'district', 'Market': 'market',
+    'Year': 'year', 'Month': 'month', TARGET_COLUMN: 'price', 'Previous Year Price (INR/Quintal)': 'previous_year_price'
+}
+
+MODELS_DIR = 'models'
+
+# Cleaned training rows, imputation values and the price aggregate, kept for incremental updates
+TRAINING_DATA_DIR = 'training_data'
+DEFAULT_ADD_TREES = 20 # Trees fitted per incremental update
+DEFAULT_MAX_TREES = 100 # Oldest trees are dropped beyond this, so updates replace rather than grow
+DEFAULT_KEEP_VERSIONS = 3 # Version directories kept for rollback (plus the current one); older ones are deleted
+
 # --- 1. Load your Dataset ---
-try:
-    # Use read_excel because the file is explicitly .xlsx
-    df = pd.read_excel(DATASET_PATH)
-    print(f"Successfully loaded '{DATASET_PATH}' with {len(df)} rows and {len(df.columns)} columns.")
-    print("Columns loaded:", df.columns.tolist())
-except FileNotFoundError:
-    print(f"ERROR: Dataset '{DATASET_PATH}' not found. Please ensure the path is correct.")
-    exit()
-except Exception as e:
-    print(f"ERROR: Could not load dataset. Check file format or path: {e}")
-    exit()
+def load_dataset(dataset_path):
+    try:
+        # Use read_excel for .xlsx workbooks; CSV/Parquet are also accepted for convenience
+        if dataset_path.lower().endswith('.csv'):
+            df = pd.read_csv(dataset_path)
+        elif dataset_path.lower().endswith('.parquet'):
+            df = pd.read_parquet(dataset_path)
+        else:
+            df = pd.read_excel(dataset_path)
+        print(f"Successfully loaded '{dataset_path}' with {len(df)} rows and {len(df.columns)} columns.")
+        print("Columns loaded:", df.columns.tolist())
+        return df
+    except FileNotFoundError:
+        print(f"ERROR: Dataset '{dataset_path}' not found. Please ensure the path is correct.")
+        exit()
+    except Exception as e:
+        print(f"ERROR: Could not load dataset. Check file format or path: {e}")
+        exit()
+
 
 # --- 2. Basic Data Preprocessing and Cleaning ---
-# Ensure all expected columns exist
-missing_cols = [col for col in EXPECTED_COLUMNS if col not in df.columns]
-if missing_cols:
-    print(f"ERROR: Missing expected columns in dataset: {missing_cols}")
-    print("Please check your Excel sheet headers and ensure they match the defined features/target.")
-    exit()
-
-# Handle missing values (simple imputation for demonstration)
-# For numerical features, fill with mean or median
-for col in NUMERICAL_FEATURES:
-    if df[col].isnull().any():
-        df[col] = df[col].fillna(df[col].mean())
-        print(f"Filled missing values in numerical column: {col}")
-
-# For categorical features, fill with mode or a placeholder 'Unknown'
-for col in CATEGORICAL_FEATURES:
-    # Convert to string first to handle potential mixed types or numeric months gracefully for categorical processing
-    df[col] = df[col].astype(str)
-    if df[col].isnull().any() or (df[col] == 'nan').any(): # Check for actual NaN or string 'nan' after conversion
-        df[col] = df[col].replace('nan', df[col].mode()[0] if not df[col].mode().empty else 'Unknown')
-        print(f"Filled missing values in categorical column: {col}")
-
-
-# Drop rows where the target (price) is missing (as we can't train without it)
-original_rows = len(df)
-df.dropna(subset=[TARGET_COLUMN], inplace=True)
-if len(df) < original_rows:
-    print(f"Dropped {original_rows - len(df)} rows with missing target price.")
-
-if df.empty:
-    print("ERROR: Dataset is empty after cleaning. Cannot train model.")
-    exit()
-
-# --- Prepare data for model ---
-X = df[CATEGORICAL_FEATURES + NUMERICAL_FEATURES]
-y = df[TARGET_COLUMN]
+def check_columns(df):
+    # Ensure all expected columns exist
+    missing_cols = [col for col in EXPECTED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        print(f"ERROR: Missing expected columns in dataset: {missing_cols}")
+        print("Please check your Excel sheet headers and ensure they match the defined features/target.")
+        exit()
+
+
+def compute_fill_values(df):
+    """
+    Imputation values of the raw dataset (numeric means, categorical modes), stored so incremental
+    updates fill new rows the same way.
+    """
+    modes = {}
+    for col in CATEGORICAL_FEATURES:
+        mode = df[col].dropna().astype(str).mode()
+        modes[col] = mode[0] if not mode.empty else 'Unknown'
+    return {"means": df[NUMERICAL_FEATURES].mean().fillna(0.0).to_dict(), "modes": modes}
+
+
+def impute_rows(df, fill_values):
+    """
+    Cleans new rows with stored fill values (same steps as clean_dataset, without recomputing them).
+    """
+    check_columns(df)
+    df = df.dropna(subset=[TARGET_COLUMN]).copy()
+    df[NUMERICAL_FEATURES] = df[NUMERICAL_FEATURES].fillna(fill_values["means"])
+    for col in CATEGORICAL_FEATURES:
+        df[col] = df[col].astype(str).replace('nan', fill_values["modes"][col]).fillna(fill_values["modes"][col])
+    return df
+
+
+def clean_dataset(df):
+    check_columns(df)
+
+    # Handle missing values (simple imputation for demonstration)
+    # For numerical features, fill with mean or median
+    for col in NUMERICAL_FEATURES:
+        if df[col].isnull().any():
+            df[col] = df[col].fillna(df[col].mean())
+            print(f"Filled missing values in numerical column: {col}")
+
+    # For categorical features, fill with mode or a placeholder 'Unknown'
+    for col in CATEGORICAL_FEATURES:
+        # Convert to string first to handle potential mixed types or numeric months gracefully for categorical processing
+        df[col] = df[col].astype(str)
+        if df[col].isnull().any() or (df[col] == 'nan').any(): # Check for actual NaN or string 'nan' after conversion
+            # pandas >= 3 keeps NaN through astype(str), older versions turn it into 'nan'
+            fill = df[col].mode()[0] if not df[col].mode().empty else 'Unknown'
+            df[col] = df[col].replace('nan', fill).fillna(fill)
+            print(f"Filled missing values in categorical column: {col}")
+
+    # Drop rows where the target (price) is missing (as we can't train without it)
+    original_rows = len(df)
+    df.dropna(subset=[TARGET_COLUMN], inplace=True)
+    if len(df) < original_rows:
+        print(f"Dropped {original_rows - len(df)} rows with missing target price.")
+
+    if df.empty:
+        print("ERROR: Dataset is empty after cleaning. Cannot train model.")
+        exit()
+    return df
+
 
 # --- 3. Feature Engineering & Preprocessing Pipeline ---
-# Create a preprocessor using ColumnTransformer
-# OneHotEncoder for categorical features (handle_unknown='ignore' prevents errors on unseen categories)
-# sparse_output=False ensures a dense array output, which can be easier to debug for smaller datasets
-# StandardScaler for numerical features (good practice for Random Forest, though less critical than for linear models)
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', StandardScaler(), NUMERICAL_FEATURES),
-        ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES)
-    ])
+def build_preprocessor():
+    # Create a preprocessor using ColumnTransformer
+    # OneHotEncoder for categorical features (handle_unknown='ignore' prevents errors on unseen categories)
+    # sparse_output=False ensures a dense array output, which can be easier to debug for smaller datasets
+    # StandardScaler for numerical features (good practice for Random Forest, though less critical than for linear models)
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), NUMERICAL_FEATURES),
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES)
+        ])
 
-# --- 4. Create and Train the Model Pipeline ---
-# Combine preprocessor and RandomForestRegressor into a single pipeline
-model_pipeline = Pipeline(steps=[
-    ('preprocessor', preprocessor),
-    ('regressor', RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)) # n_jobs=-1 uses all available cores
-])
 
-print("Training RandomForestRegressor...")
-model_pipeline.fit(X, y)
+def build_regressor(**params):
+    # params override the defaults, e.g. the best config found by --mode tune
+    return RandomForestRegressor(**{"n_estimators": 100, "random_state": 42, "n_jobs": -1, **params}) # n_jobs=-1 uses all available cores
 
-print(f"Model trained. R-squared on training data: {model_pipeline.score(X, y):.4f}") # Display R-squared with more precision
 
 # --- 5. Save the Entire Pipeline and Other Metadata ---
-models_dir = 'models'
-os.makedirs(models_dir, exist_ok=True)
-
-joblib.dump(model_pipeline, os.path.join(models_dir, 'crop_price_rf_pipeline.pkl'))
-
-# Extract unique values for frontend dropdowns directly from your dataset
-metadata = {
-    "crop_categories": df['Crop Category'].unique().tolist(),
-    "crop_types_by_category": {
-        cat: df[df['Crop Category'] == cat]['Crop Type'].unique().tolist()
-        for cat in df['Crop Category'].unique()
-    },
-    "countries": df['Country'].unique().tolist(),
-    "states_by_country": {
-        country: df[df['Country'] == country]['State'].unique().tolist()
-        for country in df['Country'].unique()
-    },
-    "seasons": df['Season'].unique().tolist(),
-    "districts_by_state": { # New: add districts for potential future use or display
-        state: df[df['State'] == state]['District'].unique().tolist()
-        for state in df['State'].unique()
-    },
-    "markets_by_district": { # New: add markets
-        district: df[df['District'] == district]['Market'].unique().tolist()
-        for district in df['District'].unique()
-    },
-    "months": sorted(df['Month'].unique().astype(str).tolist()), # Ensure months are sorted and as strings for consistency
-    "unit_map": { # Assuming all prices are in INR/Quintal based on your column name
-        crop_type: "INR/Quintal" for crop_type in df['Crop Type'].unique()
-    },
-    "TRAINING_FEATURES_ORDER": TRAINING_FEATURES_ORDER # Save the feature order
-}
-joblib.dump(metadata, os.path.join(models_dir, 'app_metadata.pkl'))
+def _index_level(paths, columns):
+    """
+    Returns (names, parent_indices) for the hierarchy level identified by the last column.
+    Nodes are unique per full path; parent indices point into the level above.
+    """
+    nodes = paths[columns].drop_duplicates().reset_index(drop=True)
+    names = nodes[columns[-1]].tolist()
+    if len(columns) == 1:
+        return names, None
+    parents = paths[columns[:-1]].drop_duplicates().reset_index(drop=True)
+    parents['_parent'] = range(len(parents))
+    parent_indices = nodes.merge(parents, on=columns[:-1], how='left', sort=False)['_parent'].tolist()
+    return names, parent_indices
+
+
+def build_metadata_index(df, fill_values):
+    """
+    Builds the compact, indexed dropdown metadata (see metadata_store.py) from one groupby pass.
+    Everything after the groupby works on the unique hierarchy paths, not on the full dataset.
+    The fill values are stored alongside, so app.py can fill the features a request doesn't carry.
+    """
+    # Single pass over the rows: every distinct category/crop/location/season/month path
+    paths = df.groupby(HIERARCHY_COLUMNS, sort=False, observed=True).size().reset_index()[HIERARCHY_COLUMNS].astype(str)
+
+    levels = {}
+    for level_names, columns in (
+        (CROP_LEVELS, ['Crop Category', 'Crop Type']),
+        (LOCATION_LEVELS, ['Country', 'State', 'District', 'Market'])
+    ):
+        for depth, level in enumerate(level_names):
+            names, parent = _index_level(paths, columns[:depth + 1])
+            levels[level] = {"names": names} if parent is None else {"names": names, "parent": parent}
+
+    return {
+        "version": METADATA_INDEX_VERSION,
+        "levels": levels,
+        "seasons": paths['Season'].unique().tolist(),
+        "months": sorted(paths['Month'].unique().tolist()), # Ensure months are sorted and as strings for consistency
+        "unit_map": { # Assuming all prices are in INR/Quintal based on your column name
+            crop_type: "INR/Quintal" for crop_type in levels["crop_type"]["names"]
+        },
+        "TRAINING_FEATURES_ORDER": TRAINING_FEATURES_ORDER, # Save the feature order
+        "fill_values": fill_values
+    }
+
+
+def build_metadata(metadata_index):
+    # Expanded dict form of the index, kept for app_metadata.pkl consumers
+    metadata = expand_metadata_index(metadata_index)
+    metadata["unit_map"] = metadata_index["unit_map"]
+    metadata["TRAINING_FEATURES_ORDER"] = metadata_index["TRAINING_FEATURES_ORDER"]
+    return metadata
+
+
+def build_price_aggregate(df):
+    # Observed monthly prices per market, taken from the raw rows before imputation
+    if any(col not in df.columns for col in PRICE_HISTORY_COLUMNS):
+        return None # clean_dataset reports the missing columns
+    return aggregate_price_rows(df[list(PRICE_HISTORY_COLUMNS)].rename(columns=PRICE_HISTORY_COLUMNS))
+
+
+def save_model_assets(model_pipeline, metadata_index, models_dir=MODELS_DIR, price_aggregate=None):
+    os.makedirs(models_dir, exist_ok=True)
+
+    joblib.dump(model_pipeline, os.path.join(models_dir, 'crop_price_rf_pipeline.pkl'))
+
+    # Also export the flattened, memory-mappable artifact (served with MODEL_FORMAT=flat in app.py)
+    flat_manifest = export_forest_artifact(model_pipeline, os.path.join(models_dir, 'crop_price_rf_flat'))
+    print(f"Exported flat forest artifact: {flat_manifest['n_trees']} trees, {flat_manifest['n_nodes']} nodes.")
+
+    # Indexed metadata served by /api/metadata; app.py also takes the unit map and the feature schema
+    # from it. The expanded dict is kept for app_metadata.pkl consumers.
+    with open(os.path.join(models_dir, 'metadata_index.json'), 'w') as f:
+        json.dump(metadata_index, f, separators=(',', ':'))
+    joblib.dump(build_metadata(metadata_index), os.path.join(models_dir, 'app_metadata.pkl'))
+
+    # Sorted, memory-mappable monthly price history used by app.py for real history and lag features
+    if price_aggregate is not None:
+        history_manifest = export_price_history(price_aggregate, os.path.join(models_dir, 'price_history'))
+        print(f"Exported price history: {history_manifest['n_market_rows']} market-months, {history_manifest['n_state_rows']} state-months.")
+        # Multi-output forest for the 12-month chart, trained on the same history
+        horizon_dir = os.path.join(models_dir, 'horizon_forest')
+        if train_horizon_model(load_price_history(os.path.join(models_dir, 'price_history')), horizon_dir) is None:
+            shutil.rmtree(horizon_dir, ignore_errors=True) # Don't leave a model trained on older data behind
+
+    print(f"RandomForestRegressor pipeline and app metadata saved to '{models_dir}/' directory.")
+
+
+# --- Stored Training Data (for incremental updates) ---
+def save_training_state(models_dir, fill_values, price_aggregate, rows=None, latest_period=None):
+    """
+    Starts a fresh training data store: imputation values, the price aggregate, the latest trained
+    period (year * 12 + month; taken from rows when they are given) and (when the rows fit in memory)
+    the cleaned training rows as the first part.
+    """
+    if rows is not None:
+        latest_period = _latest_period(rows)
+    data_dir = os.path.join(models_dir, TRAINING_DATA_DIR)
+    tmp_dir = data_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    with open(os.path.join(tmp_dir, 'state.json'), 'w') as f:
+        json.dump({"fill_values": fill_values, "parts": 0 if rows is None else 1, "latest_period": latest_period}, f, indent=2)
+    joblib.dump(price_aggregate, os.path.join(tmp_dir, 'price_aggregate.pkl'))
+    if rows is not None:
+        rows[EXPECTED_COLUMNS].to_pickle(os.path.join(tmp_dir, 'part-00000.pkl'))
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.replace(tmp_dir, data_dir)
+
+
+def load_training_state(models_dir):
+    data_dir = os.path.join(models_dir, TRAINING_DATA_DIR)
+    with open(os.path.join(data_dir, 'state.json')) as f:
+        state = json.load(f)
+    parts = sorted(name for name in os.listdir(data_dir) if name.startswith('part-'))
+    frames = [pd.read_pickle(os.path.join(data_dir, name)) for name in parts]
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EXPECTED_COLUMNS)
+    return state, rows, joblib.load(os.path.join(data_dir, 'price_aggregate.pkl'))
+
+
+def append_training_rows(models_dir, state, rows, price_aggregate):
+    """
+    Adds cleaned rows as a new part, replaces the price aggregate and advances the latest trained
+    period; existing parts are untouched.
+    """
+    data_dir = os.path.join(models_dir, TRAINING_DATA_DIR)
+    part_path = os.path.join(data_dir, f"part-{state['parts']:05d}.pkl")
+    rows[EXPECTED_COLUMNS].to_pickle(part_path + '.tmp')
+    os.replace(part_path + '.tmp', part_path)
+    joblib.dump(price_aggregate, os.path.join(data_dir, 'price_aggregate.pkl.tmp'))
+    os.replace(os.path.join(data_dir, 'price_aggregate.pkl.tmp'), os.path.join(data_dir, 'price_aggregate.pkl'))
+    state["parts"] += 1
+    latest_period = _latest_period(rows)
+    if latest_period is not None:
+        state["latest_period"] = max(state.get("latest_period") or latest_period, latest_period)
+    with open(os.path.join(data_dir, 'state.json'), 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def _row_periods(df):
+    return pd.to_numeric(df['Year'], errors='coerce') * 12 + pd.to_numeric(df['Month'], errors='coerce')
+
+
+def _latest_period(df):
+    latest = _row_periods(df).max()
+    return int(latest) if pd.notna(latest) else None
+
+
+def _prune_old_versions(models_dir, keep_versions):
+    # Runs after the pointer has moved; the newest versions stay on disk for rollback
+    removed = prune_versions(models_dir, keep_versions)
+    if removed:
+        print(f"Deleted {len(removed)} old version(s): {', '.join(removed)}.")
+
+
+def grow_forest(regressor, X, y, add_trees, max_trees, random_state):
+    """
+    Fits add_trees new trees with warm_start (earlier trees are kept as they are), then drops the
+    oldest trees beyond max_trees.
+    """
+    n_existing = len(regressor.estimators_)
+    # A fresh seed per update: warm_start derives new tree seeds from random_state and the tree count,
+    # which would otherwise repeat once old trees have been dropped
+    regressor.set_params(warm_start=True, n_estimators=n_existing + add_trees, random_state=random_state)
+    regressor.fit(X, y)
+    excess = len(regressor.estimators_) - max_trees
+    if excess > 0:
+        regressor.estimators_ = regressor.estimators_[excess:]
+    regressor.set_params(warm_start=False, n_estimators=len(regressor.estimators_))
+    return max(excess, 0)
+
+
+# --- Training Modes ---
+def train_full(dataset_path, models_dir=MODELS_DIR, regressor_params=None, keep_versions=DEFAULT_KEEP_VERSIONS):
+    """
+    Original mode: loads the whole workbook into memory and trains on a dense one-hot matrix.
+    """
+    profiler = StageProfiler()
+    with profiler.stage('load'):
+        df = load_dataset(dataset_path)
+    with profiler.stage('history'):
+        price_aggregate = build_price_aggregate(df)
+    with profiler.stage('impute'):
+        check_columns(df)
+        fill_values = compute_fill_values(df)
+        df = clean_dataset(df)
+
+    # --- Prepare data for model ---
+    X = df[CATEGORICAL_FEATURES + NUMERICAL_FEATURES]
+    y = df[TARGET_COLUMN]
+
+    # --- 4. Create and Train the Model Pipeline ---
+    # Combine preprocessor and RandomForestRegressor into a single pipeline
+    model_pipeline = Pipeline(steps=[
+        ('preprocessor', build_preprocessor()),
+        ('regressor', build_regressor(**(regressor_params or {})))
+    ])
+
+    print("Training RandomForestRegressor...")
+    with profiler.stage('fit'):
+        model_pipeline.fit(X, y)
+
+    print(f"Model trained. R-squared on training data: {model_pipeline.score(X, y):.4f}") # Display R-squared with more precision
+
+    with profiler.stage('dump'):
+        # A complete new version directory, pointed at last: a running app.py never sees a partial model
+        version = next_version_name(models_dir)
+        version_dir = os.path.join(models_dir, VERSIONS_DIR, version)
+        save_model_assets(model_pipeline, build_metadata_index(df, fill_values), version_dir, price_aggregate)
+        write_version_info(version_dir, {"version": version, "parent": None, "mode": "full", "rows_total": len(df), "n_trees": len(model_pipeline.named_steps['regressor'].estimators_)})
+        save_training_state(models_dir, fill_values, price_aggregate, df)
+        set_current_version(models_dir, version) # Supersedes earlier versions, incremental ones included
+    print(f"Version '{version}' is now current.")
+    _prune_old_versions(models_dir, keep_versions)
+    return profiler.report()
+
+
+def train_streaming(dataset_path, models_dir=MODELS_DIR, chunksize=DEFAULT_CHUNKSIZE, keep_versions=DEFAULT_KEEP_VERSIONS):
+    """
+    Large-data mode: streams a CSV/Parquet file in chunks with explicit dtypes, computes imputation
+    statistics in a first pass and trains on a sparse one-hot matrix built from category codes.
+    """
+    profiler = StageProfiler()
+    with profiler.stage('stats'):
+        stats = compute_streaming_stats(dataset_path, NUMERICAL_FEATURES, CATEGORICAL_FEATURES, TARGET_COLUMN, HIERARCHY_COLUMNS, chunksize, PRICE_HISTORY_COLUMNS,
+                                        ('Year', 'Month'))
+    with profiler.stage('encode'):
+        X, y, scaler = encode_streaming(dataset_path, stats, NUMERICAL_FEATURES, CATEGORICAL_FEATURES, TARGET_COLUMN, chunksize)
+    print(f"Encoded {X.shape[0]} rows into a sparse {X.shape[1]}-column matrix ({X.data.nbytes / 2**20:.1f} MB of values).")
+
+    print("Training RandomForestRegressor...")
+    with profiler.stage('fit'):
+        regressor = build_regressor()
+        regressor.fit(X, y)
+    print(f"Model trained. R-squared on training data: {regressor.score(X, y):.4f}")
+
+    # Assemble the same Pipeline shape as the full mode, so app.py can load either
+    model_pipeline = Pipeline(steps=[
+        ('preprocessor', build_fitted_preprocessor(stats, scaler, NUMERICAL_FEATURES, CATEGORICAL_FEATURES)),
+        ('regressor', regressor)
+    ])
+    with profiler.stage('dump'):
+        fill_values = {"means": stats["means"], "modes": stats["modes"]}
+        version = next_version_name(models_dir)
+        version_dir = os.path.join(models_dir, VERSIONS_DIR, version)
+        save_model_assets(model_pipeline, build_metadata_index(stats["hierarchy"], fill_values), version_dir, stats["price_aggregate"])
+        write_version_info(version_dir, {"version": version, "parent": None, "mode": "streaming", "rows_total": X.shape[0], "n_trees": len(regressor.estimators_)})
+        # The rows themselves are not kept (they may not fit in memory); updates then train on new rows only
+        save_training_state(models_dir, fill_values, stats["price_aggregate"], latest_period=stats["latest_period"])
+        set_current_version(models_dir, version)
+    print(f"Version '{version}' is now current.")
+    _prune_old_versions(models_dir, keep_versions)
+    return profiler.report()
+
+
+def train_incremental(dataset_path, models_dir=MODELS_DIR, add_trees=DEFAULT_ADD_TREES, max_trees=DEFAULT_MAX_TREES, recent_months=None,
+                      keep_versions=DEFAULT_KEEP_VERSIONS):
+    """
+    Update mode: appends the rows newer than the stored data, reuses the fitted preprocessor, fits
+    add_trees new trees (dropping the oldest beyond max_trees) and writes a new version under
+    models/versions/, which app.py picks up without a restart.
+    """
+    if not os.path.exists(os.path.join(models_dir, TRAINING_DATA_DIR, 'state.json')):
+        print(f"ERROR: No stored training data in '{models_dir}/'. Run a full or streaming training first.")
+        exit()
+    base_dir = resolve_model_dir(models_dir)
+
+    profiler = StageProfiler()
+    with profiler.stage('load'):
+        state, stored_rows, price_aggregate = load_training_state(models_dir)
+        df = load_dataset(dataset_path)
+        check_columns(df)
+        # Only rows after the latest trained month are new, so the full dataset can be passed again.
+        # A streaming base keeps no rows, so the month comes from state.json (older stores: from the rows).
+        latest_period = state.get("latest_period")
+        if latest_period is None and not stored_rows.empty:
+            latest_period = _latest_period(stored_rows)
+        if latest_period is None:
+            print(f"ERROR: The stored training data in '{models_dir}/' records no latest month, so new rows can't be told apart. Run a full or streaming training first.")
+            exit()
+        new_rows = df[_row_periods(df) > latest_period]
+        print(f"{len(new_rows)} new rows after {(latest_period - 1) // 12}-{(latest_period - 1) % 12 + 1:02d} ({len(df) - len(new_rows)} already trained on).")
+        df = new_rows
+        if df.empty:
+            print("No new rows to train on; the current model is unchanged.")
+            return profiler.report()
+    with profiler.stage('history'):
+        price_aggregate = combine_price_aggregates([price_aggregate, build_price_aggregate(df)])
+    with profiler.stage('impute'):
+        df = impute_rows(df, state["fill_values"])
+    all_rows = pd.concat([stored_rows, df], ignore_index=True) if not stored_rows.empty else df
+
+    with profiler.stage('encode'):
+        model_pipeline = joblib.load(os.path.join(base_dir, 'crop_price_rf_pipeline.pkl'))
+        preprocessor = model_pipeline.named_steps['preprocessor']
+        train_rows = all_rows
+        if recent_months:
+            periods = _row_periods(all_rows)
+            train_rows = all_rows[periods > periods.max() - recent_months]
+        # The preprocessor is not refitted: unseen categories are ignored until the next full training
+        encoder = preprocessor.named_transformers_['cat']
+        for col, categories in zip(CATEGORICAL_FEATURES, encoder.categories_):
+            unseen = set(df[col].unique()) - set(categories)
+            if unseen:
+                print(f"WARNING: {len(unseen)} new '{col}' values are unknown to the fitted encoder (e.g. {sorted(unseen)[:3]}).")
+        X = preprocessor.transform(train_rows[CATEGORICAL_FEATURES + NUMERICAL_FEATURES])
+        y = train_rows[TARGET_COLUMN]
+
+    version = next_version_name(models_dir)
+    regressor = model_pipeline.named_steps['regressor']
+    print(f"Adding {add_trees} trees to {len(regressor.estimators_)} on {X.shape[0]} rows...")
+    with profiler.stage('fit'):
+        dropped = grow_forest(regressor, X, y, add_trees, max_trees, random_state=42 + int(version[1:]))
+    new_X = df[CATEGORICAL_FEATURES + NUMERICAL_FEATURES]
+    print(f"Model updated ({len(regressor.estimators_)} trees, {dropped} oldest dropped). R-squared on new rows: {model_pipeline.score(new_X, df[TARGET_COLUMN]):.4f}")
+
+    with profiler.stage('dump'):
+        version_dir = os.path.join(models_dir, VERSIONS_DIR, version)
+        save_model_assets(model_pipeline, build_metadata_index(all_rows, state["fill_values"]), version_dir, price_aggregate)
+        write_version_info(version_dir, {
+            "version": version,
+            "parent": os.path.basename(base_dir) if base_dir != models_dir else "base",
+            "mode": "incremental",
+            "rows_added": len(df),
+            "rows_total": len(all_rows),
+            "n_trees": len(regressor.estimators_),
+            "trees_added": add_trees,
+            "trees_dropped": dropped
+        })
+        # Rows count as stored only once a model trained on them exists
+        append_training_rows(models_dir, state, df, price_aggregate)
+        set_current_version(models_dir, version) # Atomic switch; a running app.py picks it up on its next poll
+    print(f"Version '{version}' is now current.")
+    _prune_old_versions(models_dir, keep_versions)
+    return profiler.report()
+
+
+def train_tune(dataset_path, models_dir=MODELS_DIR, param_grid=None, n_splits=DEFAULT_N_SPLITS, n_workers=None,
+               tolerance=EARLY_STOP_TOLERANCE, refit_best=False, keep_versions=DEFAULT_KEEP_VERSIONS):
+    """
+    Tuning mode: time-series cross-validation of a parameter grid on a process pool. Writes a
+    leaderboard (accuracy plus fit/predict timings) to models/tuning_leaderboard.json and, with
+    refit_best, trains the winning config on all rows like the full mode.
+    """
+    profiler = StageProfiler()
+    with profiler.stage('load'):
+        df = load_dataset(dataset_path)
+    with profiler.stage('impute'):
+        df = clean_dataset(df)
+        # Folds are cut along time, so order the rows by month first
+        periods = _row_periods(df)
+        if periods.isna().any():
+            print("ERROR: Tuning needs numeric 'Year' and 'Month' values to order rows in time.")
+            exit()
+        order = np.argsort(periods.to_numpy(), kind='stable')
+        df = df.iloc[order]
+        periods = periods.to_numpy()[order]
+
+    with profiler.stage('encode'):
+        # One shared encoding for all folds; scaling and one-hot columns do not change tree splits
+        X = build_preprocessor().fit_transform(df[CATEGORICAL_FEATURES + NUMERICAL_FEATURES])
+        y = df[TARGET_COLUMN].to_numpy()
+        folds = period_folds(periods, n_splits)
+
+    with profiler.stage('search'), tempfile.TemporaryDirectory(prefix='agriprice-tune-') as work_dir:
+        leaderboard = run_search(X, y, folds, param_grid or DEFAULT_PARAM_GRID, work_dir, n_workers, tolerance)
+    print_leaderboard(leaderboard)
+
+    os.makedirs(models_dir, exist_ok=True)
+    leaderboard_path = os.path.join(models_dir, 'tuning_leaderboard.json')
+    with open(leaderboard_path, 'w') as f:
+        json.dump({
+            "rows": len(df),
+            "folds": [{"train_rows": train_end, "test_rows": test_end - train_end} for train_end, test_end in folds],
+            "param_grid": param_grid or DEFAULT_PARAM_GRID,
+            "early_stop_tolerance": tolerance,
+            "leaderboard": leaderboard
+        }, f, indent=2)
+    print(f"Leaderboard written to '{leaderboard_path}'.")
+    report = profiler.report()
+
+    if refit_best:
+        print(f"Refitting the best config on all rows: {leaderboard[0]['params']}")
+        train_full(dataset_path, models_dir, leaderboard[0]["params"], keep_versions)
+    return report
+
+
+def _parse_grid(value):
+    # Either inline JSON or a path to a JSON file, e.g. '{"n_estimators": [100, 200], "max_depth": [null, 20]}'
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the AgriPricePro Random Forest price model.")
+    parser.add_argument('--data', default=DATASET_PATH, help="Path to the training dataset (.xlsx, .csv or .parquet).")
+    parser.add_argument('--mode', choices=['full', 'streaming', 'incremental', 'tune'], default='full',
+                        help="'full' loads everything into memory; 'streaming' reads CSV/Parquet in chunks; "
+                             "'incremental' adds trees for the new rows in --data to the current model; "
+                             "'tune' cross-validates a parameter grid over time.")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk in streaming mode.")
+    parser.add_argument('--add-trees', type=int, default=DEFAULT_ADD_TREES, help="Trees fitted per incremental update.")
+    parser.add_argument('--max-trees', type=int, default=DEFAULT_MAX_TREES, help="Forest size cap; the oldest trees are dropped beyond it.")
+    parser.add_argument('--recent-months', type=int, help="Fit the new trees on only the most recent N months of stored data.")
+    parser.add_argument('--grid', type=_parse_grid, help="Tuning parameter grid as JSON (inline or a file path).")
+    parser.add_argument('--folds', type=int, default=DEFAULT_N_SPLITS, help="Time-series folds in tuning mode.")
+    parser.add_argument('--jobs', type=int, help="Tuning worker processes (default: all cores).")
+    parser.add_argument('--early-stop-tolerance', type=float, default=EARLY_STOP_TOLERANCE,
+                        help="Stop a config after its first fold if its RMSE is this much worse than the best first fold.")
+    parser.add_argument('--refit-best', action='store_true', help="After tuning, train and save the best config on all rows.")
+    parser.add_argument('--models-dir', default=MODELS_DIR, help="Directory to write the trained assets to.")
+    parser.add_argument('--keep-versions', type=int, default=DEFAULT_KEEP_VERSIONS,
+                        help="Version directories to keep under models/versions/ (the current one is always kept).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("Loading your dataset and training Random Forest Regressor...")
+    if args.mode == 'streaming':
+        return train_streaming(args.data, args.models_dir, args.chunksize, args.keep_versions)
+    if args.mode == 'tune':
+        return train_tune(args.data, args.models_dir, args.grid, args.folds, args.jobs, args.early_stop_tolerance, args.refit_best, args.keep_versions)
+    if args.mode == 'incremental':
+        return train_incremental(args.data, args.models_dir, args.add_trees, args.max_trees, args.recent_months, args.keep_versions)
+    return train_full(args.data, args.models_dir, keep_versions=args.keep_versions)
 
 
-print(f"RandomForestRegressor pipeline and app metadata saved to '{models_dir}/' directory.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# backend/tuning.py
+# Time-series cross-validated hyperparameter search for the Random Forest (train_model.py --mode tune).
+#
+# Rows are ordered by (Year, Month) and every fold trains on whole months before the months it is
+# scored on, so no fold ever sees the future. The encoded feature matrix and the target are written
+# once as .npy files and memory-mapped by every worker process, so N workers share one copy through
+# the page cache instead of each receiving a pickled copy. Each config runs its folds in one worker;
+# a config whose first-fold RMSE is clearly worse than the best first fold seen so far stops early.
+
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+DEFAULT_PARAM_GRID = {
+    "n_estimators": [50, 100],
+    "max_depth": [None, 16],
+    "min_samples_leaf": [1, 4],
+    "max_features": [1.0, 0.5]
+}
+DEFAULT_N_SPLITS = 3
+EARLY_STOP_TOLERANCE = 0.10 # Stop a config whose first fold is >10% worse (RMSE) than the best first fold
+LATENCY_SAMPLES = 50 # Single-row predict calls timed per config
+
+# Per-worker state, set by _init_worker
+_best_first_fold = None
+
+
+def expand_grid(grid):
+    """
+    Returns every combination of a {param: [values]} grid as a list of dicts.
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def period_folds(periods, n_splits=DEFAULT_N_SPLITS):
+    """
+    Expanding-window folds over rows sorted by period: returns (train_end, test_end) row offsets,
+    so fold k trains on rows [0, train_end) and is scored on rows [train_end, test_end).
+    Fold boundaries fall between months, never inside one.
+    """
+    unique_periods = np.unique(periods)
+    if len(unique_periods) < n_splits + 1:
+        raise ValueError(f"Need at least {n_splits + 1} distinct months for {n_splits} time-series folds, found {len(unique_periods)}.")
+    # Same layout as sklearn's TimeSeriesSplit, applied to months instead of rows
+    test_size = len(unique_periods) // (n_splits + 1)
+    folds = []
+    for k in range(n_splits):
+        first_test = len(unique_periods) - (n_splits - k) * test_size
+        last_test = first_test + test_size - 1
+        folds.append((
+            int(np.searchsorted(periods, unique_periods[first_test], side='left')),
+            int(np.searchsorted(periods, unique_periods[last_test], side='right'))
+        ))
+    return folds
+
+
+def share_matrix(X, y, directory):
+    """
+    Writes X (dense or CSR) and y as .npy files; returns a small picklable descriptor.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if sparse.issparse(X):
+        X = X.tocsr()
+        parts = {"data": X.data, "indices": X.indices, "indptr": X.indptr}
+    else:
+        parts = {"dense": np.ascontiguousarray(X, dtype=np.float32)}
+    parts["y"] = np.asarray(y, dtype=np.float64)
+    for name, array in parts.items():
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+    return {"directory": directory, "sparse": sparse.issparse(X), "shape": tuple(X.shape)}
+
+
+def load_shared_matrix(descriptor):
+    """
+    Maps the shared X and y read-only (no copy) in a worker process.
+    """
+    def load(name):
+        return np.load(os.path.join(descriptor["directory"], f'{name}.npy'), mmap_mode='r')
+    if descriptor["sparse"]:
+        X = sparse.csr_matrix((load("data"), load("indices"), load("indptr")), shape=descriptor["shape"], copy=False)
+    else:
+        X = load("dense")
+    return X, load("y")
+
+
+def _init_worker(best_first_fold):
+    global _best_first_fold
+    _best_first_fold = best_first_fold
+
+
+def _single_row_latency_ms(model, X_row):
+    timings = []
+    for _ in range(LATENCY_SAMPLES):
+        start = time.perf_counter()
+        model.predict(X_row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def evaluate_config(params, descriptor, folds, tolerance, base_params):
+    """
+    Runs the time-series folds for one config in a worker process; returns its leaderboard entry.
+    """
+    X, y = load_shared_matrix(descriptor)
+    scores = {"rmse": [], "mae": [], "r2": []}
+    fit_seconds, predict_ms_per_1k = [], []
+    model = None
+    stopped_early = False
+
+    for k, (train_end, test_end) in enumerate(folds):
+        model = RandomForestRegressor(**{**base_params, **params})
+        start = time.perf_counter()
+        model.fit(X[:train_end], y[:train_end])
+        fit_seconds.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        predicted = model.predict(X[train_end:test_end])
+        predict_ms_per_1k.append((time.perf_counter() - start) * 1000 / (test_end - train_end) * 1000)
+
+        actual = y[train_end:test_end]
+        scores["rmse"].append(float(np.sqrt(mean_squared_error(actual, predicted))))
+        scores["mae"].append(float(mean_absolute_error(actual, predicted)))
+        scores["r2"].append(float(r2_score(actual, predicted)))
+
+        if k == 0 and len(folds) > 1:
+            with _best_first_fold.get_lock():
+                best = _best_first_fold.value
+                if scores["rmse"][0] < best:
+                    _best_first_fold.value = scores["rmse"][0]
+            if scores["rmse"][0] > best * (1 + tolerance):
+                stopped_early = True
+                break
+
+    return {
+        "params": params,
+        "folds_completed": len(scores["rmse"]),
+        "stopped_early": stopped_early,
+        "rmse": float(np.mean(scores["rmse"])),
+        "rmse_std": float(np.std(scores["rmse"])),
+        "mae": float(np.mean(scores["mae"])),
+        "r2": float(np.mean(scores["r2"])),
+        "fit_seconds": float(np.mean(fit_seconds)),
+        "predict_ms_per_1k_rows": float(np.mean(predict_ms_per_1k)),
+        "single_row_predict_ms": _single_row_latency_ms(model, X[folds[0][0]:folds[0][0] + 1]),
+        "n_nodes": int(sum(tree.tree_.node_count for tree in model.estimators_))
+    }
+
+
+def run_search(X, y, folds, grid, work_dir, n_workers=None, tolerance=EARLY_STOP_TOLERANCE, base_params=None):
+    """
+    Evaluates every config of grid on a process pool. Returns the leaderboard: configs that
+    completed all folds first, each group ordered by mean RMSE.
+    """
+    configs = expand_grid(grid)
+    base_params = {"random_state": 42, "n_jobs": 1, **(base_params or {})} # Parallelism is across configs
+    descriptor = share_matrix(X, y, work_dir)
+    best_first_fold = multiprocessing.get_context('spawn').Value('d', float('inf'))
+    n_workers = n_workers or os.cpu_count() or 1
+    print(f"Evaluating {len(configs)} configs x {len(folds)} folds on {n_workers} worker processes...")
+
+    leaderboard = []
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(best_first_fold,)) as pool:
+        futures = [pool.submit(evaluate_config, params, descriptor, folds, tolerance, base_params) for params in configs]
+        for future in as_completed(futures):
+            entry = future.result()
+            leaderboard.append(entry)
+            status = "stopped early" if entry["stopped_early"] else f"RMSE {entry['rmse']:.2f}"
+            print(f"[{len(leaderboard)}/{len(configs)}] {entry['params']}: {status}, fit {entry['fit_seconds']:.2f}s")
+
+    leaderboard.sort(key=lambda entry: (entry["stopped_early"], entry["rmse"]))
+    for rank, entry in enumerate(leaderboard, start=1):
+        entry["rank"] = rank
+    return leaderboard
+
+
+def print_leaderboard(leaderboard):
+    print("--- Tuning leaderboard (time-series CV) ---")
+    print(f"{'rank':>4} {'rmse':>10} {'r2':>7} {'fit s':>8} {'ms/1k rows':>11} {'1-row ms':>9}  params")
+    for entry in leaderboard:
+        if entry["stopped_early"]:
+            scores = f"{'(stopped after fold 1)':>48}"
+        else:
+            scores = f"{entry['rmse']:>10.2f} {entry['r2']:>7.4f} {entry['fit_seconds']:>8.2f} {entry['predict_ms_per_1k_rows']:>11.2f} {entry['single_row_predict_ms']:>9.2f}"
+        print(f"{entry['rank']:>4} {scores}  {json.dumps(entry['params'])}")
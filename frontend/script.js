@@ -8,6 +8,8 @@ const BACKEND_API_BASE_URL = 'http://localhost:5000/api'; // Assuming Flask back
 let globalPredictionData = null; // Stores the prediction result from the backend
 let globalCropTypesByCategory = {}; // e.g., { "Cereals": ["Rice", "Wheat"] }
 let globalStatesByCountry = {}; // e.g., { "India": ["Karnataka", "Maharashtra"] }
+let globalTexts = null; // Factor/recommendation templates by ID, fetched once from /api/texts
+const predictionCache = new Map(); // Decoded predictions by request payload, for this page session
 
 
 // --- DOM Elements ---
@@ -135,6 +137,54 @@ async function fetchInitialData() {
     }
 }
 
+/**
+ * Fetches the text templates that compact prediction responses refer to by ID.
+ * The browser's HTTP cache (ETag + max-age) keeps it to one download.
+ * @returns {Promise<Object>} The templates by ID.
+ */
+async function fetchTexts() {
+    if (!globalTexts) {
+        const response = await fetch(`${BACKEND_API_BASE_URL}/texts`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}, message: ${await response.text()}`);
+        }
+        globalTexts = await response.json();
+    }
+    return globalTexts;
+}
+
+/**
+ * Turns a compact prediction (?compact=1) into the full response shape the dashboard uses:
+ * fixed-point series back to numbers and text IDs to rendered texts.
+ * @param {Object} data - The compact prediction from the backend.
+ * @param {Object} texts - The templates from /api/texts.
+ * @returns {Object} The prediction with full values and texts.
+ */
+function decodeCompactPrediction(data, texts) {
+    const priceScale = data.scales.price;
+    const confidenceScale = data.scales.confidence;
+    const render = (id) => (texts[id] || '').replace(/\{(\w+)\}/g, (_, name) => data.text_params[name] ?? '');
+
+    const factors = {};
+    for (const [name, factor] of Object.entries(data.factors)) {
+        factors[name] = { ...factor, condition: render(factor.condition), impact: render(factor.impact) };
+    }
+    return {
+        ...data,
+        current_price: data.current_price / priceScale,
+        predicted_price: data.predicted_price / priceScale,
+        historical_prices: data.historical_prices.map(price => price / priceScale),
+        future_prices: data.future_prices.map(price => price / priceScale),
+        confidence_scores: data.confidence_scores.map(score => score / confidenceScale),
+        factors,
+        recommendations: {
+            ...data.recommendations,
+            sell_time: render(data.recommendations.sell_time),
+            trend_analysis: render(data.recommendations.trend_analysis)
+        }
+    };
+}
+
 /**
  * Populates the Crop Type dropdown based on the selected Crop Category.
  */
@@ -171,23 +221,32 @@ function populateStates() {
  * @returns {Promise<Object>} The prediction data from the backend.
  */
 async function getPredictionFromBackend(payload) {
+    const cacheKey = JSON.stringify(payload);
+    if (predictionCache.has(cacheKey)) {
+        return predictionCache.get(cacheKey);
+    }
     console.log("Sending prediction request:", payload);
     try {
-        const response = await fetch(`${BACKEND_API_BASE_URL}/predict`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(payload)
-        });
+        // Compact mode: texts by ID, fixed-point series (the browser negotiates brotli/gzip itself)
+        const [response, texts] = await Promise.all([
+            fetch(`${BACKEND_API_BASE_URL}/predict?compact=1`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(payload)
+            }),
+            fetchTexts()
+        ]);
 
         if (!response.ok) {
             const errorText = await response.text();
             throw new Error(`HTTP error! status: ${response.status}, message: ${errorText}`);
         }
 
-        const data = await response.json();
+        const data = decodeCompactPrediction(await response.json(), texts);
         console.log("Prediction data received:", data);
+        predictionCache.set(cacheKey, data);
         return data;
     } catch (error) {
         console.error("Error fetching prediction:", error);
@@ -275,17 +334,26 @@ function updateCharts(data) {
     const currentMonth = new Date().getMonth();
     const currentYear = new Date().getFullYear();
 
+    // Model forecasts start the month after the observed history (forecast_start, "YYYY-MM"); simulated ones next month
+    const [forecastStartYear, forecastStartMonth] = data.forecast_start
+        ? [Number(data.forecast_start.slice(0, 4)), Number(data.forecast_start.slice(5, 7)) - 1]
+        : [currentYear, currentMonth + 1];
+
     // Generate future month labels (e.g., Jun '25, Jul '25, ...)
     const futureLabels = Array.from({ length: data.future_prices.length }, (_, i) => {
-        // Start from next month (currentMonth + 1) for the first future price
-        const date = new Date(currentYear, currentMonth + i + 1, 1);
+        const date = new Date(forecastStartYear, forecastStartMonth + i, 1);
         return date.toLocaleString('en-US', { month: 'short', year: '2-digit' });
     });
 
+    // Observed history ends at its last recorded month (history_end, "YYYY-MM"); simulated history ends now
+    const [historyEndYear, historyEndMonth] = data.history_end
+        ? [Number(data.history_end.slice(0, 4)), Number(data.history_end.slice(5, 7)) - 1]
+        : [currentYear, currentMonth];
+
     // Generate historical month labels (e.g., May '23, Jun '23, ...)
     const historicalLabels = Array.from({ length: data.historical_prices.length }, (_, i) => {
-        // Go back in time from the current month
-        const date = new Date(currentYear, currentMonth - data.historical_prices.length + i + 1, 1);
+        // Go back in time from the last historical month
+        const date = new Date(historyEndYear, historyEndMonth - data.historical_prices.length + i + 1, 1);
         return date.toLocaleString('en-US', { month: 'short', year: '2-digit' });
     });
 
@@ -481,5 +549,6 @@ tableViewBtn.addEventListener('click', () => {
 // --- Initial Data Load on Page Load ---
 document.addEventListener('DOMContentLoaded', () => {
     fetchInitialData();
+    fetchTexts().catch(error => console.warn("Text templates will be fetched with the first prediction:", error));
     // checkFormValidity() is called inside fetchInitialData
 });
\ No newline at end of file